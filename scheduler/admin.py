@@ -1,8 +1,9 @@
 from django.contrib import admin
 from .models import (
     Department, Classroom, Faculty, Subject, Batch, TimeSlot,
-    TimetableTemplate, TimetableEntry, FacultySubject, SchedulingConstraint
+    TimetableTemplate, TimetableEntry, FacultySubject, SchedulingConstraint, GenerationJob
 )
+from .occupancy import bump_revision
 
 
 @admin.register(Department)
@@ -42,6 +43,7 @@ class BatchAdmin(admin.ModelAdmin):
     list_filter = ['program', 'department', 'semester', 'year']
     search_fields = ['name']
     ordering = ['department', 'semester', 'name']
+    filter_horizontal = ['subjects']
 
 
 @admin.register(TimeSlot)
@@ -53,8 +55,8 @@ class TimeSlotAdmin(admin.ModelAdmin):
 
 @admin.register(TimetableTemplate)
 class TimetableTemplateAdmin(admin.ModelAdmin):
-    list_display = ['name', 'department', 'academic_year', 'semester', 'created_by', 'is_active', 'is_approved', 'created_at']
-    list_filter = ['department', 'semester', 'is_active', 'is_approved', 'created_at']
+    list_display = ['name', 'department', 'academic_year', 'semester', 'algorithm', 'created_by', 'is_active', 'is_approved', 'created_at']
+    list_filter = ['department', 'semester', 'algorithm', 'is_active', 'is_approved', 'created_at']
     search_fields = ['name', 'academic_year']
     ordering = ['-created_at']
     readonly_fields = ['created_at']
@@ -66,6 +68,15 @@ class TimetableEntryAdmin(admin.ModelAdmin):
     list_filter = ['template', 'time_slot__day', 'is_fixed']
     search_fields = ['subject__name', 'faculty__user__first_name', 'faculty__user__last_name', 'batch__name']
     ordering = ['template', 'time_slot__day', 'time_slot__start_time']
+    
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        bump_revision(obj.template_id)
+    
+    def delete_queryset(self, request, queryset):
+        template_ids = set(queryset.values_list('template_id', flat=True))
+        super().delete_queryset(request, queryset)
+        bump_revision(*template_ids)
 
 
 @admin.register(FacultySubject)
@@ -80,4 +91,12 @@ class SchedulingConstraintAdmin(admin.ModelAdmin):
     list_display = ['name', 'constraint_type', 'faculty', 'subject', 'priority', 'is_active']
     list_filter = ['constraint_type', 'priority', 'is_active']
     search_fields = ['name']
-    ordering = ['priority', 'name']
\ No newline at end of file
+    ordering = ['priority', 'name']
+
+
+@admin.register(GenerationJob)
+class GenerationJobAdmin(admin.ModelAdmin):
+    list_display = ['template', 'status', 'placed', 'total', 'best_penalty', 'created_at', 'finished_at']
+    list_filter = ['status']
+    search_fields = ['template__name']
+    ordering = ['-created_at']
\ No newline at end of file
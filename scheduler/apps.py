@@ -7,5 +7,5 @@ class SchedulerConfig(AppConfig):
     verbose_name = 'Smart Timetable Scheduler'
     
     def ready(self):
-        # Import signal handlers if any
-        pass
\ No newline at end of file
+        # Import signal handlers
+        from . import signals  # noqa: F401
\ No newline at end of file
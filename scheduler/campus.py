@@ -0,0 +1,192 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from time import monotonic
+
+from .search import SearchRun
+from .snapshot import CampusSnapshot
+from .utils import TimetableOptimizer, _run_start, _setup_worker, check_time_budget
+
+
+def find_components(problem, requirements):
+    """Split requirements into groups that share no batch, faculty or room
+
+    A requirement links its batch to every faculty member and room it could
+    use; batches joined through such links end up in the same component.
+    Components are returned largest first, each in the given order.
+    """
+    n_batches = problem.n_batches
+    n_faculty = problem.n_faculty
+    parent = list(range(n_batches + n_faculty + problem.n_rooms))
+
+    def find(node):
+        while parent[node] != node:
+            parent[node] = parent[parent[node]]
+            node = parent[node]
+        return node
+
+    for requirement in requirements:
+        root = find(requirement.batch)
+        for faculty in requirement.faculty:
+            other = find(n_batches + faculty)
+            if other != root:
+                parent[other] = root
+        for room in requirement.rooms:
+            other = find(n_batches + n_faculty + room)
+            if other != root:
+                parent[other] = root
+
+    components = {}
+    for requirement in requirements:
+        components.setdefault(find(requirement.batch), []).append(requirement)
+    return sorted(components.values(), key=len, reverse=True)
+
+
+class CampusOptimizer(TimetableOptimizer):
+    """Generate several templates at once over one shared pool of rooms and faculty
+
+    All templates are loaded into a single problem, so a classroom or a
+    faculty member is never booked twice in the same slot and workload caps
+    count every template. The requirements are split into independent
+    components (see ``find_components``) which are searched in parallel
+    worker processes and merged; entries are saved under each batch's own
+    template. The first template's algorithm is used for every component.
+
+    ``component_results`` holds ``(placed, total)`` for each component of
+    the last generation and ``saved`` whether its timetable was committed.
+    """
+
+    def __init__(self, templates, seed=None):
+        self.templates = list(templates)
+        self.components = []
+        self.component_results = []
+        self.saved = False
+        super().__init__(self.templates[0], seed=seed)
+
+    def _load_snapshot(self):
+        return CampusSnapshot(self.templates)
+
+    def _templates(self):
+        return self.templates
+
+    def _entry_template(self, requirement):
+        return self.templates[self.snapshot.batch_template[requirement.batch]]
+
+    def generate_timetable(self, time_budget=None, starts=1, workers=None, progress=None):
+        """Generate every template, one search per independent component
+
+        ``starts`` is ignored: parallelism comes from the components instead.
+        ``time_budget`` is shared out like the starts of a single template,
+        and ``progress`` is called as each component finishes. Fixed entries
+        are pinned as in ``TimetableOptimizer.generate_timetable``.
+        """
+        started = monotonic()
+        self.error = None
+        self.saved = False
+        self.component_results = []
+        self._usage = self._utilization = self._workload = None
+        try:
+            check_time_budget(time_budget)
+            with self.profile.phase('requirements'):
+                class_requirements = self._generate_class_requirements()
+
+            with self.profile.phase('prioritisation'):
+                class_requirements = self._prioritize_requirements(class_requirements)
+
+            with self.profile.phase('loading'):
+                base_state, _ = self._pin_entries(
+                    self._load_entries(fixed_only=True), lambda entry: 'fixed'
+                )
+            total = len(class_requirements)
+            class_requirements = [
+                requirement for requirement in class_requirements
+                if requirement.index not in self.pinned
+            ]
+
+            with self.profile.phase('decomposition'):
+                self.components = find_components(self.problem, class_requirements)
+            self.seeds = self._derive_seeds(max(1, len(self.components)))
+
+            with self.profile.phase('search'):
+                self._solve_components(base_state, time_budget, started, workers, total, progress)
+
+            self.best_seed = self.seeds[0]
+            self.tracking_loaded = not self.held
+            self.conflicts = [
+                self._conflict_message(requirement)
+                for requirement in class_requirements
+                if self.state.assignments[requirement.index] is None
+            ]
+
+            with self.profile.phase('persistence'):
+                self._persist_entries()
+            self.saved = True
+
+            self._write_performance_log()
+            return not self.conflicts
+
+        except Exception as e:
+            self.error = str(e)
+            print(f"Error in campus timetable generation: {str(e)}")
+            return False
+
+    def template_summary(self):
+        """``(placed, total, conflicts)`` for each template, in template order"""
+        summary = [(0, 0, []) for _ in self.templates]
+        for requirement in self.problem.requirements:
+            position = self.snapshot.batch_template[requirement.batch]
+            placed, total, conflicts = summary[position]
+            if self.state.assignments[requirement.index] is not None:
+                placed += 1
+            else:
+                conflicts.append(self._conflict_message(requirement))
+            summary[position] = (placed, total + 1, conflicts)
+        return summary
+
+    def _solve_components(self, base_state, time_budget, started, workers, total, progress=None):
+        """Search every component from the same base state and merge the results
+
+        Components share no resources, so each one's placements can be laid
+        over the others without conflicts.
+        """
+        workers = workers or max(1, min(len(self.components), os.cpu_count() or 1))
+        budget = None
+        if time_budget:
+            waves = -(-len(self.components) // workers)
+            budget = max(time_budget - (monotonic() - started), 0) / waves
+
+        self.state = base_state.copy()
+        self.component_results = [None] * len(self.components)
+
+        def merge(position, assignments):
+            component = self.components[position]
+            placed = 0
+            for requirement in component:
+                assignment = assignments[requirement.index]
+                if assignment is not None:
+                    self.state.place(requirement, *assignment)
+                    placed += 1
+            self.component_results[position] = (placed, len(component))
+            if progress is not None:
+                progress(self._count_scheduled(), total, self.problem.penalty(self.state))
+
+        if workers == 1 or len(self.components) <= 1:
+            for position, (component, seed) in enumerate(zip(self.components, self.seeds)):
+                deadline = monotonic() + budget if budget else None
+                run = SearchRun(self.problem, base_state, algorithm=self.algorithm, seed=seed)
+                run.run(component, deadline)
+                self._record_run(run.profile.phases, run.rejections)
+                merge(position, run.state.assignments)
+            return
+
+        with ProcessPoolExecutor(max_workers=workers, initializer=_setup_worker) as pool:
+            futures = {
+                pool.submit(
+                    _run_start, self.problem, base_state, self.algorithm,
+                    [requirement.index for requirement in component], seed, budget
+                ): position
+                for position, (component, seed) in enumerate(zip(self.components, self.seeds))
+            }
+            for future in as_completed(futures):
+                result = future.result()
+                self._record_run(result[4], result[5])
+                merge(futures[future], result[1])
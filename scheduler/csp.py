@@ -0,0 +1,301 @@
+import random
+import time
+from itertools import islice
+
+
+class BacktrackingSolver:
+    """Bounded backtracking search over a SchedulingProblem with MRV and forward checking
+
+    Every unassigned requirement keeps a slot domain: a slot stays in the
+    domain while the batch is free and at least one (room, faculty) pair for
+    the requirement is free and within workload limits there. Variables are
+    picked most-constrained first. After each placement only the
+    requirements sharing its batch, room or faculty are re-checked, and a
+    wiped-out domain rejects the value immediately. Removals are recorded on
+    a trail so backtracking restores domains exactly.
+
+    Search is bounded three ways: each requirement tries at most
+    ``max_values`` placements, each dead end may undo at most
+    ``conflict_backtracks`` earlier choices, and the whole solve at most
+    ``max_backtracks``. A requirement whose dead end cannot be repaired
+    within budget is skipped and reported as unscheduled instead of failing
+    the whole solve. Once the total budget is spent the search also stops
+    enforcing forward checking and finishes greedily. When the monotonic
+    clock passes ``deadline`` the search stops where it is, keeping the
+    placements made so far and reporting the rest as unscheduled.
+    """
+
+    def __init__(self, problem, state, requirements, max_backtracks=5000, conflict_backtracks=50,
+                 max_values=16, rng=None, deadline=None):
+        self.problem = problem
+        self.state = state
+        self.requirements = requirements
+        self.backtracks_left = max_backtracks
+        self.conflict_backtracks = conflict_backtracks
+        self.max_values = max_values
+        self.random = rng or random.Random()
+        self.deadline = deadline
+
+        self.skipped = []
+        self.unassigned = {requirement.index for requirement in requirements}
+        self.trail = []
+        self.stack = []
+
+        self._index_requirements()
+        self._init_domains()
+
+    def _index_requirements(self):
+        """Map each batch, room and faculty to the requirements that may use it"""
+        problem = self.problem
+        self.by_index = {requirement.index: requirement for requirement in self.requirements}
+        self.batch_requirements = [[] for _ in range(problem.n_batches)]
+        self.room_requirements = [[] for _ in range(problem.n_rooms)]
+        self.faculty_requirements = [[] for _ in range(problem.n_faculty)]
+
+        for requirement in self.requirements:
+            self.batch_requirements[requirement.batch].append(requirement)
+            for room in requirement.rooms:
+                self.room_requirements[room].append(requirement)
+            for faculty in requirement.faculty:
+                self.faculty_requirements[faculty].append(requirement)
+
+        self.day_slots = [[] for _ in range(problem.n_days)]
+        for slot in range(problem.n_slots):
+            self.day_slots[problem.slot_day[slot]].append(slot)
+
+    def _init_domains(self):
+        """Compute slot domains, once per (batch, subject) since repeats share them"""
+        n_slots = self.problem.n_slots
+        self.domains = {}
+        self.domain_sizes = {}
+        shared = {}
+
+        for requirement in self.requirements:
+            key = (requirement.batch, requirement.subject)
+            domain = shared.get(key)
+            if domain is None:
+                domain = shared[key] = bytearray(
+                    self._slot_feasible(requirement, slot) for slot in range(n_slots)
+                )
+            self.domains[requirement.index] = bytearray(domain)
+            self.domain_sizes[requirement.index] = sum(domain)
+
+    def _slot_feasible(self, requirement, slot):
+        """Whether any (room, faculty) pair can host the requirement at slot"""
+        n_slots = self.problem.n_slots
+        if (self.state.batch_busy[requirement.batch * n_slots + slot]
+                or self.problem.subject_blocked[requirement.subject * n_slots + slot]):
+            return False
+        return self._has_room(requirement, slot) and self._has_faculty(requirement, slot)
+
+    def _has_room(self, requirement, slot):
+        """Whether one of the requirement's rooms is free at slot"""
+        room_busy = self.state.room_busy
+        n_slots = self.problem.n_slots
+        for room in requirement.rooms:
+            if not room_busy[room * n_slots + slot]:
+                return True
+        return False
+
+    def _has_faculty(self, requirement, slot):
+        """Whether one of the requirement's faculty is free and under their caps at slot"""
+        problem = self.problem
+        state = self.state
+        n_slots = problem.n_slots
+        day = problem.slot_day[slot]
+        for faculty in requirement.faculty:
+            if (not state.faculty_busy[faculty * n_slots + slot]
+                    and state.faculty_day[faculty * problem.n_days + day] < problem.faculty_max_day[faculty]
+                    and state.faculty_week[faculty] < problem.faculty_max_week[faculty]
+                    and (not problem.faculty_max_run[faculty] or problem.run_allows(state, faculty, slot))):
+                return True
+        return False
+
+    def _values(self, requirement):
+        """Feasible (slot, room, faculty) triples for a requirement
+
+        With soft preferences the triples are ranked by placement penalty,
+        so the cheapest are tried first.
+        """
+        values = self._feasible_values(requirement)
+        if not self.problem.has_preferences(requirement):
+            return values
+        placement_penalty = self.problem.placement_penalty
+        return iter(sorted(values, key=lambda value: placement_penalty(requirement, *value)))
+
+    def _feasible_values(self, requirement):
+        """Yield feasible (slot, room, faculty) triples in random slot order"""
+        problem = self.problem
+        state = self.state
+        n_slots = problem.n_slots
+        n_days = problem.n_days
+
+        slots = [slot for slot, allowed in enumerate(self.domains[requirement.index]) if allowed]
+        self.random.shuffle(slots)
+
+        for slot in slots:
+            day = problem.slot_day[slot]
+            for room in requirement.rooms:
+                if state.room_busy[room * n_slots + slot]:
+                    continue
+                for faculty in requirement.faculty:
+                    if state.faculty_busy[faculty * n_slots + slot]:
+                        continue
+                    if state.faculty_day[faculty * n_days + day] >= problem.faculty_max_day[faculty]:
+                        continue
+                    if state.faculty_week[faculty] >= problem.faculty_max_week[faculty]:
+                        continue
+                    if problem.faculty_max_run[faculty] and not problem.run_allows(state, faculty, slot):
+                        continue
+                    yield slot, room, faculty
+
+    def _select(self):
+        """Pick the unassigned requirement with the smallest domain (MRV)"""
+        best = None
+        best_key = None
+        for index in self.unassigned:
+            requirement = self.by_index[index]
+            key = (self.domain_sizes[index], -requirement.priority, index)
+            if best_key is None or key < best_key:
+                best, best_key = requirement, key
+        return best
+
+    def _remove(self, requirement, slot):
+        """Drop slot from a requirement's domain; False when the domain is wiped out"""
+        index = requirement.index
+        self.domains[index][slot] = 0
+        self.domain_sizes[index] -= 1
+        self.trail.append((index, slot))
+        return self.domain_sizes[index] > 0
+
+    def _forward_check(self, requirement, slot, room, faculty):
+        """Prune neighbours of a placement; False if any domain is wiped out
+
+        Each kind of neighbour only needs the check for the resource it
+        shares: the same batch loses the slot outright, rooms and faculty
+        only when no alternative of that kind is left.
+        """
+        problem = self.problem
+        state = self.state
+        domains = self.domains
+        unassigned = self.unassigned
+        consistent = True
+
+        for neighbour in self.batch_requirements[requirement.batch]:
+            if neighbour.index in unassigned and domains[neighbour.index][slot]:
+                consistent = self._remove(neighbour, slot) and consistent
+
+        for neighbour in self.room_requirements[room]:
+            if (neighbour.index in unassigned and domains[neighbour.index][slot]
+                    and not self._has_room(neighbour, slot)):
+                consistent = self._remove(neighbour, slot) and consistent
+
+        # Hitting a workload cap closes the rest of the day or the week, and a
+        # consecutive-period limit may close neighbouring periods. Which
+        # class spends a faculty member's last weekly hour does not depend on
+        # the slot or room chosen, so running out of weekly hours prunes the
+        # other slots for ordering but is not treated as a dead end there.
+        # The placed slot itself is taken whatever the cap, so a neighbour
+        # left without it still rejects the value.
+        day = problem.slot_day[slot]
+        week_closed = state.faculty_week[faculty] >= problem.faculty_max_week[faculty]
+        if week_closed:
+            closed = range(problem.n_slots)
+        elif (state.faculty_day[faculty * problem.n_days + day] >= problem.faculty_max_day[faculty]
+                or problem.faculty_max_run[faculty]):
+            closed = self.day_slots[day]
+        else:
+            closed = (slot,)
+
+        for neighbour in self.faculty_requirements[faculty]:
+            if neighbour.index not in unassigned:
+                continue
+            domain = domains[neighbour.index]
+            for other in closed:
+                if domain[other] and not self._has_faculty(neighbour, other):
+                    consistent = (self._remove(neighbour, other) or (week_closed and other != slot)) and consistent
+
+        return consistent
+
+    def _undo_to(self, mark):
+        """Restore every domain removal recorded after mark"""
+        trail = self.trail
+        while len(trail) > mark:
+            index, slot = trail.pop()
+            self.domains[index][slot] = 1
+            self.domain_sizes[index] += 1
+
+    def _advance(self, frame):
+        """Place the frame's requirement on its next consistent value"""
+        requirement, values, _ = frame
+        enforce = self.backtracks_left > 0
+
+        for slot, room, faculty in values:
+            self.state.place(requirement, slot, room, faculty)
+            self.unassigned.discard(requirement.index)
+            if self._forward_check(requirement, slot, room, faculty) or not enforce:
+                return True
+            self._unplace(frame)
+        return False
+
+    def _unplace(self, frame):
+        """Undo the frame's current placement and its domain pruning"""
+        requirement, _, mark = frame
+        self.state.release(requirement)
+        self.unassigned.add(requirement.index)
+        self._undo_to(mark)
+
+    def _out_of_hours(self, requirement):
+        """Whether every qualified faculty member has used up their weekly hours"""
+        problem = self.problem
+        faculty_week = self.state.faculty_week
+        return all(
+            faculty_week[faculty] >= problem.faculty_max_week[faculty]
+            for faculty in requirement.faculty
+        )
+
+    def _backtrack(self):
+        """Revisit earlier choices until one takes a new value; False if none can"""
+        budget = self.conflict_backtracks
+        while self.stack and self.backtracks_left > 0 and budget > 0 and not self._expired():
+            frame = self.stack.pop()
+            self._unplace(frame)
+            self.backtracks_left -= 1
+            budget -= 1
+            if self._advance(frame):
+                self.stack.append(frame)
+                return True
+        return False
+
+    def _expired(self):
+        """Whether the deadline, if any, has passed"""
+        return self.deadline is not None and time.monotonic() >= self.deadline
+
+    def solve(self):
+        """Assign as many requirements as possible; returns the number placed"""
+        # Requirements with nothing left to try can never be placed
+        for index, size in self.domain_sizes.items():
+            if size == 0:
+                self.unassigned.discard(index)
+                self.skipped.append(self.by_index[index])
+
+        while self.unassigned:
+            if self._expired():
+                self.skipped.extend(self.by_index[index] for index in sorted(self.unassigned))
+                self.unassigned.clear()
+                break
+
+            requirement = self._select()
+            values = islice(self._values(requirement), self.max_values)
+            frame = (requirement, values, len(self.trail))
+
+            if self._advance(frame):
+                self.stack.append(frame)
+                continue
+
+            if self._out_of_hours(requirement) or not self._backtrack():
+                # Out of budget or choices: give up on this requirement only
+                self.unassigned.discard(requirement.index)
+                self.skipped.append(requirement)
+
+        return len(self.requirements) - len(self.skipped)
@@ -6,6 +6,8 @@ from .models import (
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.models import User
 
+from .imports import FORMATS, IMPORTS
+
 # ---------------- Sign Up ----------------
 
 class SignUpForm(UserCreationForm):
@@ -113,7 +115,7 @@ class SubjectForm(forms.ModelForm):
 class BatchForm(forms.ModelForm):
     class Meta:
         model = Batch
-        fields = ['name', 'program', 'department', 'semester', 'year', 'student_count']
+        fields = ['name', 'program', 'department', 'semester', 'year', 'student_count', 'subjects']
         widgets = {
             'name': forms.TextInput(attrs={'class': 'form-control'}),
             'program': forms.Select(attrs={'class': 'form-select'}),
@@ -121,6 +123,7 @@ class BatchForm(forms.ModelForm):
             'semester': forms.NumberInput(attrs={'class': 'form-control', 'min': 1, 'max': 8}),
             'year': forms.NumberInput(attrs={'class': 'form-control'}),
             'student_count': forms.NumberInput(attrs={'class': 'form-control'}),
+            'subjects': forms.SelectMultiple(attrs={'class': 'form-select'}),
         }
 
 # ---------------- TimeSlot ----------------
@@ -139,13 +142,14 @@ class TimeSlotForm(forms.ModelForm):
 class TimetableTemplateForm(forms.ModelForm):
     class Meta:
         model = TimetableTemplate
-        fields = ['name', 'department', 'academic_year', 'semester', 'max_classes_per_day', 'is_active', 'is_approved']
+        fields = ['name', 'department', 'academic_year', 'semester', 'max_classes_per_day', 'algorithm', 'is_active', 'is_approved']
         widgets = {
             'name': forms.TextInput(attrs={'class': 'form-control'}),
             'department': forms.Select(attrs={'class': 'form-select'}),
             'academic_year': forms.TextInput(attrs={'class': 'form-control'}),
             'semester': forms.NumberInput(attrs={'class': 'form-control'}),
             'max_classes_per_day': forms.NumberInput(attrs={'class': 'form-control'}),
+            'algorithm': forms.Select(attrs={'class': 'form-select'}),
             'is_active': forms.CheckboxInput(attrs={'class': 'form-check-input'}),
             'is_approved': forms.CheckboxInput(attrs={'class': 'form-check-input'}),
         }
@@ -180,3 +184,24 @@ class SchedulingConstraintForm(forms.ModelForm):
             'priority': forms.NumberInput(attrs={'class': 'form-control', 'min': 1, 'max': 5}),
             'is_active': forms.CheckboxInput(attrs={'class': 'form-check-input'}),
         }
+
+# ---------------- Master Data Import ----------------
+class MasterDataImportForm(forms.Form):
+    resource = forms.ChoiceField(
+        choices=[(resource, resource.replace('_', ' ').capitalize()) for resource in IMPORTS],
+        widget=forms.Select(attrs={'class': 'form-select'})
+    )
+    file = forms.FileField(
+        help_text="CSV with a header row, a JSON array, or JSON Lines; columns are the field names",
+        widget=forms.ClearableFileInput(attrs={'class': 'form-control', 'accept': '.csv,.json,.jsonl,.ndjson'})
+    )
+    file_format = forms.ChoiceField(
+        choices=[('', 'From file extension')] + [(file_format, file_format.upper()) for file_format in FORMATS],
+        required=False,
+        widget=forms.Select(attrs={'class': 'form-select'})
+    )
+    dry_run = forms.BooleanField(
+        required=False,
+        label="Validate only",
+        widget=forms.CheckboxInput(attrs={'class': 'form-check-input'})
+    )
@@ -0,0 +1,79 @@
+from .models import TimeSlot, TimetableEntry
+from .snapshot import DAY_INDEX
+
+
+# Columns fetched for every grid cell, so entries never load model instances
+GRID_FIELDS = (
+    'id', 'time_slot_id', 'is_fixed',
+    'batch_id', 'batch__name', 'batch__calendar_token',
+    'faculty_id', 'faculty__employee_name', 'faculty__calendar_token',
+    'classroom_id', 'classroom__name', 'classroom__calendar_token',
+    'subject__code', 'subject__name',
+)
+
+# Grid kind -> (owner id field, owner name field, owner calendar token field)
+GRID_OWNERS = {
+    'batch': ('batch_id', 'batch__name', 'batch__calendar_token'),
+    'faculty': ('faculty_id', 'faculty__employee_name', 'faculty__calendar_token'),
+    'classroom': ('classroom_id', 'classroom__name', 'classroom__calendar_token'),
+}
+
+
+def build_timetable_grids(template):
+    """Per-batch, per-faculty and per-classroom week grids for a template
+
+    Two queries regardless of size: the time slots and a ``.values()``
+    projection of the entries, which are pivoted in Python. Days run in
+    weekday order and rows are the distinct periods of the week, so every
+    grid has the same shape::
+
+        {
+            'days': [('monday', 'Monday'), ...],
+            'periods': [(start_time, end_time), ...],
+            'batch': [{'id': ..., 'name': ..., 'token': ..., 'rows': [(period, [cell, ...]), ...]}, ...],
+            'faculty': [...],
+            'classroom': [...],
+            'total': <number of entries>,
+        }
+
+    A cell is the entry's values dict, ``'break'`` for a break slot, or
+    None when the period is free or has no slot that day.
+    """
+    slots = sorted(TimeSlot.objects.all(), key=lambda slot: (DAY_INDEX[slot.day], slot.start_time))
+    days = [(day, label) for day, label in TimeSlot.DAYS_OF_WEEK if any(slot.day == day for slot in slots)]
+    periods = sorted({(slot.start_time, slot.end_time) for slot in slots})
+
+    day_column = {day: column for column, (day, _) in enumerate(days)}
+    period_row = {period: row for row, period in enumerate(periods)}
+    position = {
+        slot.id: (period_row[slot.start_time, slot.end_time], day_column[slot.day])
+        for slot in slots
+    }
+
+    # Break cells are the same in every grid
+    blank = [[None] * len(days) for _ in periods]
+    for slot in slots:
+        if slot.is_break:
+            row, column = position[slot.id]
+            blank[row][column] = 'break'
+
+    grids = {'days': days, 'periods': periods, 'total': 0}
+    owners = {kind: {} for kind in GRID_OWNERS}
+    entries = TimetableEntry.objects.filter(template=template).values(*GRID_FIELDS)
+    for entry in entries:
+        row, column = position[entry['time_slot_id']]
+        for kind, (id_field, name_field, token_field) in GRID_OWNERS.items():
+            grid = owners[kind].get(entry[id_field])
+            if grid is None:
+                grid = owners[kind][entry[id_field]] = {
+                    'id': entry[id_field],
+                    'name': entry[name_field],
+                    'token': entry[token_field],
+                    'rows': [(period, list(cells)) for period, cells in zip(periods, blank)],
+                }
+            grid['rows'][row][1][column] = entry
+        grids['total'] += 1
+
+    for kind in GRID_OWNERS:
+        grids[kind] = sorted(owners[kind].values(), key=lambda grid: grid['name'])
+    return grids
@@ -0,0 +1,144 @@
+import hashlib
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.utils import timezone
+
+from .models import Batch, Classroom, Faculty, TimeSlot, TimetableEntry, TimetableTemplate
+
+
+# Feed kind -> (owner model, owner name field, entry field)
+FEED_OWNERS = {
+    'faculty': (Faculty, 'employee_name', 'faculty_id'),
+    'batch': (Batch, 'name', 'batch_id'),
+    'classroom': (Classroom, 'name', 'classroom_id'),
+}
+
+FEED_CHUNK_SIZE = 2000
+
+# Columns fetched for every event, so entries never load model instances
+EVENT_FIELDS = (
+    'id', 'template_id', 'time_slot__day', 'time_slot__start_time', 'time_slot__end_time',
+    'subject__code', 'subject__name', 'faculty__employee_name', 'batch__name', 'classroom__name',
+)
+
+DAY_OFFSET = {day: offset for offset, (day, _) in enumerate(TimeSlot.DAYS_OF_WEEK)}
+
+
+class FeedVersion:
+    """What an owner's feed is built from: the active templates it appears in, at their revisions
+
+    One query, so a client polling with ``If-None-Match`` is answered
+    before any entry is read. Any bumped revision, or a template joining or
+    leaving the set, changes the ETag. There is no Last-Modified: when a
+    template leaves the set the latest remaining revision can be older than
+    the one a client last saw, so a date could not tell the change apart.
+    """
+
+    def __init__(self, kind, object_id):
+        self.kind = kind
+        self.object_id = object_id
+        self.templates = list(
+            TimetableTemplate.objects.filter(
+                is_active=True, **{f'entries__{FEED_OWNERS[kind][2]}': object_id}
+            ).distinct().order_by('id').values_list('id', 'revision', 'revised_at', 'created_at')
+        )
+
+    @property
+    def template_ids(self):
+        return [template_id for template_id, _, _, _ in self.templates]
+
+    @property
+    def etag(self):
+        versions = ','.join(f'{template_id}.{revision}' for template_id, revision, _, _ in self.templates)
+        digest = hashlib.md5(f'{self.kind}:{self.object_id}:{versions}'.encode()).hexdigest()
+        return f'"{digest}"'
+
+
+def escape_text(value):
+    """Escape a TEXT property value (RFC 5545 section 3.3.11)"""
+    return (str(value).replace('\\', '\\\\').replace(';', '\\;')
+            .replace(',', '\\,').replace('\n', '\\n'))
+
+
+def fold_line(line):
+    """Fold a content line to 75 octets, continuation lines starting with a space"""
+    encoded = line.encode()
+    if len(encoded) <= 75:
+        return line + '\r\n'
+    parts = []
+    start = 0
+    limit = 75
+    while start < len(encoded):
+        end = min(start + limit, len(encoded))
+        # Never split inside a multi-byte character
+        while end < len(encoded) and encoded[end] & 0xC0 == 0x80:
+            end -= 1
+        parts.append(encoded[start:end].decode())
+        start = end
+        limit = 74
+    return '\r\n '.join(parts) + '\r\n'
+
+
+def _utc(value):
+    return value.astimezone(dt_timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+def _week_start(value):
+    """The Monday of the local week the datetime falls in, as a date"""
+    day = timezone.localtime(value).date()
+    return day - timedelta(days=day.weekday())
+
+
+def stream_feed(version, calendar_name, host):
+    """Yield an iCalendar document for the owner's entries, a few lines at a time
+
+    Each entry becomes a weekly recurring event in floating local time,
+    first occurring in the week its template was created. Entries are read
+    with one projected query in chunks, so memory use does not grow with
+    the timetable.
+    """
+    yield ''.join([
+        fold_line('BEGIN:VCALENDAR'),
+        fold_line('VERSION:2.0'),
+        fold_line('PRODID:-//Smart Scheduler//Timetable//EN'),
+        fold_line('CALSCALE:GREGORIAN'),
+        fold_line('METHOD:PUBLISH'),
+        fold_line(f'X-WR-CALNAME:{escape_text(calendar_name)}'),
+    ])
+
+    if version.templates:
+        anchors = {}
+        stamps = {}
+        for template_id, _, revised_at, created_at in version.templates:
+            anchors[template_id] = _week_start(created_at)
+            stamps[template_id] = _utc(revised_at or created_at)
+
+        entry_field = FEED_OWNERS[version.kind][2]
+        rows = TimetableEntry.objects.filter(
+            template_id__in=version.template_ids, **{entry_field: version.object_id}
+        ).order_by('id').values_list(*EVENT_FIELDS)
+
+        for entry_id, template_id, day, start, end, code, subject, faculty, batch, classroom in rows.iterator(
+            chunk_size=FEED_CHUNK_SIZE
+        ):
+            description = '\n'.join([subject, faculty, batch])
+            date = anchors[template_id] + timedelta(days=DAY_OFFSET.get(day, 0))
+            yield ''.join([
+                fold_line('BEGIN:VEVENT'),
+                fold_line(f'UID:timetable-entry-{entry_id}@{host}'),
+                fold_line(f'DTSTAMP:{stamps[template_id]}'),
+                fold_line(f'DTSTART:{datetime.combine(date, start):%Y%m%dT%H%M%S}'),
+                fold_line(f'DTEND:{datetime.combine(date, end):%Y%m%dT%H%M%S}'),
+                fold_line('RRULE:FREQ=WEEKLY'),
+                fold_line(f'SUMMARY:{escape_text(f"{code} {subject}")}'),
+                fold_line(f'LOCATION:{escape_text(classroom)}'),
+                fold_line(f'DESCRIPTION:{escape_text(description)}'),
+                fold_line('END:VEVENT'),
+            ])
+
+    yield fold_line('END:VCALENDAR')
+
+
+def feed_headers(version):
+    """Validator headers for a feed response"""
+    return {'ETag': version.etag}
@@ -0,0 +1,349 @@
+import csv
+import json
+import os
+import re
+
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, models, transaction
+
+from .models import Batch, Classroom, Department, Faculty, FacultySubject, Subject, TimeSlot
+from .occupancy import ENTRY_PARENTS, bump_revisions_using
+from .stats import invalidate_dashboard_stats
+
+
+# Model -> column other files use to refer to its rows
+REFERENCE_KEYS = {Department: 'code', Faculty: 'employee_id', Subject: 'code'}
+
+# Resource -> model, the fields that identify an existing row, plain columns,
+# foreign key columns (given as the related row's reference key) and
+# many-to-many columns (a list, or codes separated by spaces or semicolons)
+IMPORTS = {
+    'departments': {
+        'model': Department,
+        'key': ('code',),
+        'fields': ('name', 'code'),
+    },
+    'classrooms': {
+        'model': Classroom,
+        'key': ('name',),
+        'fields': ('name', 'capacity', 'room_type', 'has_projector', 'has_ac', 'is_available'),
+        'references': ('department',),
+    },
+    'faculty': {
+        'model': Faculty,
+        'key': ('employee_id',),
+        'fields': ('employee_name', 'employee_id', 'phone', 'max_hours_per_day', 'max_hours_per_week',
+                   'avg_leaves_per_month', 'is_available'),
+        'references': ('department',),
+    },
+    'subjects': {
+        'model': Subject,
+        'key': ('code',),
+        'fields': ('name', 'code', 'credits', 'subject_type', 'semester', 'hours_per_week', 'requires_lab'),
+        'references': ('department',),
+    },
+    'batches': {
+        'model': Batch,
+        'key': ('department', 'name'),
+        'fields': ('name', 'program', 'semester', 'year', 'student_count'),
+        'references': ('department',),
+        'many': ('subjects',),
+    },
+    'timeslots': {
+        'model': TimeSlot,
+        'key': ('day', 'start_time', 'end_time'),
+        'fields': ('day', 'start_time', 'end_time', 'is_break'),
+    },
+    'faculty_subjects': {
+        'model': FacultySubject,
+        'key': ('faculty', 'subject'),
+        'fields': ('is_primary',),
+        'references': ('faculty', 'subject'),
+    },
+}
+
+FORMATS = ('csv', 'json', 'jsonl')
+IMPORT_CHUNK_SIZE = 1000
+MAX_REPORTED_ERRORS = 100
+
+
+def detect_format(filename):
+    """The import format implied by a file name, CSV unless it ends in .json or .jsonl"""
+    extension = os.path.splitext(filename)[1].lower().lstrip('.')
+    if extension == 'ndjson':
+        return 'jsonl'
+    return extension if extension in FORMATS else 'csv'
+
+
+def read_rows(stream, file_format):
+    """Yield ``(line, row)`` pairs from a text stream
+
+    CSV (with a header row) and JSON Lines are read one row at a time. A
+    JSON document must be an array of objects and is parsed whole, since
+    the standard library has no incremental parser. Raises ValueError for
+    a file that cannot be parsed.
+    """
+    if file_format == 'csv':
+        reader = csv.DictReader(stream)
+        try:
+            for row in reader:
+                yield reader.line_num, row
+        except csv.Error as e:
+            # line_num is still that of the last complete row
+            raise ValueError(f"Line {reader.line_num + 1}: {e}")
+    elif file_format == 'jsonl':
+        for line, text in enumerate(stream, 1):
+            if text.strip():
+                try:
+                    yield line, json.loads(text)
+                except ValueError as e:
+                    raise ValueError(f"Line {line}: invalid JSON ({e})")
+    elif file_format == 'json':
+        rows = json.load(stream)
+        if not isinstance(rows, list):
+            raise ValueError("A JSON import must be an array of objects")
+        yield from enumerate(rows, 1)
+    else:
+        raise ValueError(f"Unknown format: {file_format}")
+
+
+def _blank(value):
+    return value is None or (isinstance(value, str) and not value.strip())
+
+
+# Spreadsheet spellings of booleans, which BooleanField.to_python only partly accepts
+BOOLEANS = {'true': True, 't': True, 'yes': True, 'y': True, '1': True,
+            'false': False, 'f': False, 'no': False, 'n': False, '0': False}
+
+
+def _clean(field, value):
+    if isinstance(value, str):
+        value = value.strip()
+        if isinstance(field, models.BooleanField):
+            value = BOOLEANS.get(value.lower(), value)
+    return field.to_python(value)
+
+
+class MasterDataImport:
+    """Create or update one resource's rows from an iterable of ``(line, row)`` pairs
+
+    Rows are matched to existing records by the resource's key and foreign
+    keys are resolved through maps of every related code or employee id,
+    loaded once up front, so validating a row costs no queries. Each chunk
+    of rows is written with ``bulk_create``/``bulk_update`` in its own
+    transaction. Invalid rows are skipped and reported by line; if a chunk
+    still fails to save, that chunk alone is rolled back and reported.
+
+    Blank or missing columns keep an existing record's value and fall back
+    to the field default for a new one. Bulk writes send no signals, so the
+    dashboard counters are invalidated once at the end, and templates whose
+    entries use an updated row have their revision bumped with each chunk.
+    """
+
+    def __init__(self, resource, chunk_size=IMPORT_CHUNK_SIZE, dry_run=False):
+        config = IMPORTS[resource]
+        self.resource = resource
+        self.model = config['model']
+        self.fields = config['fields']
+        self.references = config.get('references', ())
+        self.many = config.get('many', ())
+        self.chunk_size = max(1, chunk_size)
+        self.dry_run = dry_run
+
+        meta = self.model._meta
+        self.key_fields = config['key']
+        self.key = tuple(meta.get_field(field).attname for field in config['key'])
+        self.update_fields = [field for field in self.fields + self.references if field not in config['key']]
+
+        self.created = 0
+        self.updated = 0
+        self.rejected = 0
+        self.errors = []
+
+        # Reference key -> id for every related row, and key -> id for every existing row
+        self.lookups = {}
+        for field in self.references + self.many:
+            related = meta.get_field(field).related_model
+            self.lookups[field] = dict(related.objects.values_list(REFERENCE_KEYS[related], 'id'))
+        self.existing = {
+            tuple(row[1:]): row[0] for row in self.model.objects.values_list('id', *self.key)
+        }
+
+        # Other unique columns -> the key of the row holding each value
+        self.unique = {}
+        for field in meta.fields:
+            if field.unique and field.editable and not field.primary_key and field.attname not in self.key:
+                self.unique[field.name] = {
+                    row[0]: tuple(row[1:])
+                    for row in self.model.objects.values_list(field.attname, *self.key)
+                }
+
+        self.seen = set()
+
+    def run(self, rows):
+        """Import every row, one chunk at a time; returns self"""
+        chunk = []
+        for line, row in rows:
+            chunk.append((line, row))
+            if len(chunk) >= self.chunk_size:
+                self._import_chunk(chunk)
+                chunk = []
+        if chunk:
+            self._import_chunk(chunk)
+
+        if not self.dry_run and (self.created or self.updated):
+            invalidate_dashboard_stats()
+        return self
+
+    def _reject(self, line, error):
+        self.rejected += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            if isinstance(error, ValidationError):
+                if hasattr(error, 'error_dict'):
+                    error = '; '.join(
+                        f"{field}: {' '.join(messages)}" for field, messages in error.message_dict.items()
+                    )
+                else:
+                    error = ' '.join(error.messages)
+            self.errors.append((line, str(error)))
+
+    def _parse(self, row):
+        """Field values and many-to-many ids from a raw row; raises ValidationError"""
+        if not isinstance(row, dict):
+            raise ValidationError("Expected an object of column values")
+        meta = self.model._meta
+        values = {}
+        many = {}
+        errors = {}
+
+        for field in self.fields:
+            raw = row.get(field)
+            if _blank(raw):
+                continue
+            try:
+                values[field] = _clean(meta.get_field(field), raw)
+            except ValidationError as e:
+                errors[field] = e.messages
+            except (TypeError, ValueError):
+                # to_python of date and time fields only expects strings
+                errors[field] = [f"{raw!r} is not a valid value"]
+
+        for field in self.references + self.many:
+            raw = row.get(field)
+            if _blank(raw):
+                continue
+            codes = raw if isinstance(raw, list) else re.split(r'[;\s]+', str(raw).strip())
+            codes = [str(code).strip() for code in codes if not _blank(code)]
+            unknown = [code for code in codes if code not in self.lookups[field]]
+            if not codes:
+                continue
+            if field in self.references and len(codes) > 1:
+                errors[field] = [f"Expected one code, got {len(codes)}"]
+            elif unknown:
+                related = meta.get_field(field).related_model._meta.verbose_name
+                errors[field] = [f"Unknown {related} {', '.join(unknown)}"]
+            elif field in self.many:
+                many[field] = [self.lookups[field][code] for code in codes]
+            else:
+                values[meta.get_field(field).attname] = self.lookups[field][codes[0]]
+
+        if errors:
+            raise ValidationError(errors)
+        return values, many
+
+    def _import_chunk(self, chunk):
+        meta = self.model._meta
+        parsed = []
+        for line, row in chunk:
+            try:
+                values, many = self._parse(row)
+            except ValidationError as e:
+                self._reject(line, e)
+                continue
+
+            key = tuple(values.get(attname) for attname in self.key)
+            missing = [field for field, value in zip(self.key_fields, key) if value is None]
+            if missing:
+                self._reject(line, f"{', '.join(missing)} is required to match existing records")
+                continue
+            if key in self.seen:
+                self._reject(line, "Duplicate of an earlier row")
+                continue
+            self.seen.add(key)
+            parsed.append((line, key, values, many))
+
+        instances = self.model.objects.in_bulk(
+            [self.existing[key] for _, key, _, _ in parsed if key in self.existing]
+        )
+
+        creates = []
+        updates = []
+        links = []
+        for line, key, values, many in parsed:
+            instance = instances.get(self.existing.get(key))
+            if instance is None:
+                instance = self.model()
+            for attname, value in values.items():
+                setattr(instance, attname, value)
+
+            errors = {}
+            if instance.pk is None:
+                for field in self.references:
+                    reference = meta.get_field(field)
+                    if not reference.null and getattr(instance, reference.attname) is None:
+                        errors[field] = ["This field is required."]
+            for field, holders in self.unique.items():
+                holder = holders.get(getattr(instance, field))
+                if holder is not None and holder != key:
+                    errors[field] = [f"{getattr(instance, field)} belongs to another {meta.verbose_name}"]
+            try:
+                instance.full_clean(exclude=self.references + self.many, validate_unique=False,
+                                    validate_constraints=False)
+            except ValidationError as e:
+                for field, messages in e.message_dict.items():
+                    errors.setdefault(field, []).extend(messages)
+            if errors:
+                self._reject(line, ValidationError(errors))
+                continue
+
+            for field, holders in self.unique.items():
+                holders[getattr(instance, field)] = key
+            (updates if instance.pk else creates).append(instance)
+            for field, ids in many.items():
+                links.append((field, instance, instance.pk is not None, ids))
+
+        if self.dry_run:
+            self.created += len(creates)
+            self.updated += len(updates)
+            return
+
+        try:
+            with transaction.atomic():
+                self.model.objects.bulk_create(creates)
+                if updates and self.update_fields:
+                    self.model.objects.bulk_update(updates, self.update_fields)
+                    if self.model in ENTRY_PARENTS:
+                        bump_revisions_using(ENTRY_PARENTS[self.model], [instance.pk for instance in updates])
+                for field in self.many:
+                    # Listed links replace an existing row's links
+                    through = meta.get_field(field).remote_field.through
+                    source = f'{meta.model_name}_id'
+                    target = f'{meta.get_field(field).related_model._meta.model_name}_id'
+                    through.objects.filter(**{f'{source}__in': [
+                        instance.pk for linked, instance, existed, _ in links if linked == field and existed
+                    ]}).delete()
+                    through.objects.bulk_create([
+                        through(**{source: instance.pk, target: related_id})
+                        for linked, instance, _, ids in links if linked == field
+                        for related_id in dict.fromkeys(ids)
+                    ])
+        except IntegrityError as e:
+            self.rejected += len(creates) + len(updates)
+            if len(self.errors) < MAX_REPORTED_ERRORS:
+                self.errors.append((chunk[0][0], f"Rows from line {chunk[0][0]} to {chunk[-1][0]} were not saved: {e}"))
+            return
+
+        for instance in creates:
+            self.existing[tuple(getattr(instance, attname) for attname in self.key)] = instance.pk
+        self.created += len(creates)
+        self.updated += len(updates)
@@ -0,0 +1,70 @@
+import time
+from contextlib import contextmanager, nullcontext
+
+
+def bytes_written():
+    """Bytes this process has passed to write calls so far, or None off Linux"""
+    try:
+        with open('/proc/self/io') as f:
+            for line in f:
+                if line.startswith('wchar:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+class PhaseProfile:
+    """Wall time, CPU time, SQL queries and bytes written per named phase
+
+    Queries are counted with an execute wrapper on ``connection`` when one
+    is given, so counting works without DEBUG. Profiles built without a
+    connection (inside the ORM-free search) only time their phases.
+    Entering a phase again adds to its totals.
+    """
+
+    def __init__(self, connection=None):
+        self.connection = connection
+        self.phases = {}
+
+    def _totals(self, name):
+        totals = self.phases.get(name)
+        if totals is None:
+            totals = self.phases[name] = {'wall_time': 0.0, 'cpu_time': 0.0, 'queries': 0, 'bytes_written': 0}
+        return totals
+
+    @contextmanager
+    def phase(self, name):
+        totals = self._totals(name)
+        queries = [0]
+
+        def count(execute, sql, params, many, context):
+            queries[0] += 1
+            return execute(sql, params, many, context)
+
+        wrapper = self.connection.execute_wrapper(count) if self.connection is not None else nullcontext()
+        written = bytes_written()
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        try:
+            with wrapper:
+                yield
+        finally:
+            totals['wall_time'] += time.perf_counter() - wall
+            totals['cpu_time'] += time.process_time() - cpu
+            totals['queries'] += queries[0]
+            if written is not None:
+                totals['bytes_written'] += bytes_written() - written
+
+    def merge(self, phases):
+        """Add phase totals recorded elsewhere, e.g. by a worker process"""
+        for name, recorded in phases.items():
+            totals = self._totals(name)
+            for key, value in recorded.items():
+                totals[key] += value
+
+    def as_dict(self):
+        return {
+            name: dict(totals, wall_time=round(totals['wall_time'], 6), cpu_time=round(totals['cpu_time'], 6))
+            for name, totals in self.phases.items()
+        }
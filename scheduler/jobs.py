@@ -0,0 +1,99 @@
+import threading
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.db import DatabaseError, IntegrityError, connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import GenerationJob
+
+
+# Seconds between heartbeats of a running job, and without one before its worker is presumed dead
+HEARTBEAT_INTERVAL = 10
+STALE_AFTER = 120
+
+
+def fail_stale_jobs():
+    """Fail running jobs whose worker stopped sending heartbeats; returns how many
+
+    A worker that is killed or runs out of memory mid-solve leaves its job
+    running, which would block the template's next job for good. Stale jobs
+    are failed rather than requeued, so a job that takes its worker down is
+    not retried forever.
+    """
+    cutoff = timezone.now() - timedelta(seconds=STALE_AFTER)
+    return GenerationJob.objects.filter(
+        Q(heartbeat_at__lt=cutoff) | Q(heartbeat_at__isnull=True, started_at__lt=cutoff),
+        status='running',
+    ).update(
+        status='failed', finished_at=timezone.now(),
+        message=f"The worker stopped responding for over {STALE_AFTER} seconds"
+    )
+
+
+class GenerationInProgress(Exception):
+    """Some of the templates already have a generation job in flight"""
+
+    def __init__(self, jobs):
+        self.jobs = jobs
+        super().__init__(
+            "Already being generated: " + ', '.join(f"{job.template.name} (job {job.id})" for job in jobs)
+        )
+
+
+def start_jobs(templates, worker, seed=None):
+    """Create a running job for every template at once, taking each template's single-flight lock
+
+    For solves that run outside the queue, e.g. a campus-wide generation,
+    so they never rewrite a template while a worker is generating it. All
+    or none of the locks are taken; raises GenerationInProgress naming the
+    jobs in the way.
+    """
+    fail_stale_jobs()
+    now = timezone.now()
+    try:
+        with transaction.atomic():
+            return GenerationJob.objects.bulk_create([
+                GenerationJob(
+                    template=template, status='running', worker=worker, seed=seed,
+                    started_at=now, heartbeat_at=now
+                )
+                for template in templates
+            ])
+    except IntegrityError:
+        raise GenerationInProgress(list(
+            GenerationJob.objects.filter(
+                template__in=templates, status__in=GenerationJob.ACTIVE_STATUSES
+            ).select_related('template')
+        ))
+
+
+@contextmanager
+def heartbeat(job_ids, interval=HEARTBEAT_INTERVAL):
+    """Refresh the running jobs' heartbeat from a background thread while the block runs
+
+    The solve itself may not report progress for minutes, e.g. during a
+    large construction, so liveness is not tied to progress callbacks.
+    """
+    stop = threading.Event()
+
+    def beat():
+        try:
+            while not stop.wait(interval):
+                try:
+                    GenerationJob.objects.filter(id__in=job_ids, status='running').update(
+                        heartbeat_at=timezone.now()
+                    )
+                except DatabaseError:
+                    pass  # e.g. SQLite locked by the solve's own commit; the next beat retries
+        finally:
+            connection.close()
+
+    thread = threading.Thread(target=beat, name='generation-heartbeat', daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
@@ -0,0 +1,234 @@
+import math
+import random
+import time
+from array import array
+
+
+class LocalSearch:
+    """Anytime simulated-annealing improvement of a SolverState
+
+    The cost of a timetable is ``unscheduled_weight`` per unscheduled class
+    plus the problem's soft-constraint penalty. Each step tries one of three
+    neighbourhood moves:
+
+    * insert an unscheduled class, ejecting whatever occupies its batch,
+      room or faculty slot;
+    * move a scheduled class to another (slot, room, faculty), with the
+      same ejection rule;
+    * swap the slots of two classes of the same batch.
+
+    Worse moves are accepted with probability ``exp(-delta / T)``. The
+    temperature cools with elapsed wall-clock time, so the schedule fits
+    whatever budget is given. The best state seen is restored when the
+    deadline passes.
+    """
+
+    def __init__(self, problem, state, requirements, rng=None, unscheduled_weight=100,
+                 start_temperature=10.0, end_temperature=0.05):
+        self.problem = problem
+        self.state = state
+        self.requirements = requirements
+        self.random = rng or random.Random()
+        self.unscheduled_weight = unscheduled_weight
+        self.start_temperature = start_temperature
+        self.end_temperature = end_temperature
+        self.iterations = 0
+
+        n_slots = problem.n_slots
+        self.batch_occupant = array('i', [-1]) * (problem.n_batches * n_slots)
+        self.room_occupant = array('i', [-1]) * (problem.n_rooms * n_slots)
+        self.faculty_occupant = array('i', [-1]) * (problem.n_faculty * n_slots)
+        self.day_counts = array('H', [0]) * (problem.n_batches * problem.n_subjects * problem.n_days)
+
+        self.by_index = {requirement.index: requirement for requirement in requirements}
+        self.placed = []
+        self.unplaced = []
+        self.position = {}
+        self.cost = 0
+
+        for requirement in requirements:
+            assignment = state.assignments[requirement.index]
+            if assignment is None:
+                self._track(self.unplaced, requirement.index)
+                self.cost += unscheduled_weight
+            else:
+                state.release(requirement)
+                self._place(requirement, *assignment, initial=True)
+
+    def _track(self, bucket, index):
+        self.position[index] = len(bucket)
+        bucket.append(index)
+
+    def _untrack(self, bucket, index):
+        position = self.position.pop(index)
+        last = bucket.pop()
+        if last != index:
+            bucket[position] = last
+            self.position[last] = position
+
+    def _day_key(self, requirement, slot):
+        problem = self.problem
+        return (requirement.batch * problem.n_subjects + requirement.subject) * problem.n_days + problem.slot_day[slot]
+
+    def _place(self, requirement, slot, room, faculty, initial=False):
+        """Place a requirement on free resources and update the cost"""
+        n_slots = self.problem.n_slots
+        index = requirement.index
+        self.state.place(requirement, slot, room, faculty)
+        self.batch_occupant[requirement.batch * n_slots + slot] = index
+        self.room_occupant[room * n_slots + slot] = index
+        self.faculty_occupant[faculty * n_slots + slot] = index
+
+        key = self._day_key(requirement, slot)
+        if self.day_counts[key]:
+            self.cost += 1
+        self.day_counts[key] += 1
+        self.cost += self.problem.placement_penalty(requirement, slot, room, faculty)
+
+        if not initial:
+            self._untrack(self.unplaced, index)
+            self.cost -= self.unscheduled_weight
+        self._track(self.placed, index)
+
+    def _remove(self, requirement):
+        """Unassign a placed requirement and update the cost"""
+        n_slots = self.problem.n_slots
+        index = requirement.index
+        slot, room, faculty = self.state.assignments[index]
+        self.state.release(requirement)
+        self.batch_occupant[requirement.batch * n_slots + slot] = -1
+        self.room_occupant[room * n_slots + slot] = -1
+        self.faculty_occupant[faculty * n_slots + slot] = -1
+
+        key = self._day_key(requirement, slot)
+        self.day_counts[key] -= 1
+        if self.day_counts[key]:
+            self.cost -= 1
+        self.cost -= self.problem.placement_penalty(requirement, slot, room, faculty)
+
+        self._untrack(self.placed, index)
+        self._track(self.unplaced, index)
+        self.cost += self.unscheduled_weight
+        return slot, room, faculty
+
+    def _within_caps(self, slot, faculty):
+        problem = self.problem
+        state = self.state
+        return (state.faculty_day[faculty * problem.n_days + problem.slot_day[slot]] < problem.faculty_max_day[faculty]
+                and state.faculty_week[faculty] < problem.faculty_max_week[faculty]
+                and (not problem.faculty_max_run[faculty] or problem.run_allows(state, faculty, slot)))
+
+    def _eject_and_place(self, requirement, slot, room, faculty, undo):
+        """Free the batch, room and faculty at slot, then place; False if caps forbid it"""
+        n_slots = self.problem.n_slots
+        for occupant in (self.batch_occupant[requirement.batch * n_slots + slot],
+                         self.room_occupant[room * n_slots + slot],
+                         self.faculty_occupant[faculty * n_slots + slot]):
+            if occupant >= 0 and self.state.assignments[occupant] is not None:
+                ejected = self.by_index[occupant]
+                undo.append((ejected, self._remove(ejected)))
+
+        # Resources held by entries outside the search or blocked by
+        # constraints cannot be ejected
+        state = self.state
+        if (state.batch_busy[requirement.batch * n_slots + slot]
+                or self.problem.subject_blocked[requirement.subject * n_slots + slot]
+                or state.room_busy[room * n_slots + slot]
+                or state.faculty_busy[faculty * n_slots + slot]
+                or not self._within_caps(slot, faculty)):
+            return False
+        self._place(requirement, slot, room, faculty)
+        return True
+
+    def _random_value(self, requirement):
+        choice = self.random.choice
+        return (self.random.randrange(self.problem.n_slots), choice(requirement.rooms), choice(requirement.faculty))
+
+    def _try_move(self, temperature):
+        """Apply one random move; keep it or roll it back by the annealing rule"""
+        before = self.cost
+        undo = []
+        placed_now = []
+
+        move = self.random.random()
+        if self.unplaced and (move < 0.5 or not self.placed):
+            requirement = self.by_index[self.random.choice(self.unplaced)]
+            if not requirement.rooms or not requirement.faculty:
+                return
+            ok = self._eject_and_place(requirement, *self._random_value(requirement), undo)
+            placed_now.append(requirement)
+        elif move < 0.8 or len(self.placed) < 2:
+            requirement = self.by_index[self.random.choice(self.placed)]
+            undo.append((requirement, self._remove(requirement)))
+            ok = self._eject_and_place(requirement, *self._random_value(requirement), undo)
+            placed_now.append(requirement)
+        else:
+            first = self.by_index[self.random.choice(self.placed)]
+            second = self.by_index[self.random.choice(self.placed)]
+            if first is second or first.batch != second.batch:
+                return
+            first_value = self._remove(first)
+            second_value = self._remove(second)
+            undo.extend([(first, first_value), (second, second_value)])
+            ok = self._eject_and_place(first, second_value[0], first_value[1], first_value[2], undo)
+            if ok:
+                placed_now.append(first)
+                ok = self._eject_and_place(second, first_value[0], second_value[1], second_value[2], undo)
+                placed_now.append(second)
+
+        delta = self.cost - before
+        if ok and (delta <= 0 or self.random.random() < math.exp(-delta / temperature)):
+            return
+
+        for requirement in reversed(placed_now):
+            if self.state.assignments[requirement.index] is not None:
+                self._remove(requirement)
+        for requirement, value in reversed(undo):
+            self._place(requirement, *value)
+
+    def run(self, deadline, progress=None):
+        """Improve until the monotonic clock reaches deadline; returns the best cost
+
+        ``progress`` is called as ``progress(placed, penalty)`` for the best
+        state whenever it improves, at most once per temperature update.
+        """
+        start = time.monotonic()
+        span = max(deadline - start, 1e-6)
+        ratio = self.end_temperature / self.start_temperature
+
+        best_cost = self.cost
+        best = list(self.state.assignments)
+        best_placed = len(self.placed)
+        reported = None
+        temperature = self.start_temperature
+
+        while True:
+            if self.iterations % 256 == 0:
+                if progress is not None and reported != best_cost:
+                    reported = best_cost
+                    unplaced = len(self.requirements) - best_placed
+                    progress(best_placed, best_cost - unplaced * self.unscheduled_weight)
+                now = time.monotonic()
+                if now >= deadline or not self.requirements:
+                    break
+                temperature = self.start_temperature * ratio ** ((now - start) / span)
+
+            self._try_move(temperature)
+            self.iterations += 1
+
+            if self.cost < best_cost:
+                best_cost = self.cost
+                best = list(self.state.assignments)
+                best_placed = len(self.placed)
+
+        self._restore(best)
+        return best_cost
+
+    def _restore(self, assignments):
+        """Reset the state to a saved assignment list"""
+        for index in list(self.placed):
+            self._remove(self.by_index[index])
+        for requirement in self.requirements:
+            value = assignments[requirement.index]
+            if value is not None:
+                self._place(requirement, *value)
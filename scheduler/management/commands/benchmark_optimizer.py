@@ -0,0 +1,160 @@
+import json
+import platform
+import subprocess
+import time
+import tracemalloc
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from scheduler.models import Classroom, TimeSlot
+from scheduler.synthetic import build_institution
+from scheduler.utils import TimetableOptimizer
+
+
+# Institution parameters per benchmark size; each department becomes one template
+SIZES = {
+    'small': dict(departments=1, batches_per_department=3, subjects_per_batch=5,
+                  faculty_per_department=8, rooms_per_department=3, labs_per_department=1, shared_rooms=1),
+    'medium': dict(departments=4, batches_per_department=6, subjects_per_batch=6,
+                   faculty_per_department=14, qualified_per_subject=2, rooms_per_department=5, labs_per_department=2, shared_rooms=4),
+    'large': dict(departments=8, batches_per_department=10, subjects_per_batch=7,
+                  faculty_per_department=24, qualified_per_subject=3, rooms_per_department=8, labs_per_department=3, shared_rooms=10),
+    'campus': dict(departments=16, batches_per_department=16, subjects_per_batch=8,
+                   faculty_per_department=40, qualified_per_subject=5, rooms_per_department=12, labs_per_department=4, shared_rooms=24),
+}
+
+
+class Command(BaseCommand):
+    help = "Benchmark timetable generation on synthetic institutions of several sizes"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='small,medium,large', help=f"Comma-separated from {', '.join(SIZES)}")
+        parser.add_argument('--seed', type=int, default=0, help="Seed for the institution and the solver")
+        parser.add_argument('--algorithm', choices=['greedy', 'csp'], default='greedy')
+        parser.add_argument('--time-budget', type=float, default=None, help="Local-search seconds per template")
+        parser.add_argument('--starts', type=int, default=1)
+        parser.add_argument('--output', help="Write the results as JSON to this file")
+        parser.add_argument('--keep', action='store_true',
+                            help="Build one size in the current database and keep it; the database must have "
+                                 "no time slots or shared rooms")
+
+    def handle(self, *args, **options):
+        sizes = [size.strip() for size in options['sizes'].split(',') if size.strip()]
+        unknown = [size for size in sizes if size not in SIZES]
+        if unknown:
+            raise CommandError(f"Unknown sizes: {', '.join(unknown)}")
+
+        if options['keep']:
+            if len(sizes) != 1:
+                raise CommandError("--keep builds a single size")
+            # Existing slots and department-less rooms would join every template's problem
+            if TimeSlot.objects.exists() or Classroom.objects.filter(department__isnull=True).exists():
+                raise CommandError(
+                    "--keep needs a database without time slots or shared rooms, or the results "
+                    "would depend on them; run without --keep to use a scratch database"
+                )
+            results = [self.run_size(sizes[0], options)]
+        else:
+            results = self.run_isolated(sizes, options)
+        for result in results:
+            self.stdout.write(
+                f"{result['size']:>8}: {result['scheduled']}/{result['total']} scheduled "
+                f"({result['scheduled_ratio']:.1%}), {result['conflicts']} conflicts, "
+                f"{result['wall_time']:.3f}s, {result['queries']} queries, "
+                f"{result['peak_memory'] / 1024 / 1024:.1f} MiB peak"
+            )
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump({'environment': self.environment(options), 'results': results}, f, indent=2)
+            self.stdout.write(f"Results written to {options['output']}")
+
+    def run_isolated(self, sizes, options):
+        """Run each size in a freshly migrated scratch database, rolled back between sizes
+
+        The benchmark then never sees the slots, rooms or faculty already in
+        the configured database, so results compare across machines.
+        """
+        creation = connection.creation
+        old_name = creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            results = []
+            for size in sizes:
+                with transaction.atomic():
+                    results.append(self.run_size(size, options))
+                    transaction.set_rollback(True)
+            return results
+        finally:
+            creation.destroy_test_db(old_name, verbosity=0)
+
+    def run_size(self, size, options):
+        params = dict(SIZES[size], prefix=f'BM{size[0].upper()}', seed=options['seed'])
+        templates = build_institution(**params)
+        for template in templates:
+            template.algorithm = options['algorithm']
+
+        result = {
+            'size': size,
+            'params': params,
+            'templates': len(templates),
+            'wall_time': 0.0,
+            'queries': 0,
+            'peak_memory': 0,
+            'scheduled': 0,
+            'total': 0,
+            'conflicts': 0,
+            'penalty': 0,
+        }
+
+        for template in templates:
+            # Timed run: query capture is cheap, tracing allocations is not
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                optimizer = self.generate(template, options)
+                result['wall_time'] += time.perf_counter() - started
+            result['queries'] += len(queries)
+
+            result['scheduled'] += optimizer._count_scheduled()
+            result['total'] += len(optimizer.problem.requirements)
+            result['conflicts'] += len(optimizer.conflicts)
+            result['penalty'] += optimizer.problem.penalty(optimizer.state)
+
+            # The same seed repeats the same work under tracemalloc for peak memory
+            tracemalloc.start()
+            self.generate(template, options)
+            result['peak_memory'] = max(result['peak_memory'], tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+
+        result['scheduled_ratio'] = result['scheduled'] / result['total'] if result['total'] else 1.0
+        return result
+
+    def generate(self, template, options):
+        optimizer = TimetableOptimizer(template, seed=options['seed'])
+        optimizer.generate_timetable(time_budget=options['time_budget'], starts=options['starts'])
+        if optimizer.error:
+            raise CommandError(f"Generation failed for {template.name}: {optimizer.error}")
+        return optimizer
+
+    def environment(self, options):
+        """Enough context to compare result files across commits and machines"""
+        try:
+            commit = subprocess.run(
+                ['git', 'rev-parse', 'HEAD'], cwd=settings.BASE_DIR, capture_output=True, text=True, check=True
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            commit = None
+
+        return {
+            'commit': commit,
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'algorithm': options['algorithm'],
+            'time_budget': options['time_budget'],
+            'starts': options['starts'],
+            'seed': options['seed'],
+        }
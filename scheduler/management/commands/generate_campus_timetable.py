@@ -0,0 +1,80 @@
+import os
+import socket
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from scheduler.campus import CampusOptimizer
+from scheduler.jobs import GenerationInProgress, heartbeat, start_jobs
+from scheduler.models import GenerationJob, TimetableTemplate
+
+
+class Command(BaseCommand):
+    help = "Generate several templates together so they never share a room or faculty member at once"
+
+    def add_arguments(self, parser):
+        parser.add_argument('templates', nargs='*', type=int, help="Template ids (default: every active template)")
+        parser.add_argument('--seed', type=int, default=None)
+        parser.add_argument('--time-budget', type=float, default=None, help="Local-search seconds in total")
+        parser.add_argument('--workers', type=int, default=None, help="Processes for the independent components")
+
+    def handle(self, *args, **options):
+        if options['templates']:
+            templates = list(TimetableTemplate.objects.filter(id__in=options['templates']).order_by('id'))
+            missing = set(options['templates']) - {template.id for template in templates}
+            if missing:
+                raise CommandError(f"Unknown templates: {', '.join(map(str, sorted(missing)))}")
+        else:
+            templates = list(TimetableTemplate.objects.filter(is_active=True).order_by('id'))
+        if not templates:
+            raise CommandError("No templates to generate")
+
+        # A running job per template keeps queued workers off them until the solve is saved
+        try:
+            optimizer = CampusOptimizer(templates, seed=options['seed'])
+            jobs = start_jobs(templates, f"campus:{socket.gethostname()}:{os.getpid()}", seed=options['seed'])
+        except (ValueError, GenerationInProgress) as e:
+            raise CommandError(str(e))
+
+        try:
+            with heartbeat([job.id for job in jobs]):
+                optimizer.generate_timetable(time_budget=options['time_budget'], workers=options['workers'])
+        finally:
+            self.finish_jobs(jobs, optimizer)
+        if optimizer.error:
+            raise CommandError(f"Generation failed: {optimizer.error}")
+
+        complete = sum(1 for placed, total in optimizer.component_results if placed == total)
+        self.stdout.write(
+            f"{optimizer._count_scheduled()}/{len(optimizer.problem.requirements)} classes scheduled "
+            f"across {len(templates)} templates in {len(optimizer.components)} components, "
+            f"{complete} fully scheduled (seed {optimizer.seeds[0]})"
+        )
+        for conflict in optimizer.conflicts:
+            self.stdout.write(f"  {conflict}")
+
+    def finish_jobs(self, jobs, optimizer):
+        """Record each template's outcome on its job, releasing the locks"""
+        finished = timezone.now()
+        summary = optimizer.template_summary() if optimizer.saved else None
+        fields = ['status', 'seed', 'placed', 'total', 'message', 'finished_at']
+        for position, job in enumerate(jobs):
+            job.finished_at = finished
+            if summary is not None:
+                job.status = 'succeeded'
+                job.seed = optimizer.seeds[0]
+                job.placed, job.total, conflicts = summary[position]
+                job.message = '\n'.join(conflicts)
+            else:
+                job.status = 'failed'
+                job.message = optimizer.error or "Campus generation was interrupted"
+
+            # As in the worker, a job failed as stale meanwhile stays failed;
+            # its template may already have a newer job
+            updated = GenerationJob.objects.filter(id=job.id, status='running').update(
+                **{field: getattr(job, field) for field in fields}
+            )
+            if not updated:
+                self.stderr.write(
+                    f"Job {job.id} was no longer running when it {job.status}; its result was not recorded"
+                )
@@ -0,0 +1,37 @@
+from time import monotonic
+
+from django.core.management.base import BaseCommand, CommandError
+
+from scheduler.imports import FORMATS, IMPORT_CHUNK_SIZE, IMPORTS, MasterDataImport, detect_format, read_rows
+
+
+class Command(BaseCommand):
+    help = "Create or update departments, classrooms, faculty, subjects, batches, time slots or faculty subjects from a CSV or JSON file"
+
+    def add_arguments(self, parser):
+        parser.add_argument('resource', choices=sorted(IMPORTS))
+        parser.add_argument('path', help="CSV with a header row, a JSON array, or JSON Lines")
+        parser.add_argument('--format', choices=FORMATS, default=None, help="Default: from the file extension")
+        parser.add_argument('--chunk-size', type=int, default=IMPORT_CHUNK_SIZE, help="Rows written per transaction")
+        parser.add_argument('--dry-run', action='store_true', help="Validate every row without saving")
+
+    def handle(self, *args, **options):
+        file_format = options['format'] or detect_format(options['path'])
+        started = monotonic()
+        try:
+            with open(options['path'], encoding='utf-8-sig', newline='') as stream:
+                result = MasterDataImport(
+                    options['resource'], chunk_size=options['chunk_size'], dry_run=options['dry_run']
+                ).run(read_rows(stream, file_format))
+        except (OSError, UnicodeDecodeError, ValueError) as e:
+            raise CommandError(str(e))
+
+        verb = "would be" if options['dry_run'] else "were"
+        self.stdout.write(
+            f"{options['resource']}: {result.created} {verb} created, {result.updated} {verb} updated, "
+            f"{result.rejected} rejected in {monotonic() - started:.1f}s"
+        )
+        for line, error in result.errors:
+            self.stdout.write(f"  line {line}: {error}")
+        if result.rejected > len(result.errors):
+            self.stdout.write(f"  ... and {result.rejected - len(result.errors)} more")
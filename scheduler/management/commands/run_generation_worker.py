@@ -0,0 +1,112 @@
+import os
+import socket
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+
+from scheduler.jobs import fail_stale_jobs, heartbeat
+from scheduler.models import GenerationJob
+from scheduler.utils import TimetableOptimizer
+
+
+class Command(BaseCommand):
+    help = "Run queued timetable generation jobs"
+
+    # Seconds between progress writes, so fast searches do not hammer the database
+    PROGRESS_INTERVAL = 1.0
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Exit when the queue is empty")
+        parser.add_argument('--poll-interval', type=float, default=2.0, help="Seconds to wait for new jobs")
+        parser.add_argument('--workers', type=int, default=None, help="Processes per multi-start job")
+
+    def handle(self, *args, **options):
+        self.name = f"{socket.gethostname()}:{os.getpid()}"
+        self.stdout.write(f"Generation worker {self.name} started")
+
+        while True:
+            job = self.claim_job()
+            if job is None:
+                if options['once']:
+                    break
+                time.sleep(options['poll_interval'])
+                continue
+            self.run_job(job, options['workers'])
+
+    def claim_job(self):
+        """Take the oldest queued job, or None when there is nothing to do
+
+        The row is locked with SKIP LOCKED where the database supports it, so
+        concurrent workers pick different jobs, and the status change is a
+        conditional update so a job is only ever claimed once. Jobs left
+        running by a dead worker are failed first, so they stop blocking
+        their templates.
+        """
+        stale = fail_stale_jobs()
+        if stale:
+            self.stdout.write(f"Failed {stale} job(s) abandoned by a stopped worker")
+
+        with transaction.atomic():
+            queued = GenerationJob.objects.filter(status='queued').order_by('created_at', 'id')
+            if connection.features.has_select_for_update_skip_locked:
+                queued = queued.select_for_update(skip_locked=True)
+            job = queued.first()
+            if job is None:
+                return None
+
+            claimed = GenerationJob.objects.filter(id=job.id, status='queued').update(
+                status='running', worker=self.name, started_at=timezone.now(), heartbeat_at=timezone.now()
+            )
+            if not claimed:
+                return None
+
+        job.refresh_from_db()
+        return job
+
+    def run_job(self, job, workers):
+        self.stdout.write(f"Generating {job.template} (job {job.id})")
+        last_write = [0.0]
+
+        def progress(placed, total, penalty):
+            now = time.monotonic()
+            if now - last_write[0] < self.PROGRESS_INTERVAL:
+                return
+            last_write[0] = now
+            GenerationJob.objects.filter(id=job.id, status='running').update(
+                placed=placed, total=total, best_penalty=penalty
+            )
+
+        try:
+            with heartbeat([job.id]):
+                optimizer = TimetableOptimizer(job.template, seed=job.seed)
+                optimizer.generate_timetable(
+                    time_budget=job.time_budget, starts=job.starts, workers=workers, progress=progress
+                )
+            error = optimizer.error
+        except Exception as e:
+            optimizer = None
+            error = str(e)
+
+        job.finished_at = timezone.now()
+        if error is None:
+            job.status = 'succeeded'
+            job.seed = optimizer.seeds[0]
+            job.placed = optimizer._count_scheduled()
+            job.total = len(optimizer.problem.requirements)
+            job.best_penalty = optimizer.problem.penalty(optimizer.state)
+            job.message = '\n'.join(optimizer.conflicts)
+        else:
+            job.status = 'failed'
+            job.message = error
+        # A job failed as stale meanwhile stays failed; its template may already have a newer job
+        fields = ['status', 'seed', 'placed', 'total', 'best_penalty', 'message', 'finished_at']
+        finished = GenerationJob.objects.filter(id=job.id, status='running').update(
+            **{field: getattr(job, field) for field in fields}
+        )
+        if not finished:
+            self.stderr.write(f"Job {job.id} was no longer running when it {job.status}; its result was not recorded")
+            return
+
+        self.stdout.write(f"Job {job.id} {job.status}: {job.placed}/{job.total} classes scheduled")
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-17 03:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scheduler', '0004_remove_batch_subjects_alter_faculty_employee_name'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='batch',
+            name='subjects',
+            field=models.ManyToManyField(blank=True, related_name='batches', to='scheduler.subject'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-17 03:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scheduler', '0005_batch_subjects'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='timetabletemplate',
+            name='algorithm',
+            field=models.CharField(choices=[('greedy', 'Greedy First-Fit'), ('csp', 'Constraint Satisfaction (Backtracking)')], default='greedy', max_length=20),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-17 04:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scheduler', '0007_generationjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='timetabletemplate',
+            name='revision',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
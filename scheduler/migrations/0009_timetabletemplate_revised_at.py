@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-17 09:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scheduler', '0008_timetabletemplate_revision'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='timetabletemplate',
+            name='revised_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 4.2.7 on 2026-10-17 05:20
+
+from django.db import migrations, models
+
+import scheduler.models
+
+
+OWNERS = ('batch', 'classroom', 'faculty')
+
+
+def fill_tokens(apps, schema_editor):
+    for model_name in OWNERS:
+        model = apps.get_model('scheduler', model_name)
+        rows = list(model.objects.only('id'))
+        for row in rows:
+            row.calendar_token = scheduler.models.new_calendar_token()
+        model.objects.bulk_update(rows, ['calendar_token'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scheduler', '0010_generationjob_heartbeat_at'),
+    ]
+
+    operations = [
+        *[
+            migrations.AddField(
+                model_name=model_name,
+                name='calendar_token',
+                field=models.CharField(editable=False, max_length=64, null=True),
+            )
+            for model_name in OWNERS
+        ],
+        migrations.RunPython(fill_tokens, migrations.RunPython.noop),
+        *[
+            migrations.AlterField(
+                model_name=model_name,
+                name='calendar_token',
+                field=models.CharField(
+                    default=scheduler.models.new_calendar_token, editable=False, max_length=64, unique=True
+                ),
+            )
+            for model_name in OWNERS
+        ],
+    ]
@@ -1,9 +1,16 @@
 # Create your models here.
+import secrets
+
 from django.db import models
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator, MaxValueValidator
 
 
+def new_calendar_token():
+    """Unguessable key for a calendar feed URL"""
+    return secrets.token_urlsafe(24)
+
+
 class Department(models.Model):
     name = models.CharField(max_length=100, unique=True)
     code = models.CharField(max_length=10, unique=True)
@@ -28,6 +35,7 @@ class Classroom(models.Model):
     has_projector = models.BooleanField(default=False)
     has_ac = models.BooleanField(default=False)
     is_available = models.BooleanField(default=True)
+    calendar_token = models.CharField(max_length=64, unique=True, default=new_calendar_token, editable=False)
     
     def __str__(self):
         return f"{self.name} (Capacity: {self.capacity})"
@@ -43,6 +51,7 @@ class Faculty(models.Model):
     max_hours_per_week = models.PositiveIntegerField(default=30)
     avg_leaves_per_month = models.PositiveIntegerField(default=2)
     is_available = models.BooleanField(default=True)
+    calendar_token = models.CharField(max_length=64, unique=True, default=new_calendar_token, editable=False)
     
     class Meta:
         verbose_name_plural = "Faculties"
@@ -85,6 +94,8 @@ class Batch(models.Model):
     semester = models.PositiveIntegerField(validators=[MinValueValidator(1), MaxValueValidator(8)])
     year = models.PositiveIntegerField()
     student_count = models.PositiveIntegerField()
+    subjects = models.ManyToManyField('Subject', blank=True, related_name='batches')
+    calendar_token = models.CharField(max_length=64, unique=True, default=new_calendar_token, editable=False)
     
     def __str__(self):
         return f"{self.name} - Semester {self.semester}"
@@ -114,16 +125,24 @@ class TimeSlot(models.Model):
 
 
 class TimetableTemplate(models.Model):
+    ALGORITHMS = [
+        ('greedy', 'Greedy First-Fit'),
+        ('csp', 'Constraint Satisfaction (Backtracking)'),
+    ]
+    
     name = models.CharField(max_length=100)
     department = models.ForeignKey(Department, on_delete=models.CASCADE)
     academic_year = models.CharField(max_length=20)
     semester = models.PositiveIntegerField(validators=[MinValueValidator(1), MaxValueValidator(8)])
     max_classes_per_day = models.PositiveIntegerField(default=6)
+    algorithm = models.CharField(max_length=20, choices=ALGORITHMS, default='greedy')
     created_by = models.ForeignKey(User, on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
     is_active = models.BooleanField(default=False)
     is_approved = models.BooleanField(default=False)
     approved_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='approved_timetables')
+    revision = models.PositiveIntegerField(default=0)  # Bumped whenever the template's entries change
+    revised_at = models.DateTimeField(null=True, blank=True)  # When the revision was last bumped
     
     def __str__(self):
         return f"{self.name} - {self.academic_year}"
@@ -180,4 +199,48 @@ class SchedulingConstraint(models.Model):
     is_active = models.BooleanField(default=True)
     
     def __str__(self):
-        return f"{self.name} ({self.get_constraint_type_display()})"
\ No newline at end of file
+        return f"{self.name} ({self.get_constraint_type_display()})"
+
+
+class GenerationJob(models.Model):
+    STATUSES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('succeeded', 'Succeeded'),
+        ('failed', 'Failed'),
+    ]
+    ACTIVE_STATUSES = ['queued', 'running']
+    
+    # Upper bounds on what a request may ask of a worker
+    MAX_STARTS = 32
+    MAX_TIME_BUDGET = 3600  # Seconds
+    
+    template = models.ForeignKey(TimetableTemplate, on_delete=models.CASCADE, related_name='generation_jobs')
+    status = models.CharField(max_length=20, choices=STATUSES, default='queued')
+    requested_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    seed = models.BigIntegerField(null=True, blank=True)  # Base seed; drawn by the worker when empty
+    starts = models.PositiveIntegerField(default=1)
+    time_budget = models.FloatField(null=True, blank=True)  # Seconds of local search, if any
+    placed = models.PositiveIntegerField(default=0)
+    total = models.PositiveIntegerField(default=0)
+    best_penalty = models.PositiveIntegerField(null=True, blank=True)
+    message = models.TextField(blank=True)
+    worker = models.CharField(max_length=100, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)  # Refreshed by the worker while running
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        constraints = [
+            # Single flight: at most one queued or running solve per template
+            models.UniqueConstraint(
+                fields=['template'],
+                condition=models.Q(status__in=['queued', 'running']),
+                name='one_active_generation_per_template',
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.template.name} ({self.get_status_display()})"
\ No newline at end of file
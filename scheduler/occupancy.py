@@ -0,0 +1,327 @@
+from collections import Counter, OrderedDict, defaultdict
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Batch, Classroom, Faculty, FacultySubject, Subject, TimeSlot, TimetableEntry, TimetableTemplate
+
+
+# Fields a batch edit may change, and the fields a swap exchanges
+EDITABLE_FIELDS = {'time_slot': TimeSlot, 'classroom': Classroom, 'faculty': Faculty, 'subject': Subject}
+SWAPPED_FIELDS = ('time_slot', 'classroom')
+
+# Entry field for each model that entries point at. Their rows are shown
+# alongside entries (names, times) and deleting one cascades to entries, so
+# changing one changes every template using it
+ENTRY_PARENTS = {Subject: 'subject', Batch: 'batch', Faculty: 'faculty', Classroom: 'classroom', TimeSlot: 'time_slot'}
+
+
+def bump_revision(*template_ids):
+    """Record that these templates' entries changed, so cached indexes and feeds are rebuilt"""
+    TimetableTemplate.objects.filter(id__in=template_ids).update(
+        revision=F('revision') + 1, revised_at=timezone.now()
+    )
+
+
+def bump_revisions_using(field, ids):
+    """Bump every template with an entry whose ``field`` is one of ``ids``, in one query"""
+    TimetableTemplate.objects.filter(
+        id__in=TimetableEntry.objects.filter(**{f'{field}__in': ids}).values('template_id')
+    ).update(revision=F('revision') + 1, revised_at=timezone.now())
+
+
+class OccupancyIndex:
+    """Who and what is busy in each slot of one template, for checking edits without queries
+
+    Built from a single query and tagged with the template revision it
+    reflects. ``for_template`` keeps recently used indexes in memory and
+    rebuilds one as soon as its template's revision has moved on, so any
+    saved change to the entries invalidates it.
+    """
+
+    MAX_CACHED = 64
+    _cache = OrderedDict()
+
+    def __init__(self, template_id, revision):
+        self.template_id = template_id
+        self.revision = revision
+
+        # (time slot id, resource id) -> entry id
+        self.room = {}
+        self.faculty = {}
+        self.batch = {}
+
+        # entry id -> (time slot id, day, classroom id, faculty id, batch id)
+        self.entries = {}
+        self.faculty_day = Counter()
+        self.faculty_week = Counter()
+
+        rows = TimetableEntry.objects.filter(template_id=template_id).values_list(
+            'id', 'time_slot_id', 'time_slot__day', 'classroom_id', 'faculty_id', 'batch_id'
+        )
+        for entry_id, slot, day, room, faculty, batch in rows:
+            self._add(entry_id, slot, day, room, faculty, batch)
+
+    @classmethod
+    def for_template(cls, template):
+        """The cached index for the template, rebuilt if its entries changed since"""
+        index = cls._cache.get(template.id)
+        if index is None or index.revision != template.revision:
+            index = cls(template.id, template.revision)
+            cls._cache[template.id] = index
+            if len(cls._cache) > cls.MAX_CACHED:
+                cls._cache.popitem(last=False)
+        else:
+            cls._cache.move_to_end(template.id)
+        return index
+
+    def _add(self, entry_id, slot, day, room, faculty, batch):
+        self.room[slot, room] = entry_id
+        self.faculty[slot, faculty] = entry_id
+        self.batch[slot, batch] = entry_id
+        self.entries[entry_id] = (slot, day, room, faculty, batch)
+        self.faculty_day[faculty, day] += 1
+        self.faculty_week[faculty] += 1
+
+    def add(self, entry):
+        """Count an entry, e.g. an edited one, at its current field values"""
+        self._add(entry.id, entry.time_slot_id, entry.time_slot.day, entry.classroom_id, entry.faculty_id, entry.batch_id)
+
+    def remove(self, entry_id):
+        """Stop counting an entry"""
+        slot, day, room, faculty, batch = self.entries.pop(entry_id)
+        del self.room[slot, room]
+        del self.faculty[slot, faculty]
+        del self.batch[slot, batch]
+        self.faculty_day[faculty, day] -= 1
+        self.faculty_week[faculty] -= 1
+
+    def copy(self):
+        """A working copy to edit without touching the cached index"""
+        clone = object.__new__(OccupancyIndex)
+        clone.template_id = self.template_id
+        clone.revision = self.revision
+        clone.room = dict(self.room)
+        clone.faculty = dict(self.faculty)
+        clone.batch = dict(self.batch)
+        clone.entries = dict(self.entries)
+        clone.faculty_day = Counter(self.faculty_day)
+        clone.faculty_week = Counter(self.faculty_week)
+        return clone
+
+    def check(self, entry):
+        """Violations the entry would cause if saved with its current field values
+
+        Only the entry's related objects and the index are consulted, so
+        the entry should be loaded with ``select_related``.
+        """
+        violations = []
+        slot = entry.time_slot
+        room = entry.classroom
+        faculty = entry.faculty
+        batch = entry.batch
+        subject = entry.subject
+
+        def clash(code, occupied, key, message):
+            other = occupied.get(key)
+            if other is not None and other != entry.id:
+                violations.append({'code': code, 'message': message, 'entry_id': other})
+
+        if slot.is_break:
+            violations.append({'code': 'break_slot', 'message': f"{slot} is a break"})
+        clash('classroom_busy', self.room, (slot.id, room.id), f"{room.name} is already booked at {slot}")
+        clash('faculty_busy', self.faculty, (slot.id, faculty.id), f"{faculty.employee_name} is already teaching at {slot}")
+        clash('batch_busy', self.batch, (slot.id, batch.id), f"{batch.name} already has a class at {slot}")
+
+        if not room.is_available:
+            violations.append({'code': 'classroom_unavailable', 'message': f"{room.name} is not available"})
+        if room.capacity < batch.student_count:
+            violations.append({
+                'code': 'capacity',
+                'message': f"{room.name} seats {room.capacity}, {batch.name} has {batch.student_count} students"
+            })
+        if subject.requires_lab and room.room_type != 'lab':
+            violations.append({'code': 'lab_required', 'message': f"{subject.name} needs a lab"})
+
+        if not faculty.is_available:
+            violations.append({'code': 'faculty_unavailable', 'message': f"{faculty.employee_name} is not available"})
+
+        # Workload with this entry moved onto the faculty member and day
+        day_load = self.faculty_day[faculty.id, slot.day] + 1
+        week_load = self.faculty_week[faculty.id] + 1
+        current = self.entries.get(entry.id)
+        if current is not None and current[3] == faculty.id:
+            week_load -= 1
+            if current[1] == slot.day:
+                day_load -= 1
+        if day_load > faculty.max_hours_per_day:
+            violations.append({
+                'code': 'daily_limit',
+                'message': f"{faculty.employee_name} would teach {day_load} hours on {slot.get_day_display()} "
+                           f"(limit {faculty.max_hours_per_day})"
+            })
+        if week_load > faculty.max_hours_per_week:
+            violations.append({
+                'code': 'weekly_limit',
+                'message': f"{faculty.employee_name} would teach {week_load} hours a week "
+                           f"(limit {faculty.max_hours_per_week})"
+            })
+
+        return violations
+
+
+def validate_entry(entry, check_qualification=True):
+    """Structured violations for an edited, unsaved entry; empty when it can be saved
+
+    The occupancy and workload checks use the template's cached index;
+    ``check_qualification`` adds one query to confirm the faculty member
+    teaches the subject, which only matters when either of them changed.
+    """
+    violations = OccupancyIndex.for_template(entry.template).check(entry)
+    if check_qualification and not FacultySubject.objects.filter(
+        faculty_id=entry.faculty_id, subject_id=entry.subject_id
+    ).exists():
+        violations.append({
+            'code': 'not_qualified',
+            'message': f"{entry.faculty.employee_name} does not teach {entry.subject.name}"
+        })
+    return violations
+
+
+def parse_id(value):
+    """A positive id that fits the database's integer columns; raises ValueError"""
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        raise ValueError(f"Invalid id: {value!r}")
+    number = int(value)
+    if not 0 < number < 2 ** 63:
+        raise ValueError(f"Invalid id: {value!r}")
+    return number
+
+
+def apply_edits(template_id, operations, validate_only=False):
+    """Apply a list of moves and swaps to a template's entries in one transaction
+
+    ``{'op': 'move', 'entry_id': id, 'time_slot': id, ...}`` sets any of
+    ``EDITABLE_FIELDS`` on an entry; ``{'op': 'swap', 'entry_id': id,
+    'other_id': id}`` exchanges two entries' time slots and classrooms.
+    Operations run in order and the outcome is checked as a whole, so a
+    class may move onto a slot that a later operation vacates.
+
+    Nothing is saved unless every operation is valid, or with
+    ``validate_only``. Changed rows are deleted and inserted again with the
+    same ids, so swaps pass the ``unique_together`` constraints that
+    row-by-row updates would trip over. Returns ``(applied, results)`` with
+    one result per operation; raises ValueError for malformed operations.
+    """
+    if not isinstance(operations, list) or not operations:
+        raise ValueError("operations must be a non-empty list")
+
+    # Parse everything up front so lookups are one query per model
+    parsed = []
+    entry_ids = set()
+    references = defaultdict(set)
+    for operation in operations:
+        if not isinstance(operation, dict):
+            raise ValueError(f"Invalid operation: {operation!r}")
+        kind = operation.get('op')
+        if kind == 'move':
+            involved = [parse_id(operation.get('entry_id'))]
+            changes = {field: parse_id(operation[field]) for field in EDITABLE_FIELDS if field in operation}
+            if not changes:
+                raise ValueError(f"Move of entry {involved[0]} changes nothing")
+            for field, value in changes.items():
+                references[field].add(value)
+        elif kind == 'swap':
+            involved = [parse_id(operation.get('entry_id')), parse_id(operation.get('other_id'))]
+            changes = None
+        else:
+            raise ValueError(f"Unknown operation: {kind!r}")
+        entry_ids.update(involved)
+        parsed.append((kind, involved, changes))
+
+    with transaction.atomic():
+        # Lock the template so concurrent batches on it apply one after another
+        template = TimetableTemplate.objects.select_for_update().get(id=template_id)
+        entries = TimetableEntry.objects.select_related(
+            'time_slot', 'classroom', 'faculty', 'subject', 'batch'
+        ).filter(template=template).in_bulk(entry_ids)
+        objects = {field: EDITABLE_FIELDS[field].objects.in_bulk(ids) for field, ids in references.items()}
+
+        fields = tuple(EDITABLE_FIELDS)
+        original = {
+            entry_id: tuple(getattr(entry, f'{field}_id') for field in fields)
+            for entry_id, entry in entries.items()
+        }
+
+        results = []
+        last_operation = {}
+        for position, (kind, involved, changes) in enumerate(parsed):
+            result = {'index': position, 'op': kind, 'entry_ids': involved, 'violations': []}
+            results.append(result)
+            missing = [entry_id for entry_id in involved if entry_id not in entries]
+            if missing:
+                result['error'] = f"Entry {missing[0]} is not in this timetable"
+                continue
+
+            if kind == 'move':
+                entry = entries[involved[0]]
+                for field, value in changes.items():
+                    instance = objects[field].get(value)
+                    if instance is None:
+                        result['error'] = f"Unknown {field.replace('_', ' ')} {value}"
+                        break
+                    setattr(entry, field, instance)
+            else:
+                first, second = entries[involved[0]], entries[involved[1]]
+                for field in SWAPPED_FIELDS:
+                    first_value, second_value = getattr(first, field), getattr(second, field)
+                    setattr(first, field, second_value)
+                    setattr(second, field, first_value)
+
+            for entry_id in involved:
+                last_operation[entry_id] = position
+
+        # Check the changed entries against the rest of the timetable and each other
+        changed = sorted(
+            (entry for entry_id, entry in entries.items()
+             if tuple(getattr(entry, f'{field}_id') for field in fields) != original[entry_id]),
+            key=lambda entry: last_operation[entry.id]
+        )
+        teaching = [
+            entry for entry in changed
+            if (entry.faculty_id, entry.subject_id) != original[entry.id][2:]
+        ]
+        retaught = {entry.id for entry in teaching}
+        qualified = set()
+        if teaching:
+            qualified = set(FacultySubject.objects.filter(
+                faculty_id__in={entry.faculty_id for entry in teaching},
+                subject_id__in={entry.subject_id for entry in teaching}
+            ).values_list('faculty_id', 'subject_id'))
+
+        index = OccupancyIndex.for_template(template).copy()
+        for entry in changed:
+            index.remove(entry.id)
+        for entry in changed:
+            violations = index.check(entry)
+            if entry.id in retaught and (entry.faculty_id, entry.subject_id) not in qualified:
+                violations.append({
+                    'code': 'not_qualified',
+                    'message': f"{entry.faculty.employee_name} does not teach {entry.subject.name}"
+                })
+            index.add(entry)
+            results[last_operation[entry.id]]['violations'] += [
+                dict(violation, edited_entry_id=entry.id) for violation in violations
+            ]
+
+        for result in results:
+            result['success'] = 'error' not in result and not result['violations']
+
+        applied = not validate_only and bool(changed) and all(result['success'] for result in results)
+        if applied:
+            TimetableEntry.objects.filter(id__in=[entry.id for entry in changed]).delete()
+            TimetableEntry.objects.bulk_create(changed)
+            bump_revision(template.id)
+
+    return applied, results
@@ -0,0 +1,40 @@
+def keyset_page(queryset, before=None, after=None, size=25):
+    """One page of ``queryset``, newest id first, located by id instead of offset
+
+    ``before`` returns the page of rows with lower ids than it, ``after``
+    the page with higher ids; with neither the newest rows are returned.
+    Each page is a single indexed range query however deep it is, unlike
+    OFFSET paging. Returns ``(items, older, newer)``, where ``older`` and
+    ``newer`` are the cursors for the neighbouring pages, or None at either
+    end.
+    """
+    if after is not None:
+        # Walk upwards from the cursor, then flip back to newest first
+        items = list(queryset.filter(id__gt=after).order_by('id')[:size + 1])
+        newer = items[size - 1].id if len(items) > size else None
+        items = items[:size][::-1]
+        older = items[-1].id if items else None
+        return items, older, newer
+
+    if before is not None:
+        queryset = queryset.filter(id__lt=before)
+    items = list(queryset.order_by('-id')[:size + 1])
+    older = items[size - 1].id if len(items) > size else None
+    items = items[:size]
+    newer = items[0].id if items and before is not None else None
+    return items, older, newer
+
+
+def keyset_forward(rows, after=None, size=50):
+    """One page of a ``.values()`` queryset in id order, starting after id ``after``
+
+    Returns ``(rows, next)`` where ``next`` is the cursor for the following
+    page, or None on the last one.
+    """
+    if after is not None:
+        rows = rows.filter(id__gt=after)
+    rows = list(rows.order_by('id')[:size + 1])
+    if len(rows) > size:
+        rows = rows[:size]
+        return rows, rows[-1]['id']
+    return rows, None
@@ -0,0 +1,347 @@
+from array import array
+from bisect import bisect_left
+
+from .snapshot import DAY_INDEX
+
+
+class Requirement:
+    """One weekly class to place, with every reference as a dense integer"""
+
+    __slots__ = ('index', 'batch', 'subject', 'class_number', 'requires_lab', 'priority', 'faculty', 'rooms')
+
+    def __init__(self, index, batch, subject, class_number, requires_lab, priority, faculty, rooms):
+        self.index = index
+        self.batch = batch
+        self.subject = subject
+        self.class_number = class_number
+        self.requires_lab = requires_lab
+        self.priority = priority
+        self.faculty = faculty
+        self.rooms = rooms
+
+
+class SchedulingProblem:
+    """Dense, picklable solver view of a CurriculumSnapshot
+
+    Slots, rooms, faculty, batches and subjects are identified by their
+    position in the snapshot's lists. Per-resource attributes are stored in
+    ``array`` columns, and every slot carries a precomputed day, period and
+    week ordinal, so the search loop never touches model instances.
+    """
+
+    # Consecutive periods allowed by a max_continuous constraint, which has no value of its own
+    MAX_CONTINUOUS_PERIODS = 3
+
+    def __init__(self, snapshot):
+        slots = snapshot.time_slots
+        rooms = snapshot.classrooms
+        faculties = snapshot.faculties
+        batches = snapshot.batches
+
+        self.n_slots = len(slots)
+        self.n_rooms = len(rooms)
+        self.n_faculty = len(faculties)
+        self.n_batches = len(batches)
+        self.n_subjects = len(snapshot.subjects)
+        self.n_days = len(DAY_INDEX)
+
+        # Periods are ranked by start time across the week so that the same
+        # clock time shares a period number on every day
+        start_times = sorted({slot.start_time for slot in slots})
+        period_index = {start: index for index, start in enumerate(start_times)}
+        self.periods_per_day = len(start_times)
+        self.slot_day = array('B', (DAY_INDEX[slot.day] for slot in slots))
+        self.slot_period = array('H', (period_index[slot.start_time] for slot in slots))
+        self.slot_ordinal = array('I', (
+            day * self.periods_per_day + period
+            for day, period in zip(self.slot_day, self.slot_period)
+        ))
+
+        self.room_capacity = array('I', (room.capacity for room in rooms))
+        self.room_is_lab = array('B', (room.room_type == 'lab' for room in rooms))
+        self.room_department = array('q', (room.department_id or -1 for room in rooms))
+
+        # No cap above the number of slots can bind, so larger values are clamped
+        self.faculty_max_day = array('I', (min(faculty.max_hours_per_day, self.n_slots) for faculty in faculties))
+        self.faculty_max_week = array('I', (min(faculty.max_hours_per_week, self.n_slots) for faculty in faculties))
+
+        self.batch_size = array('I', (batch.student_count for batch in batches))
+        self.batch_department = array('q', (batch.department_id for batch in batches))
+
+        self.subject_faculty = [tuple(faculty) for faculty in snapshot.subject_faculty]
+
+        # Neighbouring periods on the same day, -1 at either end of the day
+        self.slot_prev = array('i', [-1]) * self.n_slots
+        self.slot_next = array('i', [-1]) * self.n_slots
+        by_ordinal = {ordinal: slot for slot, ordinal in enumerate(self.slot_ordinal)}
+        for slot in range(self.n_slots):
+            if self.slot_period[slot] > 0:
+                self.slot_prev[slot] = by_ordinal.get(self.slot_ordinal[slot] - 1, -1)
+            if self.slot_period[slot] + 1 < self.periods_per_day:
+                self.slot_next[slot] = by_ordinal.get(self.slot_ordinal[slot] + 1, -1)
+
+        self.requirements = []
+        self._build_room_index()
+        self._compile_constraints(snapshot)
+
+    def _build_room_index(self):
+        """Pre-sort rooms once so suitability lookups never rescan them
+
+        Rooms are pooled by (lab only, department) and sorted by capacity, so
+        "capacity >= N" is a bisect into each pool. Batch sizes are bucketed
+        by the distinct room capacities: every size in a bucket gets the same
+        candidate tuple, which is memoised per (bucket, lab, department).
+        """
+        self.capacity_levels = sorted(set(self.room_capacity))
+
+        pools = {}
+        for room in range(self.n_rooms):
+            department = self.room_department[room]
+            pools.setdefault((False, department), []).append(room)
+            if self.room_is_lab[room]:
+                pools.setdefault((True, department), []).append(room)
+
+        self.room_pools = {}
+        for key, pool in pools.items():
+            pool.sort(key=self.room_capacity.__getitem__)
+            self.room_pools[key] = (pool, [self.room_capacity[room] for room in pool])
+
+        self.suitable_rooms_cache = {}
+
+    def _compile_constraints(self, snapshot):
+        """Turn SchedulingConstraint rows into lookup tables
+
+        * ``blocked_time`` is hard. Each of the faculty, subject and room it
+          names is blocked at its time slot; with none of them named the slot
+          is blocked for every class.
+        * ``preferred_time`` and ``room_preference`` are soft. Placing the
+          named faculty or subject outside its preferred slots or rooms costs
+          the constraint's weight, 5 for priority 1 (high) down to 1.
+        * ``no_back_to_back`` and ``max_continuous`` are hard limits on how
+          many consecutive periods the named faculty may teach.
+
+        Rows naming resources outside the snapshot cannot affect it and are
+        ignored, so constraint count never reaches the search loop.
+        """
+        n_slots = self.n_slots
+        self.faculty_blocked = bytearray(self.n_faculty * n_slots)
+        self.room_blocked = bytearray(self.n_rooms * n_slots)
+        self.subject_blocked = bytearray(self.n_subjects * n_slots)
+
+        # Preferred slots / rooms per resource, and the weight of missing them
+        self.faculty_slot_preferred = bytearray(self.n_faculty * n_slots)
+        self.faculty_slot_weight = array('B', [0]) * self.n_faculty
+        self.subject_slot_preferred = bytearray(self.n_subjects * n_slots)
+        self.subject_slot_weight = array('B', [0]) * self.n_subjects
+        self.faculty_room_preferred = bytearray(self.n_faculty * self.n_rooms)
+        self.faculty_room_weight = array('B', [0]) * self.n_faculty
+        self.subject_room_preferred = bytearray(self.n_subjects * self.n_rooms)
+        self.subject_room_weight = array('B', [0]) * self.n_subjects
+
+        # Longest run of consecutive periods per faculty, 0 for no limit
+        self.faculty_max_run = array('B', [0]) * self.n_faculty
+
+        for kind, faculty_id, subject_id, classroom_id, slot_id, priority in snapshot.constraints:
+            faculty = snapshot.faculty_index.get(faculty_id)
+            subject = snapshot.subject_index.get(subject_id)
+            room = snapshot.classroom_index.get(classroom_id)
+            slot = snapshot.slot_index.get(slot_id)
+            weight = max(1, 6 - priority)
+
+            if kind == 'blocked_time':
+                if slot is None:
+                    continue
+                if faculty_id is None and subject_id is None and classroom_id is None:
+                    for subject in range(self.n_subjects):
+                        self.subject_blocked[subject * n_slots + slot] = 1
+                    continue
+                if faculty is not None:
+                    self.faculty_blocked[faculty * n_slots + slot] = 1
+                if subject is not None:
+                    self.subject_blocked[subject * n_slots + slot] = 1
+                if room is not None:
+                    self.room_blocked[room * n_slots + slot] = 1
+
+            elif kind == 'preferred_time' and slot is not None:
+                if faculty is not None:
+                    self.faculty_slot_preferred[faculty * n_slots + slot] = 1
+                    self.faculty_slot_weight[faculty] = max(self.faculty_slot_weight[faculty], weight)
+                if subject is not None:
+                    self.subject_slot_preferred[subject * n_slots + slot] = 1
+                    self.subject_slot_weight[subject] = max(self.subject_slot_weight[subject], weight)
+
+            elif kind == 'room_preference' and room is not None:
+                if faculty is not None:
+                    self.faculty_room_preferred[faculty * self.n_rooms + room] = 1
+                    self.faculty_room_weight[faculty] = max(self.faculty_room_weight[faculty], weight)
+                if subject is not None:
+                    self.subject_room_preferred[subject * self.n_rooms + room] = 1
+                    self.subject_room_weight[subject] = max(self.subject_room_weight[subject], weight)
+
+            elif kind in ('no_back_to_back', 'max_continuous') and faculty is not None:
+                limit = 1 if kind == 'no_back_to_back' else self.MAX_CONTINUOUS_PERIODS
+                current = self.faculty_max_run[faculty]
+                self.faculty_max_run[faculty] = min(current, limit) if current else limit
+
+    def run_allows(self, state, faculty, slot):
+        """Whether faculty can take slot without exceeding their consecutive-period limit"""
+        limit = self.faculty_max_run[faculty]
+        if not limit:
+            return True
+
+        busy = state.faculty_busy
+        blocked = self.faculty_blocked
+        row = faculty * self.n_slots
+        run = 1
+        for step in (self.slot_prev, self.slot_next):
+            other = step[slot]
+            while other >= 0 and busy[row + other] and not blocked[row + other]:
+                run += 1
+                other = step[other]
+        return run <= limit
+
+    def suitable_rooms(self, batch, requires_lab):
+        """Rooms that fit the batch, department rooms first, closest capacity first"""
+        bucket = bisect_left(self.capacity_levels, self.batch_size[batch])
+        department = self.batch_department[batch]
+        key = (bucket, requires_lab, department)
+
+        suitable = self.suitable_rooms_cache.get(key)
+        if suitable is not None:
+            return suitable
+
+        suitable = []
+        if bucket < len(self.capacity_levels):
+            min_capacity = self.capacity_levels[bucket]
+            for owner in (department, -1):
+                pool, capacities = self.room_pools.get((requires_lab, owner), ((), ()))
+                suitable.extend(pool[bisect_left(capacities, min_capacity):])
+
+        suitable = self.suitable_rooms_cache[key] = tuple(suitable)
+        return suitable
+
+    def has_preferences(self, requirement):
+        """Whether any placement of the requirement can cost something, so candidates are worth ranking"""
+        subject = requirement.subject
+        if self.subject_slot_weight[subject] or self.subject_room_weight[subject]:
+            return True
+        return any(
+            self.faculty_slot_weight[faculty] or self.faculty_room_weight[faculty]
+            for faculty in requirement.faculty
+        )
+
+    def placement_penalty(self, requirement, slot, room, faculty):
+        """Soft-constraint cost of one placement on its own"""
+        subject = requirement.subject
+        penalty = 0
+        if self.faculty_slot_weight[faculty] and not self.faculty_slot_preferred[faculty * self.n_slots + slot]:
+            penalty += self.faculty_slot_weight[faculty]
+        if self.subject_slot_weight[subject] and not self.subject_slot_preferred[subject * self.n_slots + slot]:
+            penalty += self.subject_slot_weight[subject]
+        if self.faculty_room_weight[faculty] and not self.faculty_room_preferred[faculty * self.n_rooms + room]:
+            penalty += self.faculty_room_weight[faculty]
+        if self.subject_room_weight[subject] and not self.subject_room_preferred[subject * self.n_rooms + room]:
+            penalty += self.subject_room_weight[subject]
+        return penalty
+
+    def penalty(self, state):
+        """Total soft-constraint cost of a state
+
+        Besides per-placement costs, a batch having the same subject more
+        than once on a day costs one point per extra class.
+        """
+        total = 0
+        day_counts = {}
+        for requirement in self.requirements:
+            assignment = state.assignments[requirement.index]
+            if assignment is None:
+                continue
+            slot, room, faculty = assignment
+            total += self.placement_penalty(requirement, slot, room, faculty)
+
+            key = (requirement.batch, requirement.subject, self.slot_day[slot])
+            if key in day_counts:
+                total += 1
+            day_counts[key] = day_counts.get(key, 0) + 1
+        return total
+
+    def add_requirement(self, batch, subject, class_number, requires_lab, priority):
+        """Append a Requirement with its faculty and room candidates resolved"""
+        requirement = Requirement(
+            len(self.requirements), batch, subject, class_number, requires_lab, priority,
+            self.subject_faculty[subject], self.suitable_rooms(batch, requires_lab)
+        )
+        self.requirements.append(requirement)
+        return requirement
+
+
+class SolverState:
+    """Occupancy, workload and assignments for one candidate timetable
+
+    Occupancy is a flat ``bytearray`` per resource kind indexed by
+    ``resource * n_slots + slot``; workload counters are ``array`` columns.
+    Room and faculty slots blocked by constraints are occupied from the start.
+    """
+
+    __slots__ = (
+        'n_slots', 'n_days', 'batch_busy', 'room_busy', 'faculty_busy',
+        'faculty_week', 'faculty_day', 'assignments', 'slot_day',
+    )
+
+    def __init__(self, problem):
+        self.n_slots = problem.n_slots
+        self.n_days = problem.n_days
+        self.slot_day = problem.slot_day
+        self.batch_busy = bytearray(problem.n_batches * problem.n_slots)
+
+        # Blocked slots start out busy, so every occupancy check honours them
+        self.room_busy = bytearray(problem.room_blocked)
+        self.faculty_busy = bytearray(problem.faculty_blocked)
+        self.faculty_week = array('I', [0]) * problem.n_faculty
+        self.faculty_day = array('I', [0]) * (problem.n_faculty * problem.n_days)
+
+        # requirement index -> (slot, room, faculty) or None
+        self.assignments = [None] * len(problem.requirements)
+
+    def copy(self):
+        """Independent copy, so candidate timetables can share a starting point"""
+        clone = SolverState.__new__(SolverState)
+        clone.n_slots = self.n_slots
+        clone.n_days = self.n_days
+        clone.slot_day = self.slot_day
+        clone.batch_busy = bytearray(self.batch_busy)
+        clone.room_busy = bytearray(self.room_busy)
+        clone.faculty_busy = bytearray(self.faculty_busy)
+        clone.faculty_week = array('I', self.faculty_week)
+        clone.faculty_day = array('I', self.faculty_day)
+        clone.assignments = list(self.assignments)
+        return clone
+
+    def occupy(self, slot, batch, room, faculty):
+        """Mark the resources busy and count the faculty hour"""
+        n_slots = self.n_slots
+        self.batch_busy[batch * n_slots + slot] = 1
+        self.room_busy[room * n_slots + slot] = 1
+        self.faculty_busy[faculty * n_slots + slot] = 1
+        self.faculty_week[faculty] += 1
+        self.faculty_day[faculty * self.n_days + self.slot_day[slot]] += 1
+
+    def vacate(self, slot, batch, room, faculty):
+        """Undo occupy"""
+        n_slots = self.n_slots
+        self.batch_busy[batch * n_slots + slot] = 0
+        self.room_busy[room * n_slots + slot] = 0
+        self.faculty_busy[faculty * n_slots + slot] = 0
+        self.faculty_week[faculty] -= 1
+        self.faculty_day[faculty * self.n_days + self.slot_day[slot]] -= 1
+
+    def place(self, requirement, slot, room, faculty):
+        """Assign a requirement and occupy its resources"""
+        self.assignments[requirement.index] = (slot, room, faculty)
+        self.occupy(slot, requirement.batch, room, faculty)
+
+    def release(self, requirement):
+        """Unassign a requirement and free its resources"""
+        slot, room, faculty = self.assignments[requirement.index]
+        self.assignments[requirement.index] = None
+        self.vacate(slot, requirement.batch, room, faculty)
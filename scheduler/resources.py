@@ -0,0 +1,72 @@
+from functools import reduce
+from operator import or_
+
+from django.db.models import Q
+
+from .models import Batch, Classroom, Department, Faculty, Subject, TimeSlot
+from .pagination import keyset_forward
+
+
+# Tab name -> model, projected columns, searched columns and choice fields
+# whose display labels are added as ``<field>_display``
+RESOURCES = {
+    'departments': {
+        'model': Department,
+        'fields': ('id', 'name', 'code', 'created_at'),
+        'search': ('name', 'code'),
+    },
+    'classrooms': {
+        'model': Classroom,
+        'fields': ('id', 'name', 'capacity', 'room_type', 'department__name', 'has_projector', 'has_ac', 'is_available'),
+        'search': ('name', 'department__name'),
+        'choices': ('room_type',),
+    },
+    'faculty': {
+        'model': Faculty,
+        'fields': ('id', 'employee_name', 'employee_id', 'department__name', 'max_hours_per_day', 'max_hours_per_week', 'is_available'),
+        'search': ('employee_name', 'employee_id', 'department__name'),
+    },
+    'subjects': {
+        'model': Subject,
+        'fields': ('id', 'name', 'code', 'credits', 'subject_type', 'department__name', 'semester', 'hours_per_week'),
+        'search': ('name', 'code', 'department__name'),
+        'choices': ('subject_type',),
+    },
+    'batches': {
+        'model': Batch,
+        'fields': ('id', 'name', 'program', 'department__name', 'semester', 'year', 'student_count'),
+        'search': ('name', 'department__name'),
+        'choices': ('program',),
+    },
+    'timeslots': {
+        'model': TimeSlot,
+        'fields': ('id', 'day', 'start_time', 'end_time', 'is_break'),
+        'search': ('day',),
+        'choices': ('day',),
+    },
+}
+
+MAX_PAGE_SIZE = 200
+
+
+def resource_page(resource, search='', after=None, size=50):
+    """One page of a resource tab as plain dicts, in id order
+
+    Only the tab's columns are selected and ``search`` matches any of its
+    searched columns case-insensitively, so a page costs one query however
+    large the catalogue is. Returns ``(rows, next)`` as ``keyset_forward``
+    does; raises KeyError for an unknown resource.
+    """
+    config = RESOURCES[resource]
+    model = config['model']
+    rows = model.objects.values(*config['fields'])
+    if search:
+        rows = rows.filter(reduce(or_, (Q(**{f'{field}__icontains': search}) for field in config['search'])))
+
+    rows, next_cursor = keyset_forward(rows, after, max(1, min(size, MAX_PAGE_SIZE)))
+
+    for field in config.get('choices', ()):
+        labels = dict(model._meta.get_field(field).choices)
+        for row in rows:
+            row[f'{field}_display'] = labels.get(row[field], row[field])
+    return rows, next_cursor
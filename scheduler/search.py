@@ -0,0 +1,224 @@
+import random
+
+from .csp import BacktrackingSolver
+from .instrumentation import PhaseProfile
+from .local_search import LocalSearch
+
+
+class SearchRun:
+    """One randomised solve of a SchedulingProblem, free of any ORM access
+
+    A run is the greedy first-fit construction, the CSP re-solve for
+    templates using the CSP algorithm, and an optional local-search phase.
+    All randomness comes from ``seed``, so a run is reproducible and can be
+    shipped to a worker process together with the problem.
+
+    Each phase is timed in ``profile``. ``rejections`` counts, per slot
+    tried during construction, why the slot could not take the class.
+    """
+
+    REJECTION_REASONS = ('batch_busy', 'room_busy', 'faculty_busy', 'workload_cap', 'constraint')
+
+    # Backtracks allowed to the CSP engine before it settles for a partial timetable
+    CSP_MAX_BACKTRACKS = 5000
+
+    def __init__(self, problem, base_state, algorithm='greedy', seed=None):
+        self.problem = problem
+        self.algorithm = algorithm
+        self.seed = seed
+        self.random = random.Random(seed)
+
+        # Occupancy that exists before the run starts, e.g. entries kept in place
+        self.base_state = base_state
+        self.state = base_state.copy()
+
+        self.profile = PhaseProfile()
+        self.rejections = dict.fromkeys(('attempted', 'placed') + self.REJECTION_REASONS, 0)
+
+    def run(self, requirements, deadline=None, progress=None):
+        """Place requirements in the given order, then repair and improve
+
+        ``progress``, if given, is called as ``progress(placed, penalty)``
+        after each phase and as local search finds better timetables.
+        """
+        with self.profile.phase('placement'):
+            for requirement in requirements:
+                self._schedule_class(requirement)
+
+        # Try to resolve conflicts with alternative arrangements
+        with self.profile.phase('repair'):
+            self._resolve_conflicts(requirements, deadline)
+        if progress is not None:
+            progress(self.scheduled, self.penalty)
+
+        # Spend the remaining time budget improving the timetable
+        if deadline is not None:
+            with self.profile.phase('improvement'):
+                self._improve(requirements, deadline, progress)
+
+        return self
+
+    def _schedule_class(self, requirement):
+        """Schedule a single class
+
+        Takes the first free slot, room and faculty member. When the class
+        has soft preferences, free slots are ranked instead and the cheapest
+        placement wins, so preferences count without any local search.
+        """
+        if not requirement.faculty:
+            return False
+
+        state = self.state
+        n_slots = self.problem.n_slots
+        n_days = self.problem.n_days
+        slot_day = self.problem.slot_day
+        max_day = self.problem.faculty_max_day
+        max_week = self.problem.faculty_max_week
+        max_run = self.problem.faculty_max_run
+        batch_row = requirement.batch * n_slots
+        subject_row = requirement.subject * n_slots
+        subject_blocked = self.problem.subject_blocked
+
+        # Try each time slot, in random order for better distribution
+        slot_order = list(range(n_slots))
+        self.random.shuffle(slot_order)
+
+        rejected = dict.fromkeys(self.REJECTION_REASONS, 0)
+        ranked = self.problem.has_preferences(requirement)
+        best = None
+        best_cost = None
+
+        for slot in slot_order:
+            # Check if batch is available and the subject may be taught
+            if state.batch_busy[batch_row + slot]:
+                rejected['batch_busy'] += 1
+                continue
+            if subject_blocked[subject_row + slot]:
+                rejected['constraint'] += 1
+                continue
+
+            # Rooms and faculty are independent of each other, so the first
+            # free room goes with the first faculty member who can teach
+            for room in requirement.rooms:
+                if not state.room_busy[room * n_slots + slot]:
+                    break
+            else:
+                rejected['room_busy'] += 1
+                continue
+
+            # Find available faculty within their workload limits
+            chosen = None
+            reason = 'faculty_busy'
+            for faculty in requirement.faculty:
+                if state.faculty_busy[faculty * n_slots + slot]:
+                    continue
+                if (state.faculty_day[faculty * n_days + slot_day[slot]] >= max_day[faculty]
+                        or state.faculty_week[faculty] >= max_week[faculty]):
+                    reason = 'workload_cap'
+                    continue
+                if max_run[faculty] and not self.problem.run_allows(state, faculty, slot):
+                    if reason == 'faculty_busy':
+                        reason = 'constraint'
+                    continue
+                chosen = faculty
+                break
+
+            if chosen is None:
+                rejected[reason] += 1
+                continue
+
+            if not ranked:
+                best = (slot, room, chosen)
+                break
+
+            cost, room, chosen = self._cheapest(requirement, slot, room, chosen)
+            if best is None or cost < best_cost:
+                best, best_cost = (slot, room, chosen), cost
+                if not cost:
+                    break
+
+        placed = best is not None
+        if placed:
+            state.place(requirement, *best)
+
+        rejections = self.rejections
+        for reason, count in rejected.items():
+            rejections[reason] += count
+            rejections['attempted'] += count
+        if placed:
+            rejections['attempted'] += 1
+            rejections['placed'] += 1
+        return placed
+
+    def _cheapest(self, requirement, slot, room, faculty):
+        """Lowest-cost (penalty, room, faculty) at a slot, given one feasible pair"""
+        problem = self.problem
+        state = self.state
+        n_slots = problem.n_slots
+        n_days = problem.n_days
+        day = problem.slot_day[slot]
+
+        free_faculty = [
+            other for other in requirement.faculty
+            if not state.faculty_busy[other * n_slots + slot]
+            and state.faculty_day[other * n_days + day] < problem.faculty_max_day[other]
+            and state.faculty_week[other] < problem.faculty_max_week[other]
+            and (not problem.faculty_max_run[other] or problem.run_allows(state, other, slot))
+        ]
+        best = (problem.placement_penalty(requirement, slot, room, faculty), room, faculty)
+        for other_room in requirement.rooms:
+            if state.room_busy[other_room * n_slots + slot]:
+                continue
+            for other in free_faculty:
+                cost = problem.placement_penalty(requirement, slot, other_room, other)
+                if cost < best[0]:
+                    best = (cost, other_room, other)
+        return best
+
+    def _resolve_conflicts(self, requirements, deadline=None):
+        """Try to resolve scheduling conflicts with alternative arrangements
+
+        Runs using the CSP algorithm re-solve every requirement with the
+        backtracking engine when the greedy pass leaves classes unscheduled,
+        and keep whichever timetable places more classes. The re-solve stops
+        at ``deadline`` with what it has placed by then.
+        """
+        greedy_scheduled = self._placed(requirements)
+        if self.algorithm != 'csp' or greedy_scheduled == len(requirements):
+            return
+
+        greedy_state = self.state
+        self.state = self.base_state.copy()
+        solver = BacktrackingSolver(
+            self.problem, self.state, requirements,
+            max_backtracks=self.CSP_MAX_BACKTRACKS, rng=self.random, deadline=deadline
+        )
+
+        if solver.solve() <= greedy_scheduled:
+            self.state = greedy_state
+
+    def _improve(self, requirements, deadline, progress=None):
+        """Anytime local-search phase; keeps the best timetable found before deadline"""
+        requirements = [requirement for requirement in requirements if requirement.faculty]
+        report = progress
+        if progress is not None:
+            # Local search counts only its own requirements; the others placed
+            # now, e.g. pinned fixed entries, stay placed throughout
+            others = self.scheduled - self._placed(requirements)
+            report = lambda placed, penalty: progress(placed + others, penalty)
+        LocalSearch(self.problem, self.state, requirements, rng=self.random).run(deadline, report)
+
+    def _placed(self, requirements):
+        """Number of the given requirements currently placed"""
+        assignments = self.state.assignments
+        return sum(1 for requirement in requirements if assignments[requirement.index] is not None)
+
+    @property
+    def scheduled(self):
+        """Number of requirements currently placed"""
+        return sum(1 for assignment in self.state.assignments if assignment is not None)
+
+    @property
+    def penalty(self):
+        """Soft-constraint cost of the current timetable"""
+        return self.problem.penalty(self.state)
@@ -0,0 +1,37 @@
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .models import TimetableEntry
+from .occupancy import ENTRY_PARENTS, bump_revision, bump_revisions_using
+from .stats import COUNTED_MODELS, invalidate_dashboard_stats
+
+
+# Only saves are hooked: a post_delete receiver would stop bulk deletes of
+# entries from running as a single query, so the code paths that delete
+# entries bump the revision themselves
+@receiver(post_save, sender=TimetableEntry)
+def entry_saved(sender, instance, **kwargs):
+    bump_revision(instance.template_id)
+
+
+# Changes to the rows entries point at reach every template using them: a
+# rename changes exported feeds and a delete cascades to entries. Deletes
+# are hooked before the cascade runs, while the entries still show which
+# templates lose rows
+def entry_parent_changed(sender, instance, created=False, **kwargs):
+    if not created:
+        bump_revisions_using(ENTRY_PARENTS[sender], [instance.pk])
+
+
+for model in ENTRY_PARENTS:
+    post_save.connect(entry_parent_changed, sender=model, dispatch_uid=f'entry-revision-save-{model.__name__}')
+    pre_delete.connect(entry_parent_changed, sender=model, dispatch_uid=f'entry-revision-delete-{model.__name__}')
+
+
+def counted_model_changed(sender, **kwargs):
+    invalidate_dashboard_stats()
+
+
+for model in COUNTED_MODELS:
+    post_save.connect(counted_model_changed, sender=model, dispatch_uid=f'dashboard-stats-save-{model.__name__}')
+    post_delete.connect(counted_model_changed, sender=model, dispatch_uid=f'dashboard-stats-delete-{model.__name__}')
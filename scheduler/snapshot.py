@@ -0,0 +1,123 @@
+from django.db.models import F, Q
+
+from .models import Batch, Classroom, FacultySubject, SchedulingConstraint, TimeSlot
+
+
+DAY_INDEX = {day: index for index, (day, _) in enumerate(TimeSlot.DAYS_OF_WEEK)}
+
+
+class CurriculumSnapshot:
+    """Everything the solver needs for one template, loaded in a fixed number of queries
+
+    Model instances are kept in flat lists and every relation between them is
+    stored as lists of integer indices into those lists, so the solver can
+    walk the curriculum without touching the ORM again. Loading costs six
+    queries regardless of how many batches, subjects, faculty or scheduling
+    constraints there are.
+    """
+
+    def __init__(self, template):
+        self.template = template
+
+        # The day column sorts alphabetically, so weekday order is applied here
+        self.time_slots = sorted(
+            TimeSlot.objects.filter(is_break=False),
+            key=lambda slot: (DAY_INDEX[slot.day], slot.start_time)
+        )
+        self.classrooms = list(Classroom.objects.filter(is_available=True))
+        self.batches = self._load_batches()
+
+        self.slot_index = {slot.id: index for index, slot in enumerate(self.time_slots)}
+        self.classroom_index = {classroom.id: index for index, classroom in enumerate(self.classrooms)}
+        self.batch_index = {batch.id: index for index, batch in enumerate(self.batches)}
+
+        self.subjects = []
+        self.faculties = []
+
+        # batch index -> subject indices, subject index -> faculty indices
+        self.batch_subjects = [[] for _ in self.batches]
+        self.subject_faculty = []
+
+        self._load_curriculum()
+        self._load_qualified_faculty()
+
+        # Active constraints as plain rows; SchedulingProblem compiles them
+        self.constraints = list(SchedulingConstraint.objects.filter(is_active=True).values_list(
+            'constraint_type', 'faculty_id', 'subject_id', 'classroom_id', 'time_slot_id', 'priority'
+        ))
+
+    def _load_batches(self):
+        """The batches the template timetables"""
+        return list(Batch.objects.filter(
+            department=self.template.department,
+            semester=self.template.semester
+        ))
+
+    def _load_curriculum(self):
+        """Load every (batch, subject) pair for the template's batches in one query"""
+        batch_index = self.batch_index
+        subject_index = {}
+
+        links = Batch.subjects.through.objects.filter(
+            batch_id__in=batch_index
+        ).select_related('subject').order_by('batch_id', 'subject_id')
+
+        for link in links:
+            index = subject_index.get(link.subject_id)
+            if index is None:
+                index = subject_index[link.subject_id] = len(self.subjects)
+                self.subjects.append(link.subject)
+                self.subject_faculty.append([])
+            self.batch_subjects[batch_index[link.batch_id]].append(index)
+
+        self.subject_index = subject_index
+
+    def _load_qualified_faculty(self):
+        """Load available, same-department faculty for every subject in one query"""
+        faculty_index = {}
+
+        faculty_subjects = FacultySubject.objects.filter(
+            subject_id__in=self.subject_index,
+            faculty__is_available=True,
+            faculty__department=F('subject__department')
+        ).select_related('faculty').order_by('subject_id', 'faculty_id')
+
+        for fs in faculty_subjects:
+            index = faculty_index.get(fs.faculty_id)
+            if index is None:
+                index = faculty_index[fs.faculty_id] = len(self.faculties)
+                self.faculties.append(fs.faculty)
+            self.subject_faculty[self.subject_index[fs.subject_id]].append(index)
+
+        self.faculty_index = faculty_index
+
+
+class CampusSnapshot(CurriculumSnapshot):
+    """Several templates loaded as one snapshot, so they share rooms and faculty
+
+    Batches of every template sit in the same lists and ``batch_template``
+    maps each batch index to the index of its template in ``templates``.
+    Loading still costs six queries however many templates there are.
+    """
+
+    def __init__(self, templates):
+        self.templates = list(templates)
+        if not self.templates:
+            raise ValueError("A campus snapshot needs at least one template")
+        super().__init__(self.templates[0])
+
+    def _load_batches(self):
+        owners = {}
+        for index, template in enumerate(self.templates):
+            key = (template.department_id, template.semester)
+            if key in owners:
+                raise ValueError(f"Templates {self.templates[owners[key]]} and {template} timetable the same batches")
+            owners[key] = index
+
+        query = Q()
+        for department_id, semester in owners:
+            query |= Q(department_id=department_id, semester=semester)
+        batches = list(Batch.objects.filter(query))
+
+        self.batch_template = [owners[(batch.department_id, batch.semester)] for batch in batches]
+        return batches
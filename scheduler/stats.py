@@ -0,0 +1,36 @@
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Batch, Classroom, Department, Faculty, Subject, TimetableTemplate
+
+
+STATS_CACHE_KEY = 'scheduler:dashboard-stats'
+
+# Models whose saves and deletes change the dashboard counters
+COUNTED_MODELS = (Department, Classroom, Faculty, Subject, Batch, TimetableTemplate)
+
+
+def dashboard_stats():
+    """Dashboard counters, counted at most once per ``DASHBOARD_STATS_TTL`` seconds
+
+    Saves and deletes through the ORM clear the cached counters straight
+    away (see ``signals``); the TTL bounds how stale they can get after
+    bulk writes, which send no signals, or changes made by other processes
+    when the cache is not shared.
+    """
+    stats = cache.get(STATS_CACHE_KEY)
+    if stats is None:
+        stats = {
+            'total_departments': Department.objects.count(),
+            'total_classrooms': Classroom.objects.count(),
+            'total_faculties': Faculty.objects.count(),
+            'total_subjects': Subject.objects.count(),
+            'total_batches': Batch.objects.count(),
+            'active_timetables': TimetableTemplate.objects.filter(is_active=True).count(),
+        }
+        cache.set(STATS_CACHE_KEY, stats, settings.DASHBOARD_STATS_TTL)
+    return stats
+
+
+def invalidate_dashboard_stats():
+    cache.delete(STATS_CACHE_KEY)
@@ -0,0 +1,112 @@
+import random
+from datetime import time
+
+from django.contrib.auth.models import User
+
+from .models import (
+    Department, Classroom, Faculty, Subject, Batch, TimeSlot,
+    TimetableTemplate, FacultySubject
+)
+
+
+def build_institution(prefix='SYN', departments=2, batches_per_department=4, subjects_per_batch=6,
+                      faculty_per_department=10, qualified_per_subject=2, rooms_per_department=4,
+                      labs_per_department=1, shared_rooms=2, days=6, periods=7, semester=3, seed=0):
+    """Create a synthetic institution in bulk and return one template per department
+
+    Every department teaches ``subjects_per_batch`` subjects to each of its
+    batches in ``semester``; each subject is taught by
+    ``qualified_per_subject`` of the department's faculty. Rooms are a mix
+    of department lecture rooms, department labs and rooms shared by all
+    departments. The weekly grid is ``days`` x ``periods`` one-hour slots
+    from 9:00. Rows are created with ``bulk_create``, a few queries per
+    model regardless of size, and the same seed always builds the same
+    institution.
+    """
+    rnd = random.Random(seed)
+    user = User.objects.get_or_create(username=f'{prefix.lower()}_benchmark')[0]
+
+    TimeSlot.objects.bulk_create([
+        TimeSlot(day=day, start_time=time(9 + period), end_time=time(10 + period))
+        for day, _ in TimeSlot.DAYS_OF_WEEK[:days]
+        for period in range(periods)
+    ], ignore_conflicts=True)
+
+    depts = Department.objects.bulk_create([
+        Department(name=f'{prefix} Department {d}', code=f'{prefix}{d}')
+        for d in range(departments)
+    ])
+
+    rooms = []
+    for dept in depts:
+        rooms += [
+            Classroom(name=f'{dept.code}-R{r}', capacity=rnd.choice([40, 60, 80]), department=dept)
+            for r in range(rooms_per_department)
+        ]
+        rooms += [
+            Classroom(name=f'{dept.code}-L{r}', capacity=60, room_type='lab', department=dept)
+            for r in range(labs_per_department)
+        ]
+    rooms += [
+        Classroom(name=f'{prefix}-S{r}', capacity=rnd.choice([60, 80, 120]))
+        for r in range(shared_rooms)
+    ]
+    Classroom.objects.bulk_create(rooms)
+
+    faculties = Faculty.objects.bulk_create([
+        Faculty(
+            employee_name=f'{dept.code} Faculty {f}', employee_id=f'{dept.code}-F{f}',
+            department=dept, phone='0000000000',
+            max_hours_per_day=rnd.choice([4, 5, 6]), max_hours_per_week=rnd.choice([16, 18, 20])
+        )
+        for dept in depts
+        for f in range(faculty_per_department)
+    ])
+
+    subjects = Subject.objects.bulk_create([
+        Subject(
+            name=f'{dept.code} Subject {s}', code=f'{dept.code}-S{s}', credits=3,
+            subject_type=rnd.choice(['core', 'core', 'elective']), department=dept, semester=semester,
+            hours_per_week=rnd.choice([2, 3, 4]), requires_lab=(s % 4 == 3)
+        )
+        for dept in depts
+        for s in range(subjects_per_batch)
+    ])
+
+    batches = Batch.objects.bulk_create([
+        Batch(
+            name=f'{dept.code}-B{b}', program='ug', department=dept, semester=semester,
+            year=2025, student_count=rnd.choice([35, 45, 55, 60])
+        )
+        for dept in depts
+        for b in range(batches_per_department)
+    ])
+
+    dept_faculty = {}
+    for faculty in faculties:
+        dept_faculty.setdefault(faculty.department_id, []).append(faculty)
+    FacultySubject.objects.bulk_create([
+        FacultySubject(faculty=faculty, subject=subject)
+        for subject in subjects
+        for faculty in rnd.sample(
+            dept_faculty[subject.department_id],
+            min(qualified_per_subject, len(dept_faculty[subject.department_id]))
+        )
+    ])
+
+    dept_subjects = {}
+    for subject in subjects:
+        dept_subjects.setdefault(subject.department_id, []).append(subject)
+    Batch.subjects.through.objects.bulk_create([
+        Batch.subjects.through(batch_id=batch.id, subject_id=subject.id)
+        for batch in batches
+        for subject in dept_subjects[batch.department_id]
+    ])
+
+    return TimetableTemplate.objects.bulk_create([
+        TimetableTemplate(
+            name=f'{dept.code} Benchmark', department=dept, academic_year='2025-26',
+            semester=semester, created_by=user
+        )
+        for dept in depts
+    ])
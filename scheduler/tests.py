@@ -1,3 +1,1420 @@
-from django.test import TestCase
+import csv
+import io
+import json
+import random
+import tempfile
+import time
+from collections import Counter, defaultdict
+from contextlib import redirect_stdout
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection
+from django.db.models import Count
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.http import http_date
+
+from .imports import MasterDataImport, read_rows
+from .campus import CampusOptimizer
+from .grids import build_timetable_grids
+from .csp import BacktrackingSolver
+from .management.commands.benchmark_optimizer import SIZES as BENCHMARK_SIZES
+from .management.commands.run_generation_worker import Command as RunGenerationWorker
+from .jobs import STALE_AFTER, fail_stale_jobs
+from .local_search import LocalSearch
+from .models import (
+    Batch, Classroom, Department, Faculty, FacultySubject, GenerationJob, SchedulingConstraint, Subject, TimeSlot,
+    TimetableEntry, TimetableTemplate
+)
+from .occupancy import OccupancyIndex, apply_edits, validate_entry
+from .pagination import keyset_page
+from .problem import SchedulingProblem, SolverState
+from .resources import MAX_PAGE_SIZE
+from .search import SearchRun
+from .snapshot import DAY_INDEX, CurriculumSnapshot
+from .stats import STATS_CACHE_KEY, dashboard_stats
+from .synthetic import build_institution
+from .utils import TimetableOptimizer, _run_start
+
+
+class GenerationJobTests(TestCase):
+    def setUp(self):
+        self.template = build_institution(prefix='JOB', departments=1, batches_per_department=1)[0]
+        self.user = User.objects.create_user('planner', password='secret')
+        self.client.force_login(self.user)
+        self.url = f'/api/templates/{self.template.id}/generate/'
+
+    def running_job(self, last_seen):
+        return GenerationJob.objects.create(
+            template=self.template, status='running', worker='gone:1',
+            started_at=last_seen, heartbeat_at=last_seen
+        )
+
+    def test_stale_running_job_is_failed(self):
+        job = self.running_job(timezone.now() - timedelta(seconds=STALE_AFTER + 60))
+
+        self.assertEqual(fail_stale_jobs(), 1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'failed')
+        self.assertIsNotNone(job.finished_at)
+
+    def test_live_running_job_is_kept(self):
+        job = self.running_job(timezone.now())
+
+        self.assertEqual(fail_stale_jobs(), 0)
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'running')
+
+    def test_stale_job_no_longer_blocks_template(self):
+        stale = self.running_job(timezone.now() - timedelta(seconds=STALE_AFTER + 60))
+
+        response = self.client.post(self.url, '{}', content_type='application/json')
+        self.assertEqual(response.status_code, 202)
+        self.assertTrue(response.json()['created'])
+        self.assertNotEqual(response.json()['job']['job_id'], stale.id)
+
+    def test_worker_keeps_job_failed_as_stale(self):
+        job = self.running_job(timezone.now())
+        GenerationJob.objects.filter(id=job.id).update(status='failed', message='Worker stopped responding')
+
+        stderr = io.StringIO()
+        worker = RunGenerationWorker(stdout=io.StringIO(), stderr=stderr)
+        worker.run_job(job, workers=None)
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.message), ('failed', 'Worker stopped responding'))
+        self.assertIn('no longer running', stderr.getvalue())
+
+    def test_rejects_unusable_generation_requests(self):
+        bodies = [
+            '[]',
+            '{"time_budget": NaN}',
+            '{"time_budget": "inf"}',
+            '{"time_budget": -5}',
+            f'{{"time_budget": {GenerationJob.MAX_TIME_BUDGET + 1}}}',
+            f'{{"starts": {GenerationJob.MAX_STARTS + 1}}}',
+            '{"starts": 0}',
+            '{"seed": 99999999999999999999999}',
+        ]
+        for body in bodies:
+            with self.subTest(body=body):
+                response = self.client.post(self.url, body, content_type='application/json')
+                self.assertEqual(response.status_code, 400)
+        self.assertFalse(GenerationJob.objects.exists())
+
+    def test_optimizer_rejects_non_finite_budget(self):
+        optimizer = TimetableOptimizer(self.template, seed=1)
+
+        self.assertFalse(optimizer.generate_timetable(time_budget=float('nan')))
+        self.assertIn('time budget', optimizer.error)
+
+    def test_progress_counts_fixed_entries(self):
+        TimetableOptimizer(self.template, seed=1).generate_timetable()
+        TimetableEntry.objects.filter(id__in=TimetableEntry.objects.values('id')[:3]).update(is_fixed=True)
+
+        reports = []
+        optimizer = TimetableOptimizer(self.template, seed=2)
+        optimizer.generate_timetable(
+            time_budget=0.2, progress=lambda placed, total, penalty: reports.append((placed, total))
+        )
+
+        self.assertTrue(reports)
+        placed, total = reports[-1]
+        self.assertEqual(total, len(optimizer.problem.requirements))
+        self.assertEqual(placed, optimizer._count_scheduled())
+
+
+class SchedulingProblemTests(TestCase):
+    def setUp(self):
+        self.template = build_institution(prefix='PRB', departments=1, batches_per_department=1)[0]
+
+    def test_workload_caps_above_slot_count_are_accepted(self):
+        Faculty.objects.update(max_hours_per_day=70000, max_hours_per_week=100000)
+
+        optimizer = TimetableOptimizer(self.template, seed=1)
+        self.assertTrue(optimizer.generate_timetable())
+        self.assertEqual(max(optimizer.problem.faculty_max_week), optimizer.problem.n_slots)
+
+
+class PerformanceReportTests(TestCase):
+    def setUp(self):
+        self.template = build_institution(prefix='PRF', departments=1, batches_per_department=1)[0]
+
+    def test_phases_count_their_queries(self):
+        optimizer = TimetableOptimizer(self.template, seed=1)
+        self.assertTrue(optimizer.generate_timetable())
+
+        phases = optimizer.get_performance()['phases']
+        self.assertGreater(phases['loading']['queries'], 0)
+        self.assertGreater(phases['persistence']['queries'], 0)
+        self.assertEqual(phases['placement']['queries'], 0)
+        for totals in phases.values():
+            self.assertGreaterEqual(totals['wall_time'], 0)
+            self.assertGreaterEqual(totals['cpu_time'], 0)
+
+    def test_rejections_add_up_to_attempts(self):
+        optimizer = TimetableOptimizer(self.template, seed=1)
+        optimizer.generate_timetable()
+
+        attempts = optimizer.get_performance()['placement_attempts']
+        self.assertEqual(attempts['placed'], optimizer._count_scheduled())
+        self.assertEqual(attempts['attempted'],
+                         attempts['placed'] + sum(attempts[reason] for reason in SearchRun.REJECTION_REASONS))
+
+    def test_unwritable_log_does_not_fail_generation(self):
+        with tempfile.TemporaryDirectory() as directory:
+            with override_settings(SCHEDULER_PERFORMANCE_LOG=f'{directory}/missing/performance.log'):
+                optimizer = TimetableOptimizer(self.template, seed=1)
+                with redirect_stdout(io.StringIO()) as output:
+                    self.assertTrue(optimizer.generate_timetable())
+
+        self.assertIsNone(optimizer.error)
+        self.assertIn('could not write performance log', output.getvalue())
+        self.assertEqual(TimetableEntry.objects.count(), optimizer._count_scheduled())
+
+    def test_log_appends_a_json_line_per_run(self):
+        with tempfile.NamedTemporaryFile('r', suffix='.log') as log:
+            with override_settings(SCHEDULER_PERFORMANCE_LOG=log.name):
+                TimetableOptimizer(self.template, seed=1).generate_timetable()
+                TimetableOptimizer(self.template, seed=2).generate_timetable()
+
+            records = [json.loads(line) for line in log]
+        self.assertEqual([record['seed'] for record in records], [1, 2])
+        self.assertEqual(records[0]['template_id'], self.template.id)
+
+
+class OptimizationReportTests(TestCase):
+    def setUp(self):
+        self.template = build_institution(prefix='RPT', departments=1, batches_per_department=2)[0]
+
+    def test_report_reuses_solver_counters(self):
+        optimizer = TimetableOptimizer(self.template, seed=1)
+        optimizer.generate_timetable()
+
+        # Only the faculty list is read; usage comes from the solver
+        with self.assertNumQueries(1):
+            report = optimizer.get_optimization_report()
+        with self.assertNumQueries(0):
+            self.assertEqual(optimizer.get_optimization_report(), report)
+        self.assertEqual(report['total_classes_scheduled'], TimetableEntry.objects.count())
+
+    def test_saved_timetable_is_counted_in_constant_queries(self):
+        TimetableOptimizer(self.template, seed=1).generate_timetable()
+
+        optimizer = TimetableOptimizer(self.template, seed=1)
+        with self.assertNumQueries(3):
+            report = optimizer.get_optimization_report()
+
+        scheduled = {row['faculty_id']: row['total'] for row in
+                     TimetableEntry.objects.values('faculty_id').annotate(total=Count('id')).order_by()}
+        for faculty_id, stats in report['faculty_workload_distribution'].items():
+            self.assertEqual(stats['scheduled'], scheduled.get(faculty_id, 0))
+
+    def test_faculty_sharing_a_name_keep_their_own_rows(self):
+        Faculty.objects.filter(department=self.template.department).update(employee_name='Same Name')
+        optimizer = TimetableOptimizer(self.template, seed=1)
+        optimizer.generate_timetable()
+
+        workload = optimizer.get_optimization_report()['faculty_workload_distribution']
+        faculty = Faculty.objects.filter(department=self.template.department)
+        self.assertEqual(set(workload), set(faculty.values_list('id', flat=True)))
+        self.assertEqual({stats['name'] for stats in workload.values()}, {'Same Name'})
+        self.assertEqual(sum(stats['scheduled'] for stats in workload.values()), TimetableEntry.objects.count())
+
+
+class CampusGenerationTests(TestCase):
+    def setUp(self):
+        self.templates = build_institution(prefix='CMP', departments=2, batches_per_department=1)
+
+    def test_campus_solve_waits_for_active_job(self):
+        GenerationJob.objects.create(template=self.templates[1], status='queued')
+
+        with self.assertRaisesMessage(CommandError, 'Already being generated'):
+            call_command('generate_campus_timetable', *[template.id for template in self.templates],
+                         stdout=io.StringIO())
+        self.assertFalse(TimetableEntry.objects.exists())
+        self.assertEqual(GenerationJob.objects.count(), 1)
+
+    def test_campus_solve_records_a_job_per_template(self):
+        call_command('generate_campus_timetable', *[template.id for template in self.templates],
+                     seed=1, stdout=io.StringIO())
+
+        jobs = GenerationJob.objects.order_by('template_id')
+        self.assertEqual([job.template_id for job in jobs], [template.id for template in self.templates])
+        for job in jobs:
+            self.assertEqual(job.status, 'succeeded')
+            self.assertEqual(job.placed, TimetableEntry.objects.filter(template=job.template_id).count())
+
+    def test_interrupted_campus_solve_fails_its_jobs(self):
+        with mock.patch.object(CampusOptimizer, '_persist_entries', side_effect=KeyboardInterrupt), \
+                self.assertRaises(KeyboardInterrupt):
+            call_command('generate_campus_timetable', *[template.id for template in self.templates],
+                         seed=1, stdout=io.StringIO())
+
+        self.assertEqual(set(GenerationJob.objects.values_list('status', 'message')),
+                         {('failed', 'Campus generation was interrupted')})
+        self.assertFalse(TimetableEntry.objects.exists())
+
+    def test_job_failed_as_stale_stays_failed(self):
+        generate = CampusOptimizer.generate_timetable
+
+        def swept_midway(optimizer, **options):
+            GenerationJob.objects.filter(template=self.templates[0]).update(status='failed', message='Stale')
+            return generate(optimizer, **options)
+
+        stderr = io.StringIO()
+        with mock.patch.object(CampusOptimizer, 'generate_timetable', swept_midway):
+            call_command('generate_campus_timetable', *[template.id for template in self.templates],
+                         seed=1, stdout=io.StringIO(), stderr=stderr)
+
+        jobs = GenerationJob.objects.order_by('template_id')
+        self.assertEqual((jobs[0].status, jobs[0].message), ('failed', 'Stale'))
+        self.assertEqual(jobs[1].status, 'succeeded')
+        self.assertIn('no longer running', stderr.getvalue())
+
+    def test_components_report_what_they_placed(self):
+        optimizer = CampusOptimizer(self.templates, seed=1)
+        optimizer.generate_timetable()
+
+        self.assertTrue(optimizer.saved)
+        self.assertEqual(len(optimizer.component_results), len(optimizer.components))
+        self.assertEqual([total for _, total in optimizer.component_results],
+                         [len(component) for component in optimizer.components])
+        self.assertEqual(sum(placed for placed, _ in optimizer.component_results), optimizer._count_scheduled())
+
+    def test_workload_covers_every_department(self):
+        optimizer = CampusOptimizer(self.templates, seed=1)
+        optimizer.generate_timetable()
+
+        departments = {faculty.department_id for faculty in Faculty.objects.filter(
+            id__in=optimizer._calculate_faculty_workload()
+        )}
+        self.assertEqual(departments, {template.department_id for template in self.templates})
+
+
+class BenchmarkTests(TestCase):
+    def test_keep_refuses_a_database_with_time_slots(self):
+        build_institution(prefix='BEN', departments=1, batches_per_department=1)
+
+        with self.assertRaisesMessage(CommandError, 'without time slots'):
+            call_command('benchmark_optimizer', sizes='small', keep=True, stdout=io.StringIO())
+        self.assertFalse(TimetableEntry.objects.exists())
+
+
+class MasterDataImportTests(TestCase):
+    def setUp(self):
+        self.department = Department.objects.create(name='Physics', code='PHY')
+
+    def run_import(self, resource, text, **options):
+        return MasterDataImport(resource, **options).run(read_rows(io.StringIO(text), 'csv'))
+
+    def test_creates_and_updates_by_key(self):
+        Faculty.objects.create(employee_id='F1', employee_name='Old Name', department=self.department,
+                               phone='555', max_hours_per_week=20)
+
+        result = self.run_import('faculty', (
+            'employee_id,employee_name,department,phone,is_available\n'
+            'F1,New Name,,,no\n'
+            'F2,Second,PHY,777,yes\n'
+        ))
+
+        self.assertEqual((result.created, result.updated, result.rejected), (1, 1, 0))
+        updated = Faculty.objects.get(employee_id='F1')
+        self.assertEqual((updated.employee_name, updated.phone, updated.max_hours_per_week), ('New Name', '555', 20))
+        self.assertFalse(updated.is_available)
+        self.assertEqual(Faculty.objects.get(employee_id='F2').department, self.department)
+
+    def test_rejects_bad_rows_by_line(self):
+        result = self.run_import('subjects', (
+            'code,name,credits,semester,department\n'
+            'PHY1,Mechanics,4,1,PHY\n'
+            'PHY2,Optics,four,1,PHY\n'
+            'PHY3,Waves,3,1,CHEM\n'
+            'PHY1,Again,4,1,PHY\n'
+            'PHY4,No Department,3,1,\n'
+        ))
+
+        self.assertEqual((result.created, result.rejected), (1, 4))
+        self.assertEqual([line for line, _ in result.errors], [3, 4, 5, 6])
+        self.assertIn('Unknown department CHEM', result.errors[1][1])
+        self.assertEqual(list(Subject.objects.values_list('code', flat=True)), ['PHY1'])
+
+    def test_listed_subjects_replace_a_batch_links(self):
+        self.run_import('subjects', 'code,name,credits,semester,department\nA,A,3,1,PHY\nB,B,3,1,PHY\nC,C,3,1,PHY\n')
+        header = 'department,name,program,semester,year,student_count,subjects\n'
+        self.run_import('batches', header + 'PHY,P1,ug,1,2024,40,A;B\n')
+
+        self.run_import('batches', header + 'PHY,P1,,,,,B C\n')
+
+        batch = Batch.objects.get(name='P1')
+        self.assertEqual(set(batch.subjects.values_list('code', flat=True)), {'B', 'C'})
+        self.assertEqual(batch.student_count, 40)
+
+    def test_dry_run_saves_nothing(self):
+        result = self.run_import('departments', 'code,name\nCHEM,Chemistry\n', dry_run=True)
+
+        self.assertEqual(result.created, 1)
+        self.assertFalse(Department.objects.filter(code='CHEM').exists())
+
+    def test_rejects_malformed_json_values(self):
+        rows = [
+            {'employee_id': 'F1', 'employee_name': 'No Department', 'department': []},
+            {'employee_id': 'F2', 'employee_name': 'Two Departments', 'department': ['PHY', 'PHY']},
+            {'employee_id': 'F3', 'employee_name': 'Listed', 'department': ['PHY'], 'phone': '1'},
+        ]
+        result = MasterDataImport('faculty').run(read_rows(io.StringIO(json.dumps(rows)), 'json'))
+
+        errors = dict(result.errors)
+        self.assertEqual((result.created, result.rejected), (1, 2))
+        self.assertIn('department: This field is required.', errors[1])
+        self.assertIn('Expected one code', errors[2])
+
+        rows = [{'day': 'monday', 'start_time': 9, 'end_time': '10:00'}]
+        result = MasterDataImport('timeslots').run(read_rows(io.StringIO(json.dumps(rows)), 'json'))
+        self.assertEqual(result.rejected, 1)
+        self.assertIn('start_time: 9 is not a valid value', result.errors[0][1])
+
+    def test_unreadable_csv_is_reported(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv') as upload:
+            upload.write('code,name\nCHEM,' + 'x' * 200000 + '\n')
+            upload.flush()
+
+            with self.assertRaisesMessage(CommandError, 'Line 2: field larger than field limit'):
+                call_command('import_master_data', 'departments', upload.name, stdout=io.StringIO())
+
+    @override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+    def test_unreadable_upload_is_reported(self):
+        self.client.force_login(User.objects.create_user('admin', is_staff=True))
+        upload = SimpleUploadedFile('departments.csv', b'code,name\nCHEM,' + b'x' * 200000 + b'\n')
+
+        response = self.client.post('/manage-resources/import/', {'resource': 'departments', 'file': upload},
+                                    follow=True)
+        self.assertContains(response, 'field larger than field limit')
+
+    def test_unique_value_held_by_another_row_is_rejected(self):
+        result = self.run_import('departments', 'code,name\nCHEM,Physics\n')
+
+        self.assertEqual(result.rejected, 1)
+        self.assertIn('belongs to another department', result.errors[0][1])
+
+
+class OccupancyIndexTests(TestCase):
+    def setUp(self):
+        self.template = build_institution(prefix='OCC', departments=1, batches_per_department=2)[0]
+        TimetableOptimizer(self.template, seed=1).generate_timetable()
+
+    def entries(self):
+        return TimetableEntry.objects.select_related(
+            'template', 'time_slot', 'classroom', 'faculty', 'subject', 'batch'
+        ).filter(template=self.template).order_by('id')
+
+    def test_cascade_delete_invalidates_cached_index(self):
+        removed = self.entries().first()
+        other = self.entries().exclude(subject=removed.subject).first()
+        validate_entry(other)  # Warm the cache
+
+        Subject.objects.filter(id=removed.subject_id).delete()
+
+        other = self.entries().get(id=other.id)
+        other.time_slot = removed.time_slot
+        other.classroom = removed.classroom
+        stale = [violation for violation in validate_entry(other) if violation.get('entry_id') == removed.id]
+        self.assertEqual(stale, [])
+        self.assertNotIn(removed.id, OccupancyIndex.for_template(other.template).entries)
+
+
+class RepairTests(TestCase):
+    def setUp(self):
+        self.template = build_institution(prefix='REP', departments=1, batches_per_department=2)[0]
+        TimetableOptimizer(self.template, seed=1).generate_timetable()
+        self.room = TimetableEntry.objects.filter(template=self.template).first().classroom
+
+    def placements(self, **filters):
+        return set(TimetableEntry.objects.filter(template=self.template, **filters).values_list(
+            'id', 'time_slot_id', 'classroom_id', 'faculty_id'
+        ))
+
+    def test_repair_moves_only_entries_in_closed_room(self):
+        untouched = self.placements() - self.placements(classroom=self.room)
+        in_room = len(self.placements(classroom=self.room))
+        self.room.is_available = False
+        self.room.save()
+
+        optimizer = TimetableOptimizer(self.template, seed=2)
+        self.assertTrue(optimizer.repair_timetable(classroom=self.room))
+
+        self.assertEqual(optimizer.repair_stats['displaced'], in_room)
+        self.assertEqual(optimizer.repair_stats['replaced'], in_room)
+        self.assertFalse(self.placements(classroom=self.room))
+        self.assertLessEqual(untouched, self.placements())
+
+    def test_repair_keeps_fixed_entries(self):
+        fixed = TimetableEntry.objects.filter(template=self.template, classroom=self.room).first()
+        fixed.is_fixed = True
+        fixed.save()
+        self.room.is_available = False
+        self.room.save()
+
+        TimetableOptimizer(self.template, seed=2).repair_timetable(classroom=self.room)
+
+        self.assertEqual(self.placements(classroom=self.room),
+                         {(fixed.id, fixed.time_slot_id, fixed.classroom_id, fixed.faculty_id)})
+
+
+class BatchEditTests(TestCase):
+    def setUp(self):
+        self.template = build_institution(prefix='EDT', departments=1, batches_per_department=2)[0]
+        TimetableOptimizer(self.template, seed=1).generate_timetable()
+
+    def placements(self):
+        return dict(TimetableEntry.objects.filter(template=self.template).values_list('id', 'time_slot_id'))
+
+    def swappable_pair(self):
+        """Two entries of one batch whose slots and rooms can be exchanged"""
+        entries = list(TimetableEntry.objects.filter(template=self.template).order_by('batch_id', 'id'))
+        for first in entries:
+            for second in entries:
+                if first.batch_id == second.batch_id and first.time_slot_id != second.time_slot_id:
+                    swap = [{'op': 'swap', 'entry_id': first.id, 'other_id': second.id}]
+                    if apply_edits(self.template.id, swap, validate_only=True)[1][0]['success']:
+                        return first, second
+        self.fail("No swappable pair of entries")
+
+    def test_swap_exchanges_slots_and_rooms(self):
+        first, second = self.swappable_pair()
+
+        applied, _ = apply_edits(self.template.id, [{'op': 'swap', 'entry_id': first.id, 'other_id': second.id}])
+
+        self.assertTrue(applied)
+        moved = TimetableEntry.objects.in_bulk([first.id, second.id])
+        self.assertEqual((moved[first.id].time_slot_id, moved[first.id].classroom_id),
+                         (second.time_slot_id, second.classroom_id))
+        self.assertEqual((moved[second.id].time_slot_id, moved[second.id].classroom_id),
+                         (first.time_slot_id, first.classroom_id))
+
+    def test_move_into_slot_vacated_by_later_operation(self):
+        first, second = self.swappable_pair()
+        revision = self.template.revision
+
+        applied, results = apply_edits(self.template.id, [
+            {'op': 'move', 'entry_id': first.id, 'time_slot': second.time_slot_id, 'classroom': second.classroom_id},
+            {'op': 'move', 'entry_id': second.id, 'time_slot': first.time_slot_id, 'classroom': first.classroom_id},
+        ])
+
+        self.assertTrue(applied, results)
+        self.assertEqual(TimetableEntry.objects.get(id=first.id).time_slot_id, second.time_slot_id)
+        self.template.refresh_from_db()
+        self.assertGreater(self.template.revision, revision)
+
+    def test_violation_rolls_back_every_operation(self):
+        first, second = self.swappable_pair()
+        before = self.placements()
+
+        # The swap is fine, but the move then puts a batch in two places at once
+        applied, results = apply_edits(self.template.id, [
+            {'op': 'swap', 'entry_id': first.id, 'other_id': second.id},
+            {'op': 'move', 'entry_id': second.id, 'time_slot': second.time_slot_id},
+        ])
+
+        self.assertFalse(applied)
+        codes = {violation['code'] for result in results for violation in result['violations']}
+        self.assertIn('batch_busy', codes)
+        self.assertEqual(self.placements(), before)
+
+    def test_out_of_range_ids_are_rejected(self):
+        self.client.force_login(User.objects.create_user('editor'))
+        url = f'/api/templates/{self.template.id}/entries/batch/'
+
+        for entry_id in (2 ** 63, -1, 0, '9' * 30):
+            with self.subTest(entry_id=entry_id):
+                body = {'operations': [{'op': 'move', 'entry_id': entry_id, 'time_slot': 1}]}
+                response = self.client.post(url, body, content_type='application/json')
+                self.assertEqual(response.status_code, 400)
+
+    def test_single_edit_rejects_out_of_range_ids(self):
+        self.client.force_login(User.objects.create_user('editor'))
+        entry = TimetableEntry.objects.filter(template=self.template).first()
+
+        for body in (
+            {'entry_id': 2 ** 63, 'field': 'classroom', 'value': entry.classroom_id},
+            {'entry_id': -1, 'field': 'classroom', 'value': entry.classroom_id},
+            {'entry_id': entry.id, 'field': 'classroom', 'value': 2 ** 63},
+            {'entry_id': entry.id, 'field': 'time_slot', 'value': 0},
+        ):
+            with self.subTest(body=body):
+                response = self.client.post('/api/update-entry/', body, content_type='application/json')
+                self.assertEqual(response.status_code, 400)
+                self.assertTrue(response.json()['error'].startswith('Invalid id'))
+
+
+class CalendarFeedTests(TestCase):
+    def setUp(self):
+        self.template = build_institution(prefix='ICS', departments=1, batches_per_department=2)[0]
+        TimetableOptimizer(self.template, seed=1).generate_timetable()
+        self.template.is_active = True
+        self.template.save()
+        self.entry = TimetableEntry.objects.select_related('classroom', 'faculty').filter(template=self.template).first()
+
+    def feed_url(self, kind, owner):
+        return f'/calendar/{kind}/{owner.calendar_token}.ics'
+
+    def test_feeds_are_addressed_by_token_only(self):
+        faculty = self.entry.faculty
+
+        self.assertEqual(self.client.get(self.feed_url('faculty', faculty)).status_code, 200)
+        self.assertEqual(self.client.get(f'/calendar/faculty/{faculty.id}.ics').status_code, 404)
+        self.assertEqual(self.client.get('/calendar/faculty/not-a-token.ics').status_code, 404)
+        self.assertEqual(self.client.get(f'/calendar/batch/{faculty.calendar_token}.ics').status_code, 404)
+
+    @override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+    def test_grid_page_links_feeds_by_token(self):
+        self.client.force_login(User.objects.create_user('viewer'))
+
+        response = self.client.get(f'/timetable/template/{self.template.id}/')
+        self.assertContains(response, self.feed_url('classroom', self.entry.classroom))
+
+    def assertFeedChanges(self, url, change):
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        change()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content).decode()
+
+    def test_classroom_rename_changes_feed(self):
+        classroom = self.entry.classroom
+
+        def rename():
+            classroom.name = 'Renamed Hall'
+            classroom.save()
+
+        body = self.assertFeedChanges(self.feed_url('faculty', self.entry.faculty), rename)
+        self.assertIn('LOCATION:Renamed Hall', body)
+
+    def test_leaving_template_is_never_answered_not_modified(self):
+        other = build_institution(prefix='ICX', departments=1, batches_per_department=1)[0]
+        TimetableOptimizer(other, seed=1).generate_timetable()
+        TimetableEntry.objects.filter(id=TimetableEntry.objects.filter(template=other).first().id).update(
+            faculty=self.entry.faculty
+        )
+        TimetableTemplate.objects.filter(id=other.id).update(is_active=True)
+        url = self.feed_url('faculty', self.entry.faculty)
+        response = self.client.get(url)
+        self.assertNotIn('Last-Modified', response)
+        events = b''.join(response.streaming_content).count(b'BEGIN:VEVENT')
+
+        other.is_active = False
+        other.save()
+
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=http_date(time.time() + 3600))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content).count(b'BEGIN:VEVENT'), events - 1)
+
+    def test_imported_rename_changes_feed(self):
+        faculty = self.entry.faculty
+        rows = read_rows(io.StringIO(f'employee_id,employee_name\n{faculty.employee_id},Imported Name\n'), 'csv')
+
+        body = self.assertFeedChanges(
+            self.feed_url('classroom', self.entry.classroom), lambda: MasterDataImport('faculty').run(rows)
+        )
+        self.assertIn('Imported Name', body)
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class DashboardTests(TestCase):
+    def setUp(self):
+        cache.delete(STATS_CACHE_KEY)
+        self.template = build_institution(prefix='DSH', departments=1, batches_per_department=1)[0]
+        TimetableOptimizer(self.template, seed=1).generate_timetable()
+        self.ids = list(TimetableEntry.objects.order_by('-id').values_list('id', flat=True))
+
+    def page(self, **cursor):
+        items, older, newer = keyset_page(TimetableEntry.objects.all(), size=5, **cursor)
+        return [entry.id for entry in items], older, newer
+
+    def test_keyset_pages_walk_both_ways(self):
+        first, older, newer = self.page()
+        self.assertEqual((first, newer), (self.ids[:5], None))
+
+        second, older, newer = self.page(before=older)
+        self.assertEqual(second, self.ids[5:10])
+
+        back, _, newer = self.page(after=newer)
+        self.assertEqual((back, newer), (first, None))
+
+    def test_last_page_has_no_older_cursor(self):
+        items, older, newer = self.page(before=self.ids[-3])
+
+        self.assertEqual(items, self.ids[-2:])
+        self.assertIsNone(older)
+        self.assertEqual(newer, self.ids[-2])
+
+    def test_out_of_range_cursors_show_the_newest_page(self):
+        self.client.force_login(User.objects.create_user('viewer'))
+
+        for query in ('after=18446744073709551616', 'before=99999999999999999999', 'after=-1', 'before=x'):
+            with self.subTest(query=query):
+                response = self.client.get(f'/dashboard/?{query}')
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.context['recent_timetables'][0].id, self.ids[0])
+
+    def test_stats_are_cleared_by_saves_and_deletes(self):
+        self.assertEqual(dashboard_stats()['total_departments'], 1)
+
+        department = Department.objects.create(name='Chemistry', code='CHEM')
+        with self.assertNumQueries(6):
+            self.assertEqual(dashboard_stats()['total_departments'], 2)
+        with self.assertNumQueries(0):
+            dashboard_stats()
+
+        department.delete()
+        self.assertEqual(dashboard_stats()['total_departments'], 1)
+
+
+class ResourceListTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_user('manager'))
+        Department.objects.bulk_create([
+            Department(name=f'Department {number}', code=f'D{number:03}') for number in range(MAX_PAGE_SIZE + 10)
+        ])
+        Department.objects.create(name='Astronomy', code='AST')
+
+    def get(self, resource='departments', **params):
+        return self.client.get(f'/api/resources/{resource}/', params)
+
+    def test_search_matches_any_searched_column(self):
+        by_name = self.get(search='astro').json()['results']
+        by_code = self.get(search='ast').json()['results']
+
+        self.assertEqual([row['code'] for row in by_name], ['AST'])
+        self.assertEqual(by_code, by_name)
+
+    def test_cursor_continues_where_the_page_ended(self):
+        first = self.get(limit=3).json()
+        second = self.get(limit=3, after=first['next']).json()
+
+        ids = list(Department.objects.order_by('id').values_list('id', flat=True)[:6])
+        self.assertEqual([row['id'] for row in first['results'] + second['results']], ids)
+        self.assertEqual(first['next'], ids[2])
+
+    def test_page_size_is_clamped(self):
+        page = self.get(limit=MAX_PAGE_SIZE * 10).json()
+
+        self.assertEqual(len(page['results']), MAX_PAGE_SIZE)
+        self.assertIsNotNone(page['next'])
+        last = self.get(after=page['next'], limit=MAX_PAGE_SIZE * 10).json()
+        self.assertEqual(len(last['results']), 11)
+        self.assertIsNone(last['next'])
+
+    def test_rejects_bad_cursors_and_limits(self):
+        for params in ({'after': 2 ** 64}, {'after': -1}, {'after': 'x'}, {'limit': 0}, {'limit': -5}, {'limit': 'x'}):
+            with self.subTest(params=params):
+                self.assertEqual(self.get(**params).status_code, 400)
+        self.assertEqual(self.get('nothing').status_code, 404)
+
+
+class TemplateExportTests(TestCase):
+    def setUp(self):
+        self.template = build_institution(prefix='EXP', departments=1, batches_per_department=2)[0]
+        TimetableOptimizer(self.template, seed=1).generate_timetable()
+        self.client.force_login(User.objects.create_user('exporter'))
+        self.url = f'/timetable/template/{self.template.id}/export/'
+        self.entry = TimetableEntry.objects.select_related('batch', 'faculty', 'classroom').first()
+
+    def export(self, **filters):
+        response = self.client.get(self.url, filters)
+        self.assertEqual(response.status_code, 200)
+        rows = list(csv.reader(io.StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual(rows[0][0], 'Batch')
+        return rows[1:]
+
+    def test_rows_are_ordered_by_batch_day_and_period(self):
+        rows = self.export()
+
+        self.assertEqual(len(rows), TimetableEntry.objects.filter(template=self.template).count())
+        days = [label for _, label in TimeSlot.DAYS_OF_WEEK]
+        keys = [(batch, days.index(day), period) for batch, day, period, *_ in rows]
+        self.assertEqual(keys, sorted(keys))
+
+    def test_each_filter_limits_the_rows(self):
+        filters = {
+            'batch': (self.entry.batch_id, 0, self.entry.batch.name),
+            'faculty': (self.entry.faculty_id, 5, self.entry.faculty.employee_name),
+            'classroom': (self.entry.classroom_id, 6, self.entry.classroom.name),
+        }
+        for param, (value, column, name) in filters.items():
+            with self.subTest(param=param):
+                rows = self.export(**{param: value})
+                expected = TimetableEntry.objects.filter(template=self.template, **{f'{param}_id': value}).count()
+                self.assertEqual(len(rows), expected)
+                self.assertEqual({row[column] for row in rows}, {name})
+
+    def test_rejects_bad_filter_ids_before_streaming(self):
+        for value in (2 ** 63, 0, -3, 'x'):
+            with self.subTest(value=value):
+                response = self.client.get(self.url, {'faculty': value})
+                self.assertEqual(response.status_code, 400)
+                self.assertFalse(response.streaming)
+
+
+def build_crafted_template(qualified, algorithm='greedy', slots=1):
+    """A tiny template for solver tests: subject n is taught once a week to its own batch
+
+    ``qualified[n]`` lists the faculty numbers who can teach subject n. The
+    first subject is core and every other one elective, so construction
+    always places it first. The week has ``slots`` Monday periods and there
+    is a room per subject.
+    """
+    department = Department.objects.create(name='Crafted', code='CRF')
+    for period in range(slots):
+        TimeSlot.objects.create(day='monday', start_time=f'{9 + period:02}:00', end_time=f'{10 + period:02}:00')
+    Classroom.objects.bulk_create([
+        Classroom(name=f'CRF-R{number}', capacity=60, department=department) for number in range(len(qualified))
+    ])
+    faculty = {
+        number: Faculty.objects.create(employee_id=f'CRF-F{number}', employee_name=f'Faculty {number}',
+                                       department=department, phone='0')
+        for number in sorted({number for numbers in qualified for number in numbers})
+    }
+    for position, numbers in enumerate(qualified):
+        subject = Subject.objects.create(
+            name=f'Subject {position}', code=f'CRF-S{position}', credits=3, department=department, semester=1,
+            hours_per_week=1, subject_type='core' if position == 0 else 'elective'
+        )
+        batch = Batch.objects.create(name=f'CRF-B{position}', program='ug', department=department, semester=1,
+                                     year=2025, student_count=30)
+        batch.subjects.add(subject)
+        for number in numbers:
+            FacultySubject.objects.create(faculty=faculty[number], subject=subject)
+    return TimetableTemplate.objects.create(
+        name='Crafted', department=department, academic_year='2025-26', semester=1, algorithm=algorithm,
+        created_by=User.objects.get_or_create(username='crafted')[0]
+    )
+
+
+class BacktrackingSolverTests(TestCase):
+    def solver(self, template, **budgets):
+        optimizer = TimetableOptimizer(template, seed=1)
+        requirements = optimizer._prioritize_requirements(optimizer._generate_class_requirements())
+        return BacktrackingSolver(optimizer.problem, SolverState(optimizer.problem), requirements,
+                                  rng=random.Random(1), **budgets)
+
+    def test_places_everything_where_greedy_dead_ends(self):
+        # The core subject can take either teacher, but greedy gives it the
+        # only one the elective has
+        greedy = TimetableOptimizer(build_crafted_template([[1, 2], [1]]), seed=1)
+        self.assertFalse(greedy.generate_timetable())
+        self.assertEqual(greedy._count_scheduled(), 1)
+
+        TimetableTemplate.objects.update(algorithm='csp')
+        csp = TimetableOptimizer(TimetableTemplate.objects.get(), seed=1)
+        self.assertTrue(csp.generate_timetable())
+        self.assertEqual(TimetableEntry.objects.count(), 2)
+        self.assertEqual(
+            dict(TimetableEntry.objects.values_list('subject__code', 'faculty__employee_id')),
+            {'CRF-S0': 'CRF-F2', 'CRF-S1': 'CRF-F1'}
+        )
+
+    def test_forward_check_rejects_a_wiping_value(self):
+        solver = self.solver(build_crafted_template([[1, 2], [1]]), max_values=1)
+
+        # The core subject's first value takes the elective's only teacher
+        self.assertEqual(solver.solve(), 1)
+        self.assertEqual([requirement.subject for requirement in solver.skipped], [0])
+
+    def test_without_budget_the_search_finishes_greedily(self):
+        solver = self.solver(build_crafted_template([[1, 2], [1]]), max_backtracks=0)
+
+        self.assertEqual(solver.solve(), 1)
+        self.assertEqual([requirement.subject for requirement in solver.skipped], [1])
+
+    def test_mrv_picks_the_smallest_domain(self):
+        solver = self.solver(build_crafted_template([[1, 2], [1], [3]]), max_values=1)
+        first = solver._select()
+        solver._advance((first, solver._values(first), len(solver.trail)))
+
+        chosen = solver._select()
+        self.assertEqual(solver.domain_sizes[chosen.index],
+                         min(solver.domain_sizes[index] for index in solver.unassigned))
+
+    def test_backtracking_stays_within_budgets(self):
+        # Three classes at once with two teachers: one is always left over
+        template = build_crafted_template([[1, 2], [1, 2], [1, 2]])
+        unlimited = self.solver(template, max_backtracks=1000)
+        self.assertEqual(unlimited.solve(), 2)
+        self.assertLess(unlimited.backtracks_left, 1000)
+
+        no_conflict_budget = self.solver(template, conflict_backtracks=0)
+        self.assertEqual(no_conflict_budget.solve(), 2)
+        self.assertEqual(no_conflict_budget.backtracks_left, 5000)
+
+        small_total = self.solver(template, max_backtracks=1)
+        self.assertEqual(small_total.solve(), 2)
+        self.assertEqual(small_total.backtracks_left, 0)
+
+    def test_weekly_caps_do_not_make_the_search_thrash(self):
+        # The medium benchmark's second department leaves two classes over,
+        # and spends a teacher's last weekly hour on most placements
+        template = build_institution(**BENCHMARK_SIZES['medium'], prefix='BMM', seed=0)[1]
+        template.algorithm = 'csp'
+
+        with mock.patch.object(BacktrackingSolver, '_forward_check', autospec=True,
+                               side_effect=BacktrackingSolver._forward_check) as forward_check:
+            optimizer = TimetableOptimizer(template, seed=0)
+            optimizer.generate_timetable()
+
+        self.assertLessEqual(forward_check.call_count, 5 * len(optimizer.problem.requirements))
+        self.assertEqual(optimizer._count_scheduled(), len(optimizer.problem.requirements) - 2)
+
+    def test_search_stops_at_the_deadline(self):
+        template = build_institution(**BENCHMARK_SIZES['medium'], prefix='BMM', seed=0)[1]
+        optimizer = TimetableOptimizer(template, seed=0)
+        requirements = optimizer._prioritize_requirements(optimizer._generate_class_requirements())
+        greedy = SearchRun(optimizer.problem, SolverState(optimizer.problem), seed=0).run(requirements)
+
+        # About two seconds of forward checks without a deadline
+        forward_check = BacktrackingSolver._forward_check
+        def slow_forward_check(*args):
+            time.sleep(0.02)
+            return forward_check(*args)
+
+        with mock.patch.object(BacktrackingSolver, '_forward_check', slow_forward_check):
+            deadline = time.monotonic() + 0.3
+            run = SearchRun(optimizer.problem, SolverState(optimizer.problem), algorithm='csp', seed=0)
+            run.run(requirements, deadline)
+
+        self.assertLess(time.monotonic(), deadline + 0.2)
+        self.assertEqual(run.scheduled, greedy.scheduled)
+        assert_hard_constraints(self, optimizer.problem, run.state)
+
+    def test_undo_restores_domains_exactly(self):
+        template = build_institution(prefix='CSP', departments=1, batches_per_department=2)[0]
+        optimizer = TimetableOptimizer(template, seed=1)
+        requirements = optimizer._generate_class_requirements()
+        solver = BacktrackingSolver(optimizer.problem, SolverState(optimizer.problem), requirements,
+                                    rng=random.Random(1))
+        domains = {index: bytes(domain) for index, domain in solver.domains.items()}
+        sizes = dict(solver.domain_sizes)
+
+        frames = []
+        for _ in range(8):
+            requirement = solver._select()
+            frame = (requirement, solver._values(requirement), len(solver.trail))
+            if solver._advance(frame):
+                frames.append(frame)
+        self.assertTrue(solver.trail)
+
+        for frame in reversed(frames):
+            solver._unplace(frame)
+        self.assertEqual({index: bytes(domain) for index, domain in solver.domains.items()}, domains)
+        self.assertEqual(solver.domain_sizes, sizes)
+        self.assertEqual(solver.trail, [])
+        self.assertEqual(len(solver.unassigned), len(requirements))
+        self.assertFalse(any(solver.state.batch_busy) or any(solver.state.faculty_week))
+
+
+def assert_hard_constraints(test, problem, state):
+    """Fail ``test`` if the state breaks any hard constraint or its counters disagree with its assignments"""
+    seen = set()
+    faculty_day = Counter()
+    faculty_week = Counter()
+    busy = defaultdict(set)
+    for requirement in problem.requirements:
+        assignment = state.assignments[requirement.index]
+        if assignment is None:
+            continue
+        slot, room, faculty = assignment
+        for key in (('batch', requirement.batch, slot), ('room', room, slot), ('faculty', faculty, slot)):
+            test.assertNotIn(key, seen)
+            seen.add(key)
+        test.assertIn(room, requirement.rooms)
+        test.assertIn(faculty, requirement.faculty)
+        test.assertFalse(problem.subject_blocked[requirement.subject * problem.n_slots + slot])
+        test.assertFalse(problem.room_blocked[room * problem.n_slots + slot])
+        test.assertFalse(problem.faculty_blocked[faculty * problem.n_slots + slot])
+        faculty_day[faculty, problem.slot_day[slot]] += 1
+        faculty_week[faculty] += 1
+        busy[faculty].add(problem.slot_ordinal[slot])
+
+    for (faculty, day), hours in faculty_day.items():
+        test.assertLessEqual(hours, problem.faculty_max_day[faculty])
+        test.assertEqual(state.faculty_day[faculty * problem.n_days + day], hours)
+    for faculty, hours in faculty_week.items():
+        test.assertLessEqual(hours, problem.faculty_max_week[faculty])
+        test.assertEqual(state.faculty_week[faculty], hours)
+
+    # Consecutive periods on one day, counted from every busy period
+    for faculty, ordinals in busy.items():
+        limit = problem.faculty_max_run[faculty]
+        if not limit:
+            continue
+        for ordinal in ordinals:
+            run = 1
+            while ordinal + run in ordinals and (ordinal + run) % problem.periods_per_day:
+                run += 1
+            test.assertLessEqual(run, limit)
+
+
+class LocalSearchTests(TestCase):
+    def setUp(self):
+        self.template = build_institution(prefix='LCS', departments=1, batches_per_department=3)[0]
+        faculty = Faculty.objects.filter(department=self.template.department)
+        SchedulingConstraint.objects.bulk_create([
+            SchedulingConstraint(name='Short runs', constraint_type='max_continuous', faculty=member)
+            for member in faculty[:4]
+        ] + [
+            SchedulingConstraint(name='Spaced', constraint_type='no_back_to_back', faculty=member)
+            for member in faculty[4:6]
+        ] + [
+            SchedulingConstraint(name='Assembly', constraint_type='blocked_time', time_slot=TimeSlot.objects.first())
+        ])
+
+    def constructed(self, seed=1):
+        """A greedy timetable for the template, before any improvement"""
+        optimizer = TimetableOptimizer(self.template, seed=seed)
+        requirements = optimizer._prioritize_requirements(optimizer._generate_class_requirements())
+        run = SearchRun(optimizer.problem, SolverState(optimizer.problem), seed=seed).run(requirements)
+        return optimizer.problem, run.state, [requirement for requirement in requirements if requirement.faculty]
+
+    def cost(self, problem, state, search):
+        unplaced = sum(1 for requirement in search.requirements if state.assignments[requirement.index] is None)
+        return unplaced * search.unscheduled_weight + problem.penalty(state)
+
+    def test_annealing_keeps_hard_constraints(self):
+        problem, state, requirements = self.constructed()
+
+        # A hot schedule accepts almost every move, so many states are visited
+        search = LocalSearch(problem, state, requirements, rng=random.Random(1), start_temperature=50.0)
+        best = search.run(time.monotonic() + 0.3)
+
+        self.assertGreater(search.iterations, 256)
+        assert_hard_constraints(self, problem, state)
+        self.assertEqual(best, self.cost(problem, state, search))
+
+    def test_best_state_is_restored(self):
+        class Recorded(LocalSearch):
+            def _restore(self, assignments):
+                self.final_cost = self.cost
+                super()._restore(assignments)
+
+        problem, state, requirements = self.constructed()
+        initial = self.cost(problem, state, LocalSearch(problem, state.copy(), requirements))
+
+        # Never cooling down, the walk ends far from the best state it saw
+        search = Recorded(problem, state, requirements, rng=random.Random(1),
+                          start_temperature=1e6, end_temperature=1e6)
+        best = search.run(time.monotonic() + 0.2)
+
+        self.assertGreater(search.final_cost, best)
+        self.assertLessEqual(best, initial)
+        self.assertEqual(search.cost, best)
+        self.assertEqual(self.cost(problem, state, search), best)
+        assert_hard_constraints(self, problem, state)
+
+    def test_expired_budget_leaves_state_unchanged(self):
+        problem, state, requirements = self.constructed()
+        before = state.copy()
+
+        for deadline in (time.monotonic(), time.monotonic() - 10):
+            with self.subTest(deadline=deadline):
+                search = LocalSearch(problem, state, requirements, rng=random.Random(1))
+                search.run(deadline)
+
+                self.assertEqual(search.iterations, 0)
+                self.assertEqual(state.assignments, before.assignments)
+                self.assertEqual((state.batch_busy, state.room_busy, state.faculty_busy),
+                                 (before.batch_busy, before.room_busy, before.faculty_busy))
+                self.assertEqual((state.faculty_week, state.faculty_day), (before.faculty_week, before.faculty_day))
+
+    def test_zero_budget_skips_improvement(self):
+        optimizer = TimetableOptimizer(self.template, seed=1)
+        optimizer.generate_timetable(time_budget=0)
+
+        self.assertNotIn('improvement', optimizer.get_performance()['phases'])
+
+
+class MultiStartTests(TestCase):
+    def setUp(self):
+        self.template = build_institution(prefix='MST', departments=1, batches_per_department=3)[0]
+        slots = list(TimeSlot.objects.all()[:6])
+        SchedulingConstraint.objects.bulk_create([
+            SchedulingConstraint(name='Mornings', constraint_type='preferred_time', subject=subject, time_slot=slot)
+            for subject in Subject.objects.filter(department=self.template.department)
+            for slot in slots
+        ])
+
+    def placements(self):
+        return sorted(TimetableEntry.objects.filter(template=self.template).values_list(
+            'batch_id', 'subject_id', 'time_slot_id', 'classroom_id', 'faculty_id'
+        ))
+
+    def test_same_seed_saves_the_same_timetable(self):
+        with mock.patch('scheduler.utils.ProcessPoolExecutor') as pool:
+            first = TimetableOptimizer(self.template, seed=7)
+            first.generate_timetable(starts=3, workers=1)
+            saved = self.placements()
+
+            second = TimetableOptimizer(self.template, seed=7)
+            second.generate_timetable(starts=3, workers=1)
+
+        pool.assert_not_called()
+        self.assertEqual(second.seeds, first.seeds)
+        self.assertEqual(len(set(first.seeds)), 3)
+        self.assertEqual(second.best_seed, first.best_seed)
+        self.assertEqual(self.placements(), saved)
+
+    def test_best_start_is_kept(self):
+        optimizer = TimetableOptimizer(self.template, seed=3)
+        optimizer.generate_timetable(starts=5, workers=1)
+
+        # Replay every start on its own and rank them the way the optimizer does
+        problem = optimizer.problem
+        order = [requirement.index for requirement in optimizer._prioritize_requirements(problem.requirements)]
+        outcomes = [
+            _run_start(problem, SolverState(problem), optimizer.algorithm, order, seed, None)[2:4]
+            for seed in optimizer.seeds
+        ]
+        best = min(range(len(outcomes)), key=lambda position: (-outcomes[position][0], outcomes[position][1]))
+
+        self.assertGreater(len(set(outcomes)), 1)
+        self.assertEqual(optimizer.best_seed, optimizer.seeds[best])
+        self.assertEqual((optimizer._count_scheduled(), problem.penalty(optimizer.state)), outcomes[best])
+        self.assertEqual(TimetableEntry.objects.filter(template=self.template).count(), outcomes[best][0])
+
+
+class ConstraintCompilationTests(TestCase):
+    def setUp(self):
+        self.template = build_institution(prefix='CON', departments=1, batches_per_department=2, days=3, periods=4)[0]
+        self.slots = list(TimeSlot.objects.order_by('day', 'start_time'))
+        self.faculty = Faculty.objects.filter(department=self.template.department).order_by('id')
+        self.subject = Subject.objects.filter(department=self.template.department).order_by('id').first()
+
+    def constrain(self, constraint_type, priority=1, **resources):
+        SchedulingConstraint.objects.create(name=constraint_type, constraint_type=constraint_type,
+                                            priority=priority, **resources)
+
+    def test_blocked_slots_are_never_used(self):
+        teacher = FacultySubject.objects.filter(subject=self.subject).first().faculty
+        room = Classroom.objects.filter(department=self.template.department).first()
+        self.constrain('blocked_time', time_slot=self.slots[0])
+        self.constrain('blocked_time', time_slot=self.slots[1], faculty=teacher)
+        self.constrain('blocked_time', time_slot=self.slots[2], subject=self.subject)
+        self.constrain('blocked_time', time_slot=self.slots[3], classroom=room)
+
+        optimizer = TimetableOptimizer(self.template, seed=1)
+        optimizer.generate_timetable(time_budget=0.3)
+
+        entries = TimetableEntry.objects.filter(template=self.template)
+        self.assertTrue(entries.exists())
+        self.assertFalse(entries.filter(time_slot=self.slots[0]).exists())
+        self.assertFalse(entries.filter(time_slot=self.slots[1], faculty=teacher).exists())
+        self.assertFalse(entries.filter(time_slot=self.slots[2], subject=self.subject).exists())
+        self.assertFalse(entries.filter(time_slot=self.slots[3], classroom=room).exists())
+        assert_hard_constraints(self, optimizer.problem, optimizer.state)
+
+    def test_preferred_slots_lower_the_penalty(self):
+        self.constrain('preferred_time', priority=1, subject=self.subject, time_slot=self.slots[0])
+        self.constrain('preferred_time', priority=4, subject=self.subject, time_slot=self.slots[1])
+
+        optimizer = TimetableOptimizer(self.template, seed=1)
+        problem = optimizer.problem
+        subject = optimizer.snapshot.subject_index[self.subject.id]
+        requirement = next(requirement for requirement in optimizer._generate_class_requirements()
+                           if requirement.subject == subject)
+        slot = optimizer.snapshot.slot_index
+        room, faculty = requirement.rooms[0], requirement.faculty[0]
+
+        # The highest priority among a resource's preferences sets the weight
+        self.assertEqual(problem.subject_slot_weight[requirement.subject], 5)
+        self.assertEqual(problem.placement_penalty(requirement, slot[self.slots[0].id], room, faculty), 0)
+        self.assertEqual(problem.placement_penalty(requirement, slot[self.slots[1].id], room, faculty), 0)
+        self.assertEqual(problem.placement_penalty(requirement, slot[self.slots[2].id], room, faculty), 5)
+
+        state = SolverState(problem)
+        state.place(requirement, slot[self.slots[2].id], room, faculty)
+        outside = problem.penalty(state)
+        state.release(requirement)
+        state.place(requirement, slot[self.slots[0].id], room, faculty)
+        self.assertLess(problem.penalty(state), outside)
+
+    def test_construction_honours_preferences_without_a_time_budget(self):
+        probe = TimetableOptimizer(self.template, seed=1)
+        subject = probe.snapshot.subject_index[self.subject.id]
+        requirement = next(requirement for requirement in probe._generate_class_requirements()
+                           if requirement.subject == subject)
+        room = probe.snapshot.classrooms[requirement.rooms[-1]]
+        preferred = self.slots[3:]
+        for time_slot in preferred:
+            self.constrain('preferred_time', subject=self.subject, time_slot=time_slot)
+        self.constrain('room_preference', subject=self.subject, classroom=room)
+
+        for algorithm in ('greedy', 'csp'):
+            with self.subTest(algorithm=algorithm):
+                self.template.algorithm = algorithm
+                TimetableOptimizer(self.template, seed=1).generate_timetable()
+
+                entries = TimetableEntry.objects.filter(template=self.template, subject=self.subject)
+                self.assertTrue(entries.exists())
+                self.assertEqual(set(entries.values_list('classroom_id', flat=True)), {room.id})
+                self.assertLessEqual(set(entries.values_list('time_slot_id', flat=True)),
+                                     {time_slot.id for time_slot in preferred})
+
+        # The CSP tries the cheapest values first
+        optimizer = TimetableOptimizer(self.template, seed=1)
+        requirements = optimizer._generate_class_requirements()
+        solver = BacktrackingSolver(optimizer.problem, SolverState(optimizer.problem), requirements,
+                                    rng=random.Random(1))
+        requirement = next(requirement for requirement in requirements
+                           if requirement.subject == optimizer.snapshot.subject_index[self.subject.id])
+        costs = [optimizer.problem.placement_penalty(requirement, *value) for value in solver._values(requirement)]
+        self.assertEqual(costs, sorted(costs))
+        self.assertEqual(costs[0], 0)
+        self.assertGreater(costs[-1], 0)
+
+    def test_run_limits_stop_at_day_boundaries(self):
+        spaced, limited = Faculty.objects.filter(facultysubject__isnull=False).distinct().order_by('id')[:2]
+        self.constrain('no_back_to_back', faculty=spaced)
+        self.constrain('max_continuous', faculty=limited)
+
+        optimizer = TimetableOptimizer(self.template, seed=1)
+        problem = optimizer.problem
+        spaced, limited = optimizer.snapshot.faculty_index[spaced.id], optimizer.snapshot.faculty_index[limited.id]
+        self.assertEqual(problem.faculty_max_run[spaced], 1)
+        self.assertEqual(problem.faculty_max_run[limited], SchedulingProblem.MAX_CONTINUOUS_PERIODS)
+
+        # Slots run Monday 9:00-13:00, then Tuesday; the last Monday period and
+        # the first Tuesday one are not consecutive
+        monday_last, tuesday_first = 3, 4
+        self.assertEqual((problem.slot_next[monday_last], problem.slot_prev[tuesday_first]), (-1, -1))
+
+        state = SolverState(problem)
+        state.faculty_busy[spaced * problem.n_slots + monday_last] = 1
+        self.assertTrue(problem.run_allows(state, spaced, tuesday_first))
+        self.assertFalse(problem.run_allows(state, spaced, monday_last - 1))
+
+        # Three in a row is the most max_continuous allows
+        for slot in (0, 1, 2):
+            state.faculty_busy[limited * problem.n_slots + slot] = 1
+        self.assertFalse(problem.run_allows(state, limited, 3))
+        self.assertTrue(problem.run_allows(state, limited, tuesday_first))
+
+    def test_generated_timetables_respect_run_limits(self):
+        for member in self.faculty[:5]:
+            self.constrain('no_back_to_back', faculty=member)
+        for member in self.faculty[5:]:
+            self.constrain('max_continuous', faculty=member)
+
+        optimizer = TimetableOptimizer(self.template, seed=1)
+        optimizer.generate_timetable(time_budget=0.3)
+
+        self.assertGreater(optimizer._count_scheduled(), 0)
+        assert_hard_constraints(self, optimizer.problem, optimizer.state)
+
+
+class CurriculumSnapshotTests(TestCase):
+    def test_loads_in_constant_queries(self):
+        small = build_institution(prefix='SNS', departments=1, batches_per_department=1, subjects_per_batch=2)[0]
+        large = build_institution(prefix='SNL', departments=1, batches_per_department=8, subjects_per_batch=8)[0]
+        SchedulingConstraint.objects.create(name='Assembly', constraint_type='blocked_time',
+                                            time_slot=TimeSlot.objects.first())
+
+        for template in (small, large):
+            with self.subTest(template=template.name), self.assertNumQueries(6):
+                snapshot = CurriculumSnapshot(template)
+        self.assertEqual(len(snapshot.batches), 8)
+        self.assertEqual(len(snapshot.constraints), 1)
+
+    def test_links_match_the_database(self):
+        template = build_institution(prefix='SNM', departments=2, batches_per_department=2)[0]
+        snapshot = CurriculumSnapshot(template)
+
+        for batch, subjects in zip(snapshot.batches, snapshot.batch_subjects):
+            self.assertEqual({snapshot.subjects[index].id for index in subjects},
+                             set(batch.subjects.values_list('id', flat=True)))
+        for subject, faculty in zip(snapshot.subjects, snapshot.subject_faculty):
+            self.assertEqual(
+                {snapshot.faculties[index].id for index in faculty},
+                set(FacultySubject.objects.filter(subject=subject).values_list('faculty_id', flat=True))
+            )
+        self.assertEqual({batch.department_id for batch in snapshot.batches}, {template.department_id})
+
+
+class SolverStateTests(TestCase):
+    def setUp(self):
+        self.template = build_institution(prefix='STA', departments=1, batches_per_department=3)[0]
+        self.optimizer = TimetableOptimizer(self.template, seed=1)
+        self.optimizer.generate_timetable(time_budget=0.2)
+        self.snapshot = self.optimizer.snapshot
+        self.entries = TimetableEntry.objects.filter(template=self.template)
+
+    def test_occupancy_matches_saved_entries(self):
+        problem = self.optimizer.problem
+        state = self.optimizer.state
+        snapshot = self.snapshot
+        n_slots = problem.n_slots
+
+        expected = {'batch': set(), 'room': set(), 'faculty': set()}
+        for slot, batch, room, faculty in self.entries.values_list('time_slot_id', 'batch_id', 'classroom_id',
+                                                                    'faculty_id'):
+            slot = snapshot.slot_index[slot]
+            expected['batch'].add(snapshot.batch_index[batch] * n_slots + slot)
+            expected['room'].add(snapshot.classroom_index[room] * n_slots + slot)
+            expected['faculty'].add(snapshot.faculty_index[faculty] * n_slots + slot)
+
+        for kind, busy in (('batch', state.batch_busy), ('room', state.room_busy), ('faculty', state.faculty_busy)):
+            with self.subTest(kind=kind):
+                self.assertEqual({cell for cell, taken in enumerate(busy) if taken}, expected[kind])
+
+    def test_saved_entries_rebuild_the_same_occupancy(self):
+        optimizer = TimetableOptimizer(self.template, seed=2)
+        optimizer._generate_class_requirements()
+        with self.assertNumQueries(1):
+            state, displaced = optimizer._pin_entries(optimizer._load_entries(), lambda entry: 'keep')
+
+        self.assertEqual(displaced, [])
+        self.assertEqual(optimizer.held, 0)
+        self.assertEqual((state.batch_busy, state.room_busy, state.faculty_busy),
+                         (self.optimizer.state.batch_busy, self.optimizer.state.room_busy,
+                          self.optimizer.state.faculty_busy))
+
+    def assertCountersMatchEntries(self, optimizer):
+        problem = optimizer.problem
+        state = optimizer.state
+        snapshot = optimizer.snapshot
+
+        week = Counter()
+        day = Counter()
+        for faculty, slot_day in self.entries.values_list('faculty_id', 'time_slot__day'):
+            faculty = snapshot.faculty_index[faculty]
+            week[faculty] += 1
+            day[faculty * problem.n_days + DAY_INDEX[slot_day]] += 1
+
+        self.assertEqual({index: hours for index, hours in enumerate(state.faculty_week) if hours}, dict(week))
+        self.assertEqual({index: hours for index, hours in enumerate(state.faculty_day) if hours}, dict(day))
+        for faculty in range(problem.n_faculty):
+            self.assertLessEqual(state.faculty_week[faculty], problem.faculty_max_week[faculty])
+
+    def test_workload_counters_match_saved_entries(self):
+        self.assertCountersMatchEntries(self.optimizer)
+
+    def test_workload_counters_follow_a_repair(self):
+        faculty = self.entries.first().faculty
+        faculty.is_available = False
+        faculty.save()
+
+        optimizer = TimetableOptimizer(self.template, seed=2)
+        optimizer.repair_timetable(faculty=faculty)
+
+        self.assertFalse(self.entries.filter(faculty=faculty).exists())
+        self.assertCountersMatchEntries(optimizer)
+
+
+class RoomSuitabilityTests(TestCase):
+    def test_index_matches_a_full_scan(self):
+        templates = build_institution(prefix='ROO', departments=2, batches_per_department=4, shared_rooms=3)
+        crowded = Batch.objects.get(name='ROO0-B0')
+        crowded.student_count = 500
+        crowded.save()
+        optimizer = TimetableOptimizer(templates[0])
+        problem = optimizer.problem
+        for batch in range(problem.n_batches):
+            for requires_lab in (False, True):
+                with self.subTest(batch=batch, requires_lab=requires_lab):
+                    department = problem.batch_department[batch]
+                    fitting = [
+                        room for room in range(problem.n_rooms)
+                        if problem.room_capacity[room] >= problem.batch_size[batch]
+                        and (problem.room_is_lab[room] or not requires_lab)
+                        and problem.room_department[room] in (department, -1)
+                    ]
+                    suitable = problem.suitable_rooms(batch, requires_lab)
+
+                    self.assertEqual(sorted(suitable), fitting)
+                    # Department rooms come first, each group smallest first
+                    owners = [problem.room_department[room] != department for room in suitable]
+                    self.assertEqual(owners, sorted(owners))
+                    for owner in (False, True):
+                        capacities = [problem.room_capacity[room] for room, shared in zip(suitable, owners)
+                                      if shared == owner]
+                        self.assertEqual(capacities, sorted(capacities))
+
+        # No room seats the crowded batch
+        self.assertEqual(problem.suitable_rooms(optimizer.snapshot.batch_index[crowded.id], False), ())
+
+
+class PersistenceTests(TestCase):
+    def setUp(self):
+        self.template = build_institution(prefix='PER', departments=1, batches_per_department=3)[0]
+        TimetableOptimizer(self.template, seed=1).generate_timetable()
+        self.entries = TimetableEntry.objects.filter(template=self.template)
+
+    def test_entries_are_inserted_in_bulk(self):
+        optimizer = TimetableOptimizer(self.template, seed=2)
+        with CaptureQueriesContext(connection) as queries:
+            optimizer.generate_timetable()
+
+        inserts = [query for query in queries if query['sql'].startswith('INSERT INTO "scheduler_timetableentry"')]
+        fields = [field for field in TimetableEntry._meta.concrete_fields if not field.primary_key]
+        batch_size = connection.ops.bulk_batch_size(fields, list(self.entries))
+        self.assertEqual(len(inserts), -(-self.entries.count() // batch_size))
+
+    def test_failed_insert_keeps_the_old_timetable(self):
+        before = list(self.entries.order_by('id').values_list('id', 'time_slot_id', 'classroom_id', 'faculty_id'))
+        revision = TimetableTemplate.objects.get(id=self.template.id).revision
+
+        optimizer = TimetableOptimizer(self.template, seed=2)
+        with mock.patch.object(TimetableEntry.objects, 'bulk_create', side_effect=IntegrityError('boom')), \
+                redirect_stdout(io.StringIO()):
+            self.assertFalse(optimizer.generate_timetable())
+
+        self.assertEqual(optimizer.error, 'boom')
+        self.assertEqual(list(self.entries.order_by('id').values_list(
+            'id', 'time_slot_id', 'classroom_id', 'faculty_id'
+        )), before)
+        self.assertEqual(TimetableTemplate.objects.get(id=self.template.id).revision, revision)
+
+class TimetableGridTests(TestCase):
+    def setUp(self):
+        self.template = build_institution(prefix='GRD', departments=1, batches_per_department=3, days=3, periods=4)[0]
+        TimetableOptimizer(self.template, seed=1).generate_timetable()
+        self.lunch = TimeSlot.objects.create(day='tuesday', start_time='13:00', end_time='14:00', is_break=True)
+
+    def test_grids_take_two_queries(self):
+        with self.assertNumQueries(2):
+            grids = build_timetable_grids(self.template)
+
+        self.assertEqual(grids['total'], TimetableEntry.objects.filter(template=self.template).count())
+        self.assertEqual([day for day, _ in grids['days']], ['monday', 'tuesday', 'wednesday'])
+        self.assertEqual(len(grids['periods']), 5)
+
+    def test_cells_land_at_their_day_and_period(self):
+        grids = build_timetable_grids(self.template)
+        days = [day for day, _ in grids['days']]
+        entries = TimetableEntry.objects.filter(template=self.template).select_related('time_slot')
+
+        for kind, field in (('batch', 'batch_id'), ('faculty', 'faculty_id'), ('classroom', 'classroom_id')):
+            with self.subTest(kind=kind):
+                by_owner = {grid['id']: grid for grid in grids[kind]}
+                self.assertEqual(set(by_owner), set(entries.values_list(field, flat=True)))
+                expected = defaultdict(set)
+                for entry in entries:
+                    slot = entry.time_slot
+                    row = grids['periods'].index((slot.start_time, slot.end_time))
+                    expected[getattr(entry, field)].add((row, days.index(slot.day), entry.id))
+
+                for owner, grid in by_owner.items():
+                    cells = {
+                        (row, column, cell['id'])
+                        for row, (_, cells) in enumerate(grid['rows'])
+                        for column, cell in enumerate(cells)
+                        if isinstance(cell, dict)
+                    }
+                    self.assertEqual(cells, expected[owner])
+                    self.assertEqual(grid['rows'][4][1][days.index('tuesday')], 'break')
+                    self.assertIsNone(grid['rows'][4][1][days.index('monday')])
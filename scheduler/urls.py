@@ -16,17 +16,25 @@ urlpatterns = [
     
     # Resource Management
     path('manage-resources/', views.manage_resources, name='manage_resources'),
+    path('manage-resources/import/', views.import_master_data, name='import_master_data'),
+    path('api/resources/<str:resource>/', views.resource_list, name='resource_list'),
     
     # Timetable Management
     path('create-timetable/', views.create_timetable, name='create_timetable'),
     path("timetable/<int:entry_id>/view/", views.view_timetable, name="view_timetable"),
+    path('timetable/template/<int:template_id>/', views.view_template_timetable, name='view_template_timetable'),
+    path('timetable/template/<int:template_id>/export/', views.export_template_timetable, name='export_template_timetable'),
     path("timetable/<int:entry_id>/export/", views.export_timetable, name="export_timetable"),
+    path('calendar/<str:kind>/<str:token>.ics', views.calendar_feed, name='calendar_feed'),
     # path('timetable/<int:template_id>/approve/', views.approve_timetable, name='approve_timetable'),
     # path('timetable/<int:template_id>/delete/', views.delete_timetable, name='delete_timetable'),
     
     # AJAX endpoints
     path('api/department-batches/', views.get_department_batches, name='get_department_batches'),
     path('api/update-entry/', views.update_timetable_entry, name='update_timetable_entry'),
+    path('api/templates/<int:template_id>/entries/batch/', views.batch_edit_entries, name='batch_edit_entries'),
+    path('api/templates/<int:template_id>/generate/', views.start_generation, name='start_generation'),
+    path('api/generation-jobs/<int:job_id>/', views.generation_job_status, name='generation_job_status'),
 
     # Create Pages
     path('subject/create/', views.create_subject, name='create_subject'),
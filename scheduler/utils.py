@@ -1,96 +1,490 @@
+import json
+import math
+import os
 import random
 from collections import defaultdict
-from datetime import datetime, time
-from django.db.models import Q
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from time import monotonic
 
-from .models import (
-    Department, Classroom, Faculty, Subject, Batch, TimeSlot,
-    TimetableTemplate, TimetableEntry, FacultySubject, SchedulingConstraint
-)
+import django
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count
+
+from .models import Faculty, TimetableEntry
+from .instrumentation import PhaseProfile
+from .occupancy import bump_revision
+from .problem import SchedulingProblem, SolverState
+from .search import SearchRun
+from .snapshot import CurriculumSnapshot
+
+
+def _setup_worker():
+    """Process pool initializer; unpickling the problem imports the models"""
+    django.setup()
+
+
+def check_time_budget(time_budget):
+    """Reject budgets the search deadline cannot work with, e.g. NaN, which never expires"""
+    if time_budget is not None and not (math.isfinite(time_budget) and time_budget >= 0):
+        raise ValueError(f"Invalid time budget: {time_budget!r}")
+
+
+def _run_start(problem, base_state, algorithm, order, seed, time_budget):
+    """Run one independent start in a worker process
+
+    Only picklable, ORM-free data crosses the process boundary: the problem,
+    the starting occupancy and the requirement order go in, the assignment
+    list, its score and the run's phase timings and rejection counts come back.
+    """
+    deadline = monotonic() + time_budget if time_budget else None
+    requirements = [problem.requirements[index] for index in order]
+    run = SearchRun(problem, base_state, algorithm=algorithm, seed=seed).run(requirements, deadline)
+    return seed, run.state.assignments, run.scheduled, run.penalty, run.profile.phases, run.rejections
 
 
 class TimetableOptimizer:
-    def __init__(self, template):
+    def __init__(self, template, seed=None):
         self.template = template
-        self.time_slots = list(TimeSlot.objects.filter(is_break=False).order_by('day', 'start_time'))
-        self.classrooms = list(Classroom.objects.filter(is_available=True))
-        self.batches = list(Batch.objects.filter(
-            department=template.department,
-            semester=template.semester
-        ))
-        self.faculty_workload = defaultdict(int)
-        self.classroom_utilization = defaultdict(list)
-        self.batch_schedule = defaultdict(list)
-        self.conflicts = []
         
-    def generate_timetable(self):
-        """Generate optimized timetable using constraint satisfaction"""
+        # Per-phase wall/CPU time, queries and bytes written, plus why
+        # construction rejected the slots it tried
+        self.profile = PhaseProfile(connection)
+        self.rejections = dict.fromkeys(('attempted', 'placed') + SearchRun.REJECTION_REASONS, 0)
+        
+        with self.profile.phase('loading'):
+            self.snapshot = self._load_snapshot()
+            self.problem = SchedulingProblem(self.snapshot)
+        self.time_slots = self.snapshot.time_slots
+        self.classrooms = self.snapshot.classrooms
+        self.batches = self.snapshot.batches
+        self.algorithm = template.algorithm
+        self.conflicts = []
+        self.error = None
+        
+        # Base seed for the generation; None draws a fresh one per run
+        self.seed = seed
+        self.seeds = []
+        self.best_seed = None
+        
+        # Occupancy, workload counters and assignments in dense integer form
+        self.state = SolverState(self.problem)
+        self.tracking_loaded = False
+        
+        # Saved entries carried over by the last generation or repair
+        self.pinned = set()
+        self.kept_entries = set()
+        self.held = 0
+        self.repair_stats = None
+        
+        # Report statistics, computed once per generation
+        self._usage = None
+        self._utilization = None
+        self._workload = None
+        
+    def _load_snapshot(self):
+        return CurriculumSnapshot(self.template)
+    
+    def _templates(self):
+        """The templates whose entries this optimizer replaces"""
+        return [self.template]
+    
+    def _saved_entries(self):
+        return TimetableEntry.objects.filter(template__in=self._templates())
+    
+    def _entry_template(self, requirement):
+        """The template a requirement's entry is saved under"""
+        return self.template
+    
+    def generate_timetable(self, time_budget=None, starts=1, workers=None, progress=None):
+        """Generate optimized timetable using constraint satisfaction
+        
+        ``starts`` independent randomized constructions are run, in a pool of
+        ``workers`` processes when there is more than one, and the timetable
+        placing the most classes (then with the lowest penalty) is saved.
+        Every start gets its own seed, recorded in ``seeds``, so a result can
+        be reproduced by passing the same base ``seed`` again.
+        
+        When ``time_budget`` (seconds) is given, whatever is left of it after
+        construction is spent on local-search improvement.
+        
+        ``progress`` is called as ``progress(placed, total, penalty)`` with
+        the best timetable so far while the search runs.
+        
+        Phase timings and rejection counts are kept for the report and, when
+        ``SCHEDULER_PERFORMANCE_LOG`` is set, appended to that file as JSON.
+        """
+        started = monotonic()
+        self.error = None
+        self._usage = self._utilization = self._workload = None
         try:
-            # Clear existing entries
-            TimetableEntry.objects.filter(template=self.template).delete()
-            
-            # Get all subject-faculty mappings
-            subject_faculty_map = self._get_subject_faculty_mappings()
+            check_time_budget(time_budget)
             
             # Generate class requirements
-            class_requirements = self._generate_class_requirements()
+            with self.profile.phase('requirements'):
+                class_requirements = self._generate_class_requirements()
             
             # Sort requirements by priority
-            class_requirements = self._prioritize_requirements(class_requirements)
+            with self.profile.phase('prioritisation'):
+                class_requirements = self._prioritize_requirements(class_requirements)
             
-            # Schedule classes
-            scheduled = 0
+            # Fixed entries are pinned; everything else is replaced on commit,
+            # so the search never queries again
+            with self.profile.phase('loading'):
+                base_state, _ = self._pin_entries(
+                    self._load_entries(fixed_only=True), lambda entry: 'fixed'
+                )
             total = len(class_requirements)
+            class_requirements = [
+                requirement for requirement in class_requirements
+                if requirement.index not in self.pinned
+            ]
+            self.seeds = self._derive_seeds(max(1, starts))
             
-            for requirement in class_requirements:
-                if self._schedule_class(requirement, subject_faculty_map):
-                    scheduled += 1
+            report = None
+            if progress is not None:
+                report = lambda placed, penalty: progress(placed, total, penalty)
             
-            # Try to resolve conflicts with alternative arrangements
-            self._resolve_conflicts()
+            if len(self.seeds) == 1:
+                run = SearchRun(self.problem, base_state, algorithm=self.algorithm, seed=self.seeds[0])
+                deadline = started + time_budget if time_budget else None
+                run.run(class_requirements, deadline, report)
+                self.best_seed = run.seed
+                self.state = run.state
+                self._record_run(run.profile.phases, run.rejections)
+            else:
+                with self.profile.phase('search'):
+                    self._run_parallel(base_state, class_requirements, time_budget, started, workers, report)
             
-            return scheduled == total
+            self.tracking_loaded = not self.held
+            self.conflicts = [
+                self._conflict_message(requirement)
+                for requirement in class_requirements
+                if self.state.assignments[requirement.index] is None
+            ]
+            
+            # Swap the old timetable for the new one in a single transaction
+            with self.profile.phase('persistence'):
+                self._persist_entries()
+            
+            self._write_performance_log()
+            return not self.conflicts
             
         except Exception as e:
+            self.error = str(e)
             print(f"Error in timetable generation: {str(e)}")
             return False
     
-    def _get_subject_faculty_mappings(self):
-        """Get available faculty for each subject"""
-        mappings = defaultdict(list)
-        
-        for batch in self.batches:
-            for subject in batch.subjects.all():
-                # Get faculty who can teach this subject
-                faculty_subjects = FacultySubject.objects.filter(
-                    subject=subject,
-                    faculty__is_available=True,
-                    faculty__department=subject.department
-                ).select_related('faculty')
-                
-                for fs in faculty_subjects:
-                    mappings[subject].append(fs.faculty)
+    def repair_timetable(self, faculty=None, classroom=None, time_budget=None):
+        """Re-place only the classes invalidated by a change to one resource
+        
+        Call after saving the change, e.g. ``faculty.is_available = False`` or
+        a room taken offline. Saved entries using ``faculty`` or ``classroom``
+        are checked against the current constraints (every entry when neither
+        is given); those that no longer fit are un-assigned and re-placed
+        around the rest, which stay exactly where they are. Fixed entries are
+        never moved. Classes missing from the saved timetable are placed too
+        if there is room.
+        
+        Only the displaced entries are rewritten. ``repair_stats`` records
+        how many entries were checked, displaced and re-placed.
+        """
+        started = monotonic()
+        self.error = None
+        self._usage = self._utilization = self._workload = None
+        try:
+            check_time_budget(time_budget)
+            with self.profile.phase('requirements'):
+                class_requirements = self._generate_class_requirements()
+            
+            faculty_id = faculty.id if faculty is not None else None
+            classroom_id = classroom.id if classroom is not None else None
+            everything = faculty is None and classroom is None
+            checked = [0]
+            
+            def classify(entry):
+                if entry[6]:
+                    return 'fixed'
+                if everything or entry[4] == faculty_id or entry[3] == classroom_id:
+                    checked[0] += 1
+                    return 'check'
+                return 'keep'
+            
+            with self.profile.phase('loading'):
+                base_state, displaced = self._pin_entries(self._load_entries(), classify)
+            
+            # Displaced classes first, then any that were never scheduled
+            displaced_indices = {requirement.index for requirement in displaced}
+            missing = [
+                requirement for requirement in class_requirements
+                if requirement.index not in self.pinned and requirement.index not in displaced_indices
+            ]
+            to_place = self._prioritize_requirements(displaced) + self._prioritize_requirements(missing)
+            
+            self.seeds = self._derive_seeds(1)
+            run = SearchRun(self.problem, base_state, algorithm=self.algorithm, seed=self.seeds[0])
+            deadline = started + time_budget if time_budget else None
+            run.run(to_place, deadline)
+            self.best_seed = run.seed
+            self.state = run.state
+            self._record_run(run.profile.phases, run.rejections)
+            
+            self.tracking_loaded = not self.held
+            self.conflicts = [
+                self._conflict_message(requirement)
+                for requirement in to_place
+                if self.state.assignments[requirement.index] is None
+            ]
+            self.repair_stats = {
+                'checked': checked[0],
+                'displaced': len(displaced),
+                'replaced': sum(1 for requirement in displaced if self.state.assignments[requirement.index] is not None),
+                'added': sum(1 for requirement in missing if self.state.assignments[requirement.index] is not None),
+                'unplaced': len(self.conflicts),
+            }
+            
+            with self.profile.phase('persistence'):
+                self._persist_entries()
+            
+            self._write_performance_log()
+            return self.repair_stats['replaced'] == len(displaced)
+            
+        except Exception as e:
+            self.error = str(e)
+            print(f"Error in timetable repair: {str(e)}")
+            return False
+    
+    def _load_entries(self, fixed_only=False):
+        """The template's saved entries as plain rows, oldest first
+        
+        Each row is ``(id, time_slot_id, batch_id, classroom_id, faculty_id,
+        subject_id, is_fixed)``.
+        """
+        entries = self._saved_entries()
+        if fixed_only:
+            entries = entries.filter(is_fixed=True)
+        return list(entries.order_by('id').values_list(
+            'id', 'time_slot_id', 'batch_id', 'classroom_id', 'faculty_id', 'subject_id', 'is_fixed'
+        ))
+    
+    def _pin_entries(self, entries, classify):
+        """Build the starting state from saved entries
+        
+        ``classify(entry)`` decides what happens to each row:
+        
+        - ``'fixed'``: kept as saved whatever the constraints now say
+        - ``'keep'``: kept as long as its resources are still schedulable and free
+        - ``'check'``: kept only if it still satisfies every hard constraint
+        - anything else: dropped, to be replaced on commit
+        
+        Each kept entry is matched to a requirement of the same batch and
+        subject and placed. Entries that match no requirement, or whose
+        resources the solver no longer knows, still hold whatever resources
+        are known so nothing is double booked; ``held`` counts them.
+        Entries failing their check are returned as the displaced
+        requirements. Sets ``pinned`` (requirement indices that keep a
+        saved entry) and ``kept_entries`` (their entry ids).
+        """
+        snapshot = self.snapshot
+        state = SolverState(self.problem)
+        self.pinned = set()
+        self.kept_entries = set()
+        self.held = 0
+        displaced = []
+        
+        # Saved entries take a batch's classes of a subject in class order
+        open_requirements = defaultdict(list)
+        for requirement in reversed(self.problem.requirements):
+            open_requirements[(requirement.batch, requirement.subject)].append(requirement)
+        
+        # Fixed entries claim their resources first, checked entries go last so
+        # their workload checks see everything else that stays
+        order = {'fixed': 0, 'keep': 1, 'check': 2}
+        ranked = []
+        for entry in entries:
+            rank = order.get(classify(entry))
+            if rank is not None:
+                ranked.append((rank, entry))
+        ranked.sort(key=lambda item: item[0])
+        
+        for rank, entry in ranked:
+            entry_id, slot_id, batch_id, classroom_id, faculty_id, subject_id, _ = entry
+            slot = snapshot.slot_index.get(slot_id)
+            batch = snapshot.batch_index.get(batch_id)
+            room = snapshot.classroom_index.get(classroom_id)
+            faculty = snapshot.faculty_index.get(faculty_id)
+            candidates = open_requirements.get((batch, snapshot.subject_index.get(subject_id)))
+            requirement = candidates.pop() if candidates else None
+            
+            if rank == 0 or requirement is None:
+                self.kept_entries.add(entry_id)
+                if requirement is not None:
+                    self.pinned.add(requirement.index)
+                if requirement is not None and self._fits(state, requirement, slot, room, faculty, False):
+                    state.place(requirement, slot, room, faculty)
+                else:
+                    self.held += 1
+                    self._hold(state, slot, batch, room, faculty)
+            elif self._fits(state, requirement, slot, room, faculty, rank == 2):
+                self.kept_entries.add(entry_id)
+                self.pinned.add(requirement.index)
+                state.place(requirement, slot, room, faculty)
+            else:
+                displaced.append(requirement)
+        
+        return state, displaced
+    
+    def _fits(self, state, requirement, slot, room, faculty, check):
+        """Whether a saved placement can go into the state as it is
+        
+        The slot, room and faculty must still be schedulable and free; with
+        ``check`` the room and faculty must also suit the class and the
+        placement must respect blocked times, workload caps and run limits.
+        """
+        if slot is None or room is None or faculty is None:
+            return False
         
-        return mappings
+        problem = self.problem
+        n_slots = problem.n_slots
+        if (state.batch_busy[requirement.batch * n_slots + slot]
+                or state.room_busy[room * n_slots + slot]
+                or state.faculty_busy[faculty * n_slots + slot]):
+            return False
+        if not check:
+            return True
+        
+        day = problem.slot_day[slot]
+        return (
+            room in requirement.rooms
+            and faculty in requirement.faculty
+            and not problem.subject_blocked[requirement.subject * n_slots + slot]
+            and state.faculty_day[faculty * problem.n_days + day] < problem.faculty_max_day[faculty]
+            and state.faculty_week[faculty] < problem.faculty_max_week[faculty]
+            and problem.run_allows(state, faculty, slot)
+        )
+    
+    def _hold(self, state, slot, batch, room, faculty):
+        """Mark whichever of a kept entry's resources the solver knows as busy"""
+        if slot is None:
+            return
+        
+        n_slots = self.problem.n_slots
+        if batch is not None:
+            state.batch_busy[batch * n_slots + slot] = 1
+        if room is not None:
+            state.room_busy[room * n_slots + slot] = 1
+        if faculty is not None:
+            state.faculty_busy[faculty * n_slots + slot] = 1
+            state.faculty_week[faculty] += 1
+            state.faculty_day[faculty * self.problem.n_days + self.problem.slot_day[slot]] += 1
+    
+    def _record_run(self, phases, rejections):
+        """Add a search run's phase timings and rejection counts to the optimizer's"""
+        self.profile.merge(phases)
+        for reason, count in rejections.items():
+            self.rejections[reason] += count
+    
+    def get_performance(self):
+        """Structured timing and rejection figures for the last generation
+        
+        With several starts, the placement, repair and improvement phases are
+        summed over all worker processes and ``search`` is the wall time of
+        the pool as a whole.
+        """
+        return {
+            'phases': self.profile.as_dict(),
+            'placement_attempts': dict(self.rejections),
+            'starts': len(self.seeds),
+            'seed': self.seeds[0] if self.seeds else None,
+        }
+    
+    def _write_performance_log(self):
+        """Append the performance figures as one JSON line, if a log file is configured"""
+        path = getattr(settings, 'SCHEDULER_PERFORMANCE_LOG', '')
+        if not path:
+            return
+        
+        # The timetable is already saved, so a log that cannot be written
+        # must not turn a successful generation into a failed one
+        record = dict(self.get_performance(), template_id=self.template.id, timestamp=datetime.now().isoformat())
+        try:
+            with open(path, 'a') as log:
+                log.write(json.dumps(record) + '\n')
+        except OSError as e:
+            print(f"Warning: could not write performance log {path}: {e}")
+    
+    def _derive_seeds(self, starts):
+        """One seed per start, all derived from the base seed"""
+        base = self.seed if self.seed is not None else random.SystemRandom().randrange(2 ** 32)
+        rng = random.Random(base)
+        return [base] + [rng.randrange(2 ** 32) for _ in range(starts - 1)]
+    
+    def _run_parallel(self, base_state, requirements, time_budget, started, workers, progress=None):
+        """Run every start in a process pool and keep the best timetable"""
+        workers = workers or min(len(self.seeds), os.cpu_count() or 1)
+        order = [requirement.index for requirement in requirements]
+        
+        # Starts beyond the pool size queue behind earlier ones, so the time
+        # budget is shared out between the waves
+        budget = None
+        if time_budget:
+            waves = -(-len(self.seeds) // workers)
+            budget = max(time_budget - (monotonic() - started), 0) / waves
+        
+        # Most classes placed wins; ties go to the lower penalty, then the earlier start
+        rank = lambda result: (-result[2], result[3])
+        results = [None] * len(self.seeds)
+        best = [None]
+        
+        def finished(position, result):
+            results[position] = result
+            self._record_run(result[4], result[5])
+            if best[0] is None or rank(result) < rank(best[0]):
+                best[0] = result
+                if progress is not None:
+                    progress(result[2], result[3])
+        
+        if workers == 1:
+            # A single worker gains nothing from a pool, so the starts run here in turn
+            for position, seed in enumerate(self.seeds):
+                finished(position, _run_start(self.problem, base_state, self.algorithm, order, seed, budget))
+        else:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_setup_worker) as pool:
+                futures = {
+                    pool.submit(_run_start, self.problem, base_state, self.algorithm, order, seed, budget): position
+                    for position, seed in enumerate(self.seeds)
+                }
+                for future in as_completed(futures):
+                    finished(futures[future], future.result())
+        
+        seed, assignments = min(results, key=rank)[:2]
+        self.best_seed = seed
+        self.state = base_state.copy()
+        for requirement in requirements:
+            assignment = assignments[requirement.index]
+            if assignment is not None:
+                self.state.place(requirement, *assignment)
     
     def _generate_class_requirements(self):
         """Generate list of all required classes"""
-        requirements = []
-        
-        for batch in self.batches:
-            for subject in batch.subjects.all():
+        snapshot = self.snapshot
+        problem = self.problem
+        problem.requirements = []
+        
+        for batch_index, subject_indices in enumerate(snapshot.batch_subjects):
+            batch = snapshot.batches[batch_index]
+            for subject_index in subject_indices:
+                subject = snapshot.subjects[subject_index]
                 classes_per_week = subject.hours_per_week
+                priority = self._calculate_priority(subject, batch)
                 
                 for i in range(classes_per_week):
-                    requirements.append({
-                        'batch': batch,
-                        'subject': subject,
-                        'class_number': i + 1,
-                        'requires_lab': subject.requires_lab,
-                        'priority': self._calculate_priority(subject, batch)
-                    })
-        
-        return requirements
+                    problem.add_requirement(
+                        batch_index, subject_index, i + 1, subject.requires_lab, priority
+                    )
+        
+        return problem.requirements
     
     def _calculate_priority(self, subject, batch):
         """Calculate scheduling priority for a subject"""
@@ -111,174 +505,105 @@ class TimetableOptimizer:
     
     def _prioritize_requirements(self, requirements):
         """Sort requirements by priority and constraints"""
-        return sorted(requirements, key=lambda x: x['priority'], reverse=True)
+        return sorted(requirements, key=lambda x: x.priority, reverse=True)
     
-    def _schedule_class(self, requirement, subject_faculty_map):
-        """Schedule a single class"""
-        batch = requirement['batch']
-        subject = requirement['subject']
-        requires_lab = requirement['requires_lab']
-        
-        # Get available faculty for this subject
-        available_faculty = subject_faculty_map.get(subject, [])
-        if not available_faculty:
-            self.conflicts.append(f"No faculty available for {subject.name}")
-            return False
-        
-        # Try each time slot
-        random.shuffle(self.time_slots)  # Add randomness for better distribution
-        
-        for time_slot in self.time_slots:
-            # Check if batch is available
-            if not self._is_batch_available(batch, time_slot):
-                continue
-            
-            # Find suitable classroom
-            suitable_classrooms = self._find_suitable_classrooms(batch, requires_lab)
-            
-            for classroom in suitable_classrooms:
-                if not self._is_classroom_available(classroom, time_slot):
-                    continue
-                
-                # Find available faculty
-                for faculty in available_faculty:
-                    if self._is_faculty_available(faculty, time_slot):
-                        # Check faculty workload constraints
-                        if self._check_faculty_workload(faculty, time_slot):
-                            # Create timetable entry
-                            entry = TimetableEntry.objects.create(
-                                template=self.template,
-                                time_slot=time_slot,
-                                classroom=classroom,
-                                subject=subject,
-                                faculty=faculty,
-                                batch=batch
-                            )
-                            
-                            # Update tracking
-                            self._update_tracking(faculty, classroom, batch, time_slot)
-                            return True
-        
-        self.conflicts.append(f"Could not schedule {subject.name} for {batch.name}")
-        return False
+    def _conflict_message(self, requirement):
+        """Describe why a requirement is left unscheduled"""
+        subject = self.snapshot.subjects[requirement.subject]
+        if not requirement.faculty:
+            return f"No faculty available for {subject.name}"
+        
+        batch = self.snapshot.batches[requirement.batch]
+        return f"Could not schedule {subject.name} for {batch.name}"
     
-    def _find_suitable_classrooms(self, batch, requires_lab):
-        """Find classrooms suitable for the batch and requirements"""
-        suitable = []
-        
-        for classroom in self.classrooms:
-            # Check capacity
-            if classroom.capacity < batch.student_count:
-                continue
-            
-            # Check if lab is required
-            if requires_lab and classroom.room_type != 'lab':
-                continue
-            
-            # Check department preference
-            if classroom.department and classroom.department != batch.department:
-                continue
-            
-            suitable.append(classroom)
-        
-        # Sort by preference (department match, capacity efficiency)
-        suitable.sort(key=lambda x: (
-            x.department == batch.department,
-            -(x.capacity - batch.student_count)  # Prefer closer capacity match
-        ), reverse=True)
-        
-        return suitable
-    
-    def _is_batch_available(self, batch, time_slot):
-        """Check if batch is available at the given time slot"""
-        existing = TimetableEntry.objects.filter(
-            template=self.template,
-            batch=batch,
-            time_slot=time_slot
-        ).exists()
-        
-        return not existing
-    
-    def _is_classroom_available(self, classroom, time_slot):
-        """Check if classroom is available at the given time slot"""
-        existing = TimetableEntry.objects.filter(
-            template=self.template,
-            classroom=classroom,
-            time_slot=time_slot
-        ).exists()
-        
-        return not existing
-    
-    def _is_faculty_available(self, faculty, time_slot):
-        """Check if faculty is available at the given time slot"""
-        existing = TimetableEntry.objects.filter(
-            template=self.template,
-            faculty=faculty,
-            time_slot=time_slot
-        ).exists()
-        
-        return not existing
-    
-    def _check_faculty_workload(self, faculty, time_slot):
-        """Check if faculty workload constraints are satisfied"""
-        # Check daily workload
-        daily_classes = TimetableEntry.objects.filter(
-            template=self.template,
-            faculty=faculty,
-            time_slot__day=time_slot.day
-        ).count()
-        
-        if daily_classes >= faculty.max_hours_per_day:
-            return False
-        
-        # Check weekly workload
-        weekly_classes = TimetableEntry.objects.filter(
-            template=self.template,
-            faculty=faculty
-        ).count()
-        
-        if weekly_classes >= faculty.max_hours_per_week:
-            return False
-        
-        return True
-    
-    def _update_tracking(self, faculty, classroom, batch, time_slot):
-        """Update internal tracking structures"""
-        day_slot = f"{time_slot.day}_{time_slot.start_time}"
-        
-        self.faculty_workload[faculty.id] += 1
-        self.classroom_utilization[classroom.id].append(day_slot)
-        self.batch_schedule[batch.id].append(day_slot)
+    def _count_scheduled(self):
+        """Number of requirements currently placed"""
+        return sum(1 for assignment in self.state.assignments if assignment is not None)
     
-    def _resolve_conflicts(self):
-        """Try to resolve scheduling conflicts with alternative arrangements"""
-        # Implementation for conflict resolution
-        # This could include swapping classes, finding alternative time slots, etc.
-        pass
+    def _persist_entries(self):
+        """Replace the template's entries with the placed requirements atomically
+        
+        Entries in ``kept_entries`` stay untouched and requirements in
+        ``pinned`` are not written again.
+        """
+        snapshot = self.snapshot
+        entries = []
+        
+        for requirement in self.problem.requirements:
+            assignment = self.state.assignments[requirement.index]
+            if assignment is None or requirement.index in self.pinned:
+                continue
+            slot, room, faculty = assignment
+            entries.append(TimetableEntry(
+                template=self._entry_template(requirement),
+                time_slot=snapshot.time_slots[slot],
+                classroom=snapshot.classrooms[room],
+                subject=snapshot.subjects[requirement.subject],
+                faculty=snapshot.faculties[faculty],
+                batch=snapshot.batches[requirement.batch]
+            ))
+        
+        with transaction.atomic():
+            self._saved_entries().exclude(id__in=self.kept_entries).delete()
+            TimetableEntry.objects.bulk_create(entries)
+            bump_revision(*[template.id for template in self._templates()])
     
     def get_optimization_report(self):
-        """Generate optimization report with statistics"""
-        entries = TimetableEntry.objects.filter(template=self.template)
+        """Generate optimization report with statistics
+        
+        Runs a constant number of queries: usage comes from the solver's
+        assignments after a generation, or from two GROUP BY queries on the
+        saved entries otherwise, and each statistic is computed once.
+        """
+        room_usage, _ = self._usage_counts()
         
         report = {
-            'total_classes_scheduled': entries.count(),
+            'total_classes_scheduled': sum(room_usage.values()),
             'classroom_utilization': self._calculate_classroom_utilization(),
             'faculty_workload_distribution': self._calculate_faculty_workload(),
             'conflicts': self.conflicts,
-            'suggestions': self._generate_suggestions()
+            'suggestions': self._generate_suggestions(),
+            'performance': self.get_performance()
         }
         
         return report
     
+    def _usage_counts(self):
+        """Scheduled classes per classroom id and per faculty id"""
+        if self._usage is not None:
+            return self._usage
+        
+        room_usage = defaultdict(int)
+        faculty_usage = defaultdict(int)
+        
+        if self.tracking_loaded:
+            # Generated in this run: count the solver's own assignments
+            snapshot = self.snapshot
+            for assignment in self.state.assignments:
+                if assignment is not None:
+                    _, room, faculty = assignment
+                    room_usage[snapshot.classrooms[room].id] += 1
+                    faculty_usage[snapshot.faculties[faculty].id] += 1
+        else:
+            entries = self._saved_entries()
+            for row in entries.values('classroom_id').annotate(scheduled=Count('id')).order_by():
+                room_usage[row['classroom_id']] = row['scheduled']
+            for row in entries.values('faculty_id').annotate(scheduled=Count('id')).order_by():
+                faculty_usage[row['faculty_id']] = row['scheduled']
+        
+        self._usage = (room_usage, faculty_usage)
+        return self._usage
+    
     def _calculate_classroom_utilization(self):
         """Calculate classroom utilization statistics"""
+        if self._utilization is not None:
+            return self._utilization
+        
         utilization = {}
+        room_usage, _ = self._usage_counts()
         
         for classroom in self.classrooms:
-            scheduled_slots = TimetableEntry.objects.filter(
-                template=self.template,
-                classroom=classroom
-            ).count()
+            scheduled_slots = room_usage[classroom.id]
             
             total_slots = len(self.time_slots)
             utilization_rate = (scheduled_slots / total_slots) * 100 if total_slots > 0 else 0
@@ -289,26 +614,34 @@ class TimetableOptimizer:
                 'rate': round(utilization_rate, 2)
             }
         
+        self._utilization = utilization
         return utilization
     
     def _calculate_faculty_workload(self):
         """Calculate faculty workload distribution"""
+        if self._workload is not None:
+            return self._workload
+        
         workload = {}
+        _, faculty_usage = self._usage_counts()
         
-        faculties = Faculty.objects.filter(department=self.template.department)
+        departments = {template.department_id for template in self._templates()}
+        faculties = Faculty.objects.filter(department__in=departments).only(
+            'employee_name', 'max_hours_per_week'
+        )
         
         for faculty in faculties:
-            scheduled_hours = TimetableEntry.objects.filter(
-                template=self.template,
-                faculty=faculty
-            ).count()
+            scheduled_hours = faculty_usage[faculty.id]
             
-            workload[faculty.user.get_full_name()] = {
+            # Keyed by id, as two faculty members may share a name
+            workload[faculty.id] = {
+                'name': faculty.employee_name,
                 'scheduled': scheduled_hours,
                 'max_weekly': faculty.max_hours_per_week,
                 'utilization': round((scheduled_hours / faculty.max_hours_per_week) * 100, 2) if faculty.max_hours_per_week > 0 else 0
             }
         
+        self._workload = workload
         return workload
     
     def _generate_suggestions(self):
@@ -323,10 +656,10 @@ class TimetableOptimizer:
         
         # Check for faculty workload imbalance
         faculty_workload = self._calculate_faculty_workload()
-        for faculty, stats in faculty_workload.items():
+        for stats in faculty_workload.values():
             if stats['utilization'] > 90:
-                suggestions.append(f"Faculty {faculty} has high workload ({stats['utilization']}%)")
+                suggestions.append(f"Faculty {stats['name']} has high workload ({stats['utilization']}%)")
             elif stats['utilization'] < 30:
-                suggestions.append(f"Faculty {faculty} has low workload ({stats['utilization']}%)")
+                suggestions.append(f"Faculty {stats['name']} has low workload ({stats['utilization']}%)")
         
         return suggestions
\ No newline at end of file
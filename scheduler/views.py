@@ -3,23 +3,35 @@ from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
 from django.contrib import messages
-from django.http import JsonResponse, HttpResponse
+from django.http import JsonResponse, HttpResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
-from django.core.paginator import Paginator
-from django.db.models import Q, Count
+from django.db import IntegrityError
+from django.db.models import Q, Count, Case, When, Value, IntegerField
 from django.utils import timezone
+from django.utils.cache import get_conditional_response
+import io
 import json
+import math
 from datetime import datetime, time
 
 from .models import (
-    Department, Classroom, Faculty, Subject, Batch, TimeSlot,
-    TimetableTemplate, TimetableEntry, FacultySubject, SchedulingConstraint
+    Classroom, Faculty, Subject, Batch, TimeSlot,
+    TimetableTemplate, TimetableEntry, FacultySubject, SchedulingConstraint, GenerationJob
 )
 from .forms import (
     LoginForm, DepartmentForm, ClassroomForm, FacultyForm, SubjectForm,
-    BatchForm, TimeSlotForm, TimetableTemplateForm, TimetableEntryForm, SchedulingConstraintForm, SignUpForm
+    BatchForm, TimeSlotForm, TimetableTemplateForm, TimetableEntryForm, SchedulingConstraintForm, SignUpForm,
+    MasterDataImportForm
 )
+from .grids import build_timetable_grids
+from .ical import FEED_OWNERS, FeedVersion, feed_headers, stream_feed
+from .imports import MasterDataImport, detect_format, read_rows
+from .jobs import fail_stale_jobs
+from .occupancy import apply_edits, parse_id, validate_entry
+from .pagination import keyset_page
+from .resources import RESOURCES, resource_page
+from .stats import dashboard_stats
 from .utils import TimetableOptimizer
 
 
@@ -68,49 +80,59 @@ def logout_view(request):
     return redirect('login')
 
 
+DASHBOARD_PAGE_SIZE = 25
+RESOURCE_PAGE_SIZE = 50
+
+
 @login_required
 def dashboard(request):
     # Dashboard statistics
-    stats = {
-        'total_departments': Department.objects.count(),
-        'total_classrooms': Classroom.objects.count(),
-        'total_faculties': Faculty.objects.count(),
-        'total_subjects': Subject.objects.count(),
-        'total_batches': Batch.objects.count(),
-        'active_timetables': TimetableTemplate.objects.filter(is_active=True).count(),
-    }
+    stats = dashboard_stats()
     
-    # Recent timetables
-    recent_timetables = TimetableEntry.objects.select_related(
-        'batch', 'subject', 'faculty', 'classroom', 'time_slot'
-    ).all().order_by('-id')
+    # Recent timetables, one page at a time by id cursor
+    try:
+        before = parse_id(request.GET['before']) if request.GET.get('before') else None
+        after = parse_id(request.GET['after']) if request.GET.get('after') else None
+    except ValueError:
+        before = after = None
+    recent_timetables, older, newer = keyset_page(
+        TimetableEntry.objects.select_related(
+            'batch__department', 'subject', 'faculty', 'classroom', 'time_slot'
+        ),
+        before=before, after=after, size=DASHBOARD_PAGE_SIZE
+    )
     
     context = {
         'stats': stats,
         'recent_timetables': recent_timetables,
+        'older_cursor': older,
+        'newer_cursor': newer,
     }
     return render(request, 'scheduler/college-dashboard.html', context)
 
 
 @login_required
 def manage_resources(request):
-    # Get all resources with pagination
-    departments = Department.objects.all()
-    classrooms = Classroom.objects.select_related('department').all()
-    faculties = Faculty.objects.select_related('department').all()
-    subjects = Subject.objects.select_related('department').all()
-    batches = Batch.objects.select_related('department').all()
-    time_slots = TimeSlot.objects.all().order_by('day', 'start_time')
+    # Each tab loads its rows on demand from resource_list
+    return render(request, 'scheduler/manage_resources.html')
+
+
+@login_required
+def resource_list(request, resource):
+    """One keyset page of a manage_resources tab as JSON, optionally filtered by ?search="""
+    if resource not in RESOURCES:
+        return JsonResponse({'success': False, 'error': f'Unknown resource: {resource}'}, status=404)
     
-    context = {
-        'departments': departments,
-        'classrooms': classrooms,
-        'faculties': faculties,
-        'subjects': subjects,
-        'batches': batches,
-        'time_slots': time_slots,
-    }
-    return render(request, 'scheduler/manage_resources.html', context)
+    try:
+        after = parse_id(request.GET['after']) if request.GET.get('after') else None
+        size = int(request.GET.get('limit', RESOURCE_PAGE_SIZE))
+        if size < 1:
+            raise ValueError(f"limit must be a positive number of rows, not {size}")
+    except ValueError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    
+    rows, next_cursor = resource_page(resource, request.GET.get('search', '').strip(), after, size)
+    return JsonResponse({'success': True, 'results': rows, 'next': next_cursor})
 
 
 # @login_required
@@ -224,8 +246,21 @@ def update_timetable_entry(request):
         field = data.get('field')
         value = data.get('value')
         
+        # With validate_only the edit is checked but not saved, so the editor
+        # can validate every drag
+        validate_only = bool(data.get('validate_only'))
+        
+        try:
+            entry_id = parse_id(entry_id)
+            if field in ('classroom', 'faculty', 'subject', 'time_slot'):
+                value = parse_id(value)
+        except ValueError as e:
+            return JsonResponse({'success': False, 'error': str(e)}, status=400)
+        
         try:
-            entry = TimetableEntry.objects.get(id=entry_id)
+            entry = TimetableEntry.objects.select_related(
+                'template', 'time_slot', 'classroom', 'faculty', 'subject', 'batch'
+            ).get(id=entry_id)
             
             if field == 'classroom':
                 classroom = Classroom.objects.get(id=value)
@@ -236,15 +271,112 @@ def update_timetable_entry(request):
             elif field == 'subject':
                 subject = Subject.objects.get(id=value)
                 entry.subject = subject
+            elif field == 'time_slot':
+                time_slot = TimeSlot.objects.get(id=value)
+                entry.time_slot = time_slot
+            
+            violations = validate_entry(entry, check_qualification=field in ('faculty', 'subject'))
+            if violations or validate_only:
+                return JsonResponse({'success': not violations, 'violations': violations})
             
             entry.save()
-            return JsonResponse({'success': True})
+            return JsonResponse({'success': True, 'violations': []})
         except Exception as e:
             return JsonResponse({'success': False, 'error': str(e)})
     
     return JsonResponse({'success': False})
 
 
+@login_required
+@require_http_methods(['POST'])
+def batch_edit_entries(request, template_id):
+    """Apply a list of moves and swaps to the template's entries in one transaction"""
+    get_object_or_404(TimetableTemplate, id=template_id)
+    
+    try:
+        data = json.loads(request.body or '{}')
+        if not isinstance(data, dict):
+            raise ValueError("Expected a JSON object")
+        applied, results = apply_edits(
+            template_id, data.get('operations'), validate_only=bool(data.get('validate_only'))
+        )
+    except (ValueError, TypeError) as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    except IntegrityError as e:
+        # Only reachable if the timetable changed under a stale index
+        return JsonResponse({'success': False, 'error': str(e)}, status=409)
+    
+    return JsonResponse({
+        'success': all(result['success'] for result in results),
+        'applied': applied,
+        'results': results
+    })
+
+
+def _generation_job_payload(job):
+    return {
+        'job_id': job.id,
+        'template_id': job.template_id,
+        'status': job.status,
+        'placed': job.placed,
+        'total': job.total,
+        'best_penalty': job.best_penalty,
+        'seed': job.seed,
+        'message': job.message,
+        'created_at': job.created_at.isoformat(),
+        'started_at': job.started_at.isoformat() if job.started_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+    }
+
+
+@login_required
+@require_http_methods(['POST'])
+def start_generation(request, template_id):
+    """Queue a generation job for the template; a job already in flight is returned instead"""
+    template = get_object_or_404(TimetableTemplate, id=template_id)
+    
+    try:
+        data = json.loads(request.body or '{}')
+        if not isinstance(data, dict):
+            raise ValueError("Expected a JSON object")
+        starts = int(data.get('starts', 1))
+        if not 1 <= starts <= GenerationJob.MAX_STARTS:
+            raise ValueError(f"starts must be between 1 and {GenerationJob.MAX_STARTS}")
+        time_budget = float(data['time_budget']) if data.get('time_budget') else None
+        if time_budget is not None and not (
+            math.isfinite(time_budget) and 0 < time_budget <= GenerationJob.MAX_TIME_BUDGET
+        ):
+            raise ValueError(f"time_budget must be a number of seconds up to {GenerationJob.MAX_TIME_BUDGET}")
+        seed = int(data['seed']) if data.get('seed') is not None else None
+        if seed is not None and not 0 <= seed < 2 ** 63:
+            raise ValueError("seed must be a non-negative 64-bit integer")
+    except (ValueError, TypeError, OverflowError) as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    
+    fail_stale_jobs()
+    active = GenerationJob.objects.filter(template=template, status__in=GenerationJob.ACTIVE_STATUSES).first()
+    if active is None:
+        try:
+            job = GenerationJob.objects.create(
+                template=template, requested_by=request.user,
+                starts=starts, time_budget=time_budget, seed=seed
+            )
+            return JsonResponse({'success': True, 'created': True, 'job': _generation_job_payload(job)}, status=202)
+        except IntegrityError:
+            # Another request queued a job between the check and the insert
+            active = GenerationJob.objects.filter(template=template, status__in=GenerationJob.ACTIVE_STATUSES).first()
+            if active is None:
+                return JsonResponse({'success': False, 'error': 'Could not queue generation'}, status=409)
+    
+    return JsonResponse({'success': True, 'created': False, 'job': _generation_job_payload(active)})
+
+
+@login_required
+def generation_job_status(request, job_id):
+    job = get_object_or_404(GenerationJob, id=job_id)
+    return JsonResponse({'success': True, 'job': _generation_job_payload(job)})
+
+
 @login_required
 def approve_timetable(request, template_id):
     if request.method == 'POST':
@@ -316,6 +448,25 @@ def delete_timetable(request, template_id):
 
 
 
+@login_required
+def view_template_timetable(request, template_id):
+    """Whole-template timetable as batch, faculty and classroom grids, in a handful of queries"""
+    template = get_object_or_404(TimetableTemplate.objects.select_related('department'), id=template_id)
+    grids = build_timetable_grids(template)
+    
+    views = [
+        ('batch', 'Batches', grids['batch']),
+        ('faculty', 'Faculty', grids['faculty']),
+        ('classroom', 'Classrooms', grids['classroom']),
+    ]
+    return render(request, 'scheduler/template_timetable.html', {
+        'template': template,
+        'days': grids['days'],
+        'views': views,
+        'total_entries': grids['total'],
+    })
+
+
 def view_timetable(request, entry_id):
     entry = get_object_or_404(TimetableEntry, id=entry_id)
 
@@ -326,7 +477,9 @@ def view_timetable(request, entry_id):
 
 import csv
 def export_timetable(request, entry_id):
-    entry = get_object_or_404(TimetableEntry, id=entry_id)
+    entry = get_object_or_404(
+        TimetableEntry.objects.select_related('time_slot', 'subject', 'faculty', 'classroom', 'batch'), id=entry_id
+    )
 
     response = HttpResponse(content_type="text/csv")
     response["Content-Disposition"] = f'attachment; filename="timetable_entry_{entry.id}.csv"'
@@ -447,4 +600,130 @@ def create_scheduling_constraint(request):
             return redirect('dashboard')
     else:
         form = SchedulingConstraintForm()
-    return render(request, 'scheduler/create_scheduling_constraint.html', {'form': form})
\ No newline at end of file
+    return render(request, 'scheduler/create_scheduling_constraint.html', {'form': form})
+
+
+@login_required
+def import_master_data(request):
+    """Upload a CSV or JSON file of master data, e.g. faculty or the subjects they teach
+    
+    The upload is read as a stream from wherever Django spooled it and
+    imported with ``MasterDataImport``, so large files never sit in memory
+    as model forms. Staff only, like approving timetables.
+    """
+    if not (request.user.is_staff or request.user.is_superuser):
+        messages.error(request, 'You do not have permission to import data.')
+        return redirect('manage_resources')
+    
+    result = None
+    if request.method == 'POST':
+        form = MasterDataImportForm(request.POST, request.FILES)
+        if form.is_valid():
+            upload = form.cleaned_data['file']
+            file_format = form.cleaned_data['file_format'] or detect_format(upload.name)
+            upload.seek(0)
+            stream = io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline='')
+            try:
+                result = MasterDataImport(
+                    form.cleaned_data['resource'], dry_run=form.cleaned_data['dry_run']
+                ).run(read_rows(stream, file_format))
+            except (UnicodeDecodeError, ValueError) as e:
+                messages.error(request, f'Could not read {upload.name}: {e}')
+            finally:
+                stream.detach()
+    else:
+        form = MasterDataImportForm()
+    return render(request, 'scheduler/import_master_data.html', {'form': form, 'result': result})
+
+
+class _Echo:
+    """File-like object whose write returns the value, for streaming csv.writer output"""
+    def write(self, value):
+        return value
+
+
+# Query parameter -> entry field the template export can be filtered by
+EXPORT_FILTERS = {'batch': 'batch_id', 'faculty': 'faculty_id', 'classroom': 'classroom_id'}
+EXPORT_CHUNK_SIZE = 2000
+
+
+@login_required
+def export_template_timetable(request, template_id):
+    """Stream a whole template as CSV, optionally filtered by ?batch=, ?faculty= or ?classroom= ids
+    
+    Rows are read as joined ``values_list`` tuples in chunks and written as
+    they arrive, so memory use does not grow with the timetable.
+    """
+    template = get_object_or_404(TimetableTemplate, id=template_id)
+    entries = TimetableEntry.objects.filter(template=template)
+    
+    try:
+        for param, field in EXPORT_FILTERS.items():
+            ids = [parse_id(value) for value in request.GET.getlist(param) if value]
+            if ids:
+                entries = entries.filter(**{f'{field}__in': ids})
+    except ValueError:
+        # Checked here because a bad id would otherwise only fail mid-stream,
+        # after the 200 status has been sent
+        return HttpResponse('Filter ids must be positive integers', status=400)
+    
+    # Weekday order in SQL, since the day column sorts alphabetically
+    day_order = Case(
+        *[When(time_slot__day=day, then=Value(index)) for index, (day, _) in enumerate(TimeSlot.DAYS_OF_WEEK)],
+        output_field=IntegerField()
+    )
+    rows = entries.annotate(day_order=day_order).order_by(
+        'batch__name', 'day_order', 'time_slot__start_time', 'id'
+    ).values_list(
+        'batch__name', 'time_slot__day', 'time_slot__start_time', 'time_slot__end_time',
+        'subject__code', 'subject__name', 'faculty__employee_name', 'classroom__name'
+    )
+    
+    day_names = dict(TimeSlot.DAYS_OF_WEEK)
+    writer = csv.writer(_Echo())
+    
+    def stream():
+        yield writer.writerow(['Batch', 'Day', 'Time', 'Subject Code', 'Subject', 'Faculty', 'Classroom'])
+        for batch, day, start, end, code, subject, faculty, classroom in rows.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+            yield writer.writerow([
+                batch, day_names.get(day, day), f"{start:%H:%M} - {end:%H:%M}", code, subject, faculty, classroom
+            ])
+    
+    response = StreamingHttpResponse(stream(), content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="timetable_{template.id}.csv"'
+    return response
+
+
+# No login: calendar clients cannot hold a session, so the owner's secret
+# calendar token in the URL is the credential
+@require_http_methods(["GET", "HEAD"])
+def calendar_feed(request, kind, token):
+    """Stream a faculty member's, batch's or classroom's active timetable as an iCalendar feed
+    
+    The ETag comes from the revisions of the active templates the owner
+    appears in, so polling clients are answered with a 304 after two small
+    queries and entries are only read when they changed.
+    """
+    if kind not in FEED_OWNERS:
+        return HttpResponse(f'Unknown calendar: {kind}', status=404)
+    model, name_field, _ = FEED_OWNERS[kind]
+    owner = model.objects.filter(calendar_token=token).values_list('id', name_field).first()
+    if owner is None:
+        return HttpResponse('Unknown calendar', status=404)
+    object_id, name = owner
+    
+    version = FeedVersion(kind, object_id)
+    headers = feed_headers(version)
+    not_modified = get_conditional_response(request, etag=version.etag)
+    if not_modified is not None:
+        for header, value in headers.items():
+            not_modified[header] = value
+        return not_modified
+    
+    response = StreamingHttpResponse(
+        stream_feed(version, name, request.get_host()), content_type='text/calendar; charset=utf-8'
+    )
+    response['Content-Disposition'] = f'inline; filename="{kind}.ics"'
+    for header, value in headers.items():
+        response[header] = value
+    return response
\ No newline at end of file
@@ -109,4 +109,10 @@ CRISPY_TEMPLATE_PACK = 'bootstrap5'
 # Login URLs
 LOGIN_URL = '/login/'
 LOGIN_REDIRECT_URL = '/dashboard/'
-LOGOUT_REDIRECT_URL = '/login/'
\ No newline at end of file
+LOGOUT_REDIRECT_URL = '/login/'
+
+# Timetable generation: append per-phase timings to this file as JSON lines (disabled when empty)
+SCHEDULER_PERFORMANCE_LOG = config('SCHEDULER_PERFORMANCE_LOG', default='')
+
+# Seconds the dashboard counters are cached; saves and deletes clear them sooner
+DASHBOARD_STATS_TTL = config('DASHBOARD_STATS_TTL', default=60, cast=int)
\ No newline at end of file